@@ -1,19 +1,21 @@
 """ MultiQC modules base class, contains helper functions """
 
 
+import concurrent.futures
 import fnmatch
+import functools
 import io
 import itertools
 import logging
 import mimetypes
+import multiprocessing
 import os
-import re
 import textwrap
 from collections import defaultdict
 
 import markdown
 
-from multiqc.utils import config, report, software_versions, util_functions
+from multiqc.utils import config, incremental, profiling, report, sample_names, software_versions, util_functions
 
 logger = logging.getLogger(__name__)
 
@@ -22,6 +24,51 @@ class ModuleNoSamplesFound(Exception):
     """Module checked all input files but couldn't find any data to use"""
 
 
+# Module, parse function and find_log_files() options for the files being parsed in worker processes
+_parse_job = None
+
+# Module methods called by parse functions that are recorded, to be called again in the main process
+_RECORDED_CALLS = ["add_data_source", "add_software_version"]
+
+
+def _parse_file(f):
+    """Parse one file in a worker process"""
+    module, parse_fn, read_args = _parse_job
+    return _parse_file_recorded(module, f, parse_fn, read_args)
+
+
+def _parse_file_recorded(module, f, parse_fn, read_args):
+    """
+    Parse one file with parse_fn, recording the add_data_source() / add_software_version() calls
+    instead of making them. Returns the changes to the file dict, the parsed result and the calls,
+    or (None, None, []) if the file couldn't be read.
+    """
+    for f in BaseMultiqcModule._read_log_file(f, *read_args):
+        calls = []
+        for method in _RECORDED_CALLS:
+            setattr(module, method, functools.partial(_record_call, calls, method, f))
+        try:
+            result = parse_fn(f)
+        finally:
+            for method in _RECORDED_CALLS:
+                delattr(module, method)
+        return {k: v for k, v in f.items() if k not in ["f", "fn", "root"]}, result, calls
+    return None, None, []
+
+
+def _record_call(calls, method, f, *args, **kwargs):
+    args = tuple(incremental.ParsedFile() if arg is f else arg for arg in args)
+    kwargs = {k: incremental.ParsedFile() if v is f else v for k, v in kwargs.items()}
+    calls.append((method, args, kwargs))
+
+
+def _replay_calls(module, calls, f):
+    for method, args, kwargs in calls:
+        args = tuple(f if isinstance(arg, incremental.ParsedFile) else arg for arg in args)
+        kwargs = {k: f if isinstance(v, incremental.ParsedFile) else v for k, v in kwargs.items()}
+        getattr(module, method)(*args, **kwargs)
+
+
 class BaseMultiqcModule(object):
     def __init__(
         self,
@@ -100,17 +147,22 @@ class BaseMultiqcModule(object):
 
         self.sections = list()
 
-    def find_log_files(self, sp_key, filecontents=True, filehandles=False):
+    def find_log_files(self, sp_key, filecontents=True, filehandles=False, mmap=False):
         """
         Return matches log files of interest.
         :param sp_key: Search pattern key specified in config
         :param filehandles: Set to true to return a file handle instead of slurped file contents
+        :param mmap: Set to true to return a read-only memory map of the file (util_functions.MappedFile),
+                     with fast iteration over the decoded lines using f["f"].lines()
         :return: Yields a dict with filename (fn), root directory (root), cleaned sample name
-                 generated from the filename (s_name) and either the file contents or file handle
-                 for the current matched file (f).
+                 generated from the filename (s_name) and either the file contents, file handle
+                 or memory map for the current matched file (f).
                  As yield is used, the results can be iterated over without loading all files at once
         """
+        files = self._find_log_files(sp_key, filecontents, filehandles, mmap)
+        return profiling.search_key(sp_key if isinstance(sp_key, str) else self.name, files)
 
+    def _find_log_files(self, sp_key, filecontents, filehandles, mmap):
         # Pick up path filters if specified.
         # Allows modules to be called multiple times with different sets of files
         path_filters = getattr(self, "mod_cust_config", {}).get("path_filters")
@@ -182,29 +234,122 @@ class BaseMultiqcModule(object):
             # Make a sample name from the filename
             f["sp_key"] = sp_key
             f["s_name"] = self.clean_s_name(f["fn"], f)
-            if filehandles or filecontents:
-                try:
-                    # Custom content module can now handle image files
-                    (ftype, encoding) = mimetypes.guess_type(os.path.join(f["root"], f["fn"]))
-                    if ftype is not None and ftype.startswith("image"):
-                        with io.open(os.path.join(f["root"], f["fn"]), "rb") as fh:
-                            # always return file handles
-                            f["f"] = fh
-                            yield f
-                    else:
-                        # Everything else - should be all text files
-                        with io.open(os.path.join(f["root"], f["fn"]), "r", encoding="utf-8") as fh:
-                            if filehandles:
-                                f["f"] = fh
-                                yield f
-                            elif filecontents:
-                                f["f"] = fh.read()
-                                yield f
-                except (IOError, OSError, ValueError, UnicodeDecodeError) as e:
-                    logger.debug("Couldn't open filehandle when returning file: {}\n{}".format(f["fn"], e))
-                    f["f"] = None
+            yield from self._read_log_file(f, filecontents, filehandles, mmap)
+
+    @staticmethod
+    def _read_log_file(f, filecontents=True, filehandles=False, mmap=False):
+        """Open a file found by find_log_files() and yield it with the contents, handle or memory map in f["f"]"""
+        if not (filehandles or filecontents or mmap):
+            yield f
+            return
+        try:
+            # Custom content module can now handle image files
+            (ftype, encoding) = mimetypes.guess_type(os.path.join(f["root"], f["fn"]))
+            if ftype is not None and ftype.startswith("image"):
+                with io.open(os.path.join(f["root"], f["fn"]), "rb") as fh:
+                    # always return file handles
+                    f["f"] = fh
+                    yield f
+            elif mmap:
+                with util_functions.MappedFile(os.path.join(f["root"], f["fn"])) as mf:
+                    # Skip binary files here, like files read as text below, rather than
+                    # failing in the middle of the module's parsing loop
+                    mf.check_encoding()
+                    f["f"] = mf
+                    yield f
+            else:
+                # Everything else - should be all text files
+                with io.open(os.path.join(f["root"], f["fn"]), "r", encoding="utf-8") as fh:
+                    if filehandles:
+                        f["f"] = fh
+                        yield f
+                    elif filecontents:
+                        f["f"] = fh.read()
+                        yield f
+        except (IOError, OSError, ValueError, UnicodeDecodeError) as e:
+            logger.debug("Couldn't open filehandle when returning file: {}\n{}".format(f["fn"], e))
+            f["f"] = None
+
+    def parse_files_parallel(self, sp_key, parse_fn, workers=None, filecontents=True, filehandles=False, mmap=False):
+        """
+        Find log files and parse each of them with parse_fn(f), spreading the files over a pool of
+        worker processes. parse_fn gets the same dict as from find_log_files() and should return the
+        parsed data instead of saving it on the module. With --incremental, files that haven't changed
+        since the previous run aren't parsed again, and their saved result is used instead.
+        :param sp_key: Search pattern key specified in config
+        :param parse_fn: Function that parses one file, eg. a method of the module
+        :param workers: Number of worker processes, defaults to config.parse_workers
+        :param filecontents, filehandles, mmap: How to give the file to parse_fn, as for find_log_files()
+        :return: Yields (f, result) for each file, in the same order as find_log_files(). Calls to
+                 add_data_source() and add_software_version() in parse_fn are made again in the
+                 main process, just before the results for that file are returned.
+        """
+        results = self._parse_files_parallel(sp_key, parse_fn, workers, (filecontents, filehandles, mmap))
+        # The files are counted by find_log_files(), this adds the time spent parsing them
+        return profiling.search_key(sp_key, results, count_files=False)
+
+    def _parse_files_parallel(self, sp_key, parse_fn, workers, read_args):
+        if workers is None:
+            workers = config.parse_workers
+        files = list(self.find_log_files(sp_key, filecontents=False, filehandles=False))
+
+        # Saved results from the previous run, for files that haven't changed
+        previous = [incremental.get(self.anchor, sp_key, parse_fn, f) for f in files]
+        to_parse = [f for f, prev in zip(files, previous) if prev is None]
+
+        parsed = None
+        if workers > 1 and len(to_parse) > 1:
+            parsed = self._parse_files_in_workers(to_parse, parse_fn, workers, read_args)
+        if parsed is not None:
+            parsed = iter(parsed)
+
+        for f, prev in zip(files, previous):
+            report.last_found_file = os.path.join(f["root"], f["fn"])
+            if prev is not None:
+                f_changes, result, calls = prev
+            elif parsed is not None:
+                f_changes, result, calls = next(parsed)
+            elif config.incremental:
+                f_changes, result, calls = _parse_file_recorded(self, f, parse_fn, read_args)
             else:
-                yield f
+                # Run in this process
+                for f in self._read_log_file(f, *read_args):
+                    yield f, parse_fn(f)
+                continue
+            if f_changes is None:
+                continue
+            if prev is None:
+                incremental.add(self.anchor, sp_key, parse_fn, f, (f_changes, result, calls))
+            f.update(f_changes)
+            _replay_calls(self, calls, f)
+            yield f, result
+
+    def _parse_files_in_workers(self, files, parse_fn, workers, read_args):
+        """Parse files with a pool of forked processes. Returns None if that isn't possible, to parse them here."""
+        global _parse_job
+        if "fork" not in multiprocessing.get_all_start_methods():
+            logger.debug("Parsing files in parallel needs the 'fork' start method, parsing them in sequence")
+            return None
+        # Don't start more processes from a module that's already running in a worker
+        if multiprocessing.parent_process() is not None:
+            return None
+
+        # Workers are forked from this process, so the module and parse function don't need to be pickled
+        _parse_job = (self, parse_fn, read_args)
+        workers = min(workers, len(files))
+        try:
+            with concurrent.futures.ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("fork"),
+                initializer=profiling.init_worker,
+            ) as executor:
+                return list(executor.map(_parse_file, files, chunksize=max(1, len(files) // (workers * 4))))
+        except Exception as e:
+            # Eg. the results couldn't be pickled
+            logger.debug(f"{self.name}: Parsing files in parallel failed, parsing them in sequence: {e}")
+            return None
+        finally:
+            _parse_job = None
 
     def add_section(
         self,
@@ -289,8 +434,6 @@ class BaseMultiqcModule(object):
         :config.prepend_dirs: boolean, whether to prepend dir name to s_name
         :return: The cleaned sample name, ready to be used
         """
-        s_name_original = s_name
-
         # Backwards compatability - if f is a string, it's probably the root (this used to be the second argument)
         if isinstance(f, str):
             root = f
@@ -305,113 +448,8 @@ class BaseMultiqcModule(object):
             if "sp_key" in f and seach_pattern_key is None:
                 seach_pattern_key = f["sp_key"]
 
-        # For modules setting s_name from file contents, set s_name back to the filename
-        # (if wanted in the config)
-        if filename is not None and (
-            config.use_filename_as_sample_name is True
-            or (
-                isinstance(config.use_filename_as_sample_name, list)
-                and seach_pattern_key is not None
-                and seach_pattern_key in config.use_filename_as_sample_name
-            )
-        ):
-            s_name = filename
-
-        # Set root to empty string if not known
-        if root is None:
-            root = ""
-
-        # if s_name comes from file contents, it may have a file path
-        # For consistency with other modules, we keep just the basename
-        s_name = os.path.basename(s_name)
-
-        # Prepend sample name with directory
-        if config.prepend_dirs:
-            sep = config.prepend_dirs_sep
-            root = root.lstrip(".{}".format(os.sep))
-            dirs = [d.strip() for d in root.split(os.sep) if d.strip() != ""]
-            if config.prepend_dirs_depth != 0:
-                d_idx = config.prepend_dirs_depth * -1
-                if config.prepend_dirs_depth > 0:
-                    dirs = dirs[d_idx:]
-                else:
-                    dirs = dirs[:d_idx]
-            if len(dirs) > 0:
-                s_name = "{}{}{}".format(sep.join(dirs), sep, s_name)
-
-        if config.fn_clean_sample_names:
-            # Split then take first section to remove everything after these matches
-            for ext in config.fn_clean_exts:
-                # Check if this config is limited to a module
-                if "module" in ext:
-                    if isinstance(ext["module"], str):
-                        ext["module"] = [ext["module"]]
-                    if not any([m == self.anchor for m in ext["module"]]):
-                        continue
-
-                # Go through different filter types
-                if isinstance(ext, str):
-                    ext = {"type": "truncate", "pattern": ext}
-                if ext.get("type") == "truncate":
-                    s_name = s_name.split(ext["pattern"], 1)[0]
-                elif ext.get("type") in ("remove", "replace"):
-                    if ext["type"] == "replace":
-                        logger.warning(
-                            "use 'config.fn_clean_sample_names.remove' instead "
-                            "of 'config.fn_clean_sample_names.replace' [deprecated]"
-                        )
-                    s_name = s_name.replace(ext["pattern"], "")
-                elif ext.get("type") == "regex":
-                    s_name = re.sub(ext["pattern"], "", s_name)
-                elif ext.get("type") == "regex_keep":
-                    match = re.search(ext["pattern"], s_name)
-                    s_name = match.group() if match else s_name
-                elif ext.get("type") is None:
-                    logger.error('config.fn_clean_exts config was missing "type" key: {}'.format(ext))
-                else:
-                    logger.error("Unrecognised config.fn_clean_exts type: {}".format(ext.get("type")))
-            # Trim off characters at the end of names
-            for chrs in config.fn_clean_trim:
-                if s_name.endswith(chrs):
-                    s_name = s_name[: -len(chrs)]
-                if s_name.startswith(chrs):
-                    s_name = s_name[len(chrs) :]
-
-        # Remove trailing whitespace
-        s_name = s_name.strip()
-
-        # If we cleaned back to an empty string, just use the original value
-        if s_name == "":
-            s_name = s_name_original
-
-        # Do any hard replacements that are set with --replace-names
-        if config.sample_names_replace:
-            for s_name_search, s_name_replace in config.sample_names_replace.items():
-                try:
-                    # Skip if we're looking for exact matches only
-                    if config.sample_names_replace_exact:
-                        # Simple strings
-                        if not config.sample_names_replace_regex and s_name != s_name_search:
-                            continue
-                        # regexes
-                        if config.sample_names_replace_regex and not re.fullmatch(s_name_search, s_name):
-                            continue
-                    # Replace - regex
-                    if config.sample_names_replace_regex:
-                        s_name = re.sub(s_name_search, s_name_replace, s_name)
-                    # Replace - simple string
-                    else:
-                        # Complete name swap
-                        if config.sample_names_replace_complete:
-                            if s_name_search in s_name:
-                                s_name = s_name_replace
-                        # Partial substring replace
-                        else:
-                            s_name = s_name.replace(s_name_search, s_name_replace)
-                except re.error as e:
-                    logger.error("Error with sample name replacement regex: {}".format(e))
-
-        return s_name
+        # Config is parsed once per module, and the cleaned name for each file remembered
+        return sample_names.get_cleaner(self.anchor).clean(s_name, root, filename, seach_pattern_key)
 
     def ignore_samples(self, data):
         """Strip out samples which match `sample_names_ignore`"""
@@ -429,9 +467,7 @@ class BaseMultiqcModule(object):
 
     def is_ignore_sample(self, s_name):
         """Should a sample name be ignored?"""
-        glob_match = any(fnmatch.fnmatch(s_name, sn) for sn in config.sample_names_ignore)
-        re_match = any(re.match(sn, s_name) for sn in config.sample_names_ignore_re)
-        return glob_match or re_match
+        return sample_names.is_ignored(s_name)
 
     def general_stats_addcols(self, data, headers=None, namespace=None):
         """Helper function to add to the General Statistics variable.
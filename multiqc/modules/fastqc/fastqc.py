@@ -22,12 +22,17 @@ from multiqc import config
 from multiqc.modules.base_module import BaseMultiqcModule, ModuleNoSamplesFound
 from multiqc.plots import bargraph, heatmap, linegraph, table
 from multiqc.utils import report
+from multiqc.utils.file_cache import FileCache
 
 # Initialise the logger
 log = logging.getLogger(__name__)
 
 VERSION_REGEX = r"FastQC\t([\d\.]+)"
 
+# Parsed zip files, and the version of the cached data
+ZIP_CACHE = FileCache("fastqc_zips", ".json")
+ZIP_CACHE_FORMAT = 1
+
 
 class MultiqcModule(BaseMultiqcModule):
     def __init__(self):
@@ -44,43 +49,17 @@ class MultiqcModule(BaseMultiqcModule):
         self.fastqc_data = dict()
 
         # Find and parse unzipped FastQC reports
-        for f in self.find_log_files("fastqc/data"):
-            s_name = self.clean_s_name(os.path.basename(f["root"]), f, root=os.path.dirname(f["root"]))
-            self.parse_fastqc_report(f["f"], s_name, f)
+        for f, parsed in self.parse_files_parallel("fastqc/data", self.parse_fastqc_data_file, filehandles=True):
+            self.save_fastqc_report(f, *parsed)
 
         # Find and parse zipped FastQC reports
-        for f in self.find_log_files("fastqc/zip", filecontents=False):
-            s_name = f["fn"]
-            if s_name.endswith("_fastqc.zip"):
-                s_name = s_name[:-11]
+        for f, parsed in self.parse_files_parallel("fastqc/zip", self.parse_fastqc_zip_file, filecontents=False):
             # Skip if we already have this report - parsing zip files is slow..
-            if s_name in self.fastqc_data.keys():
-                log.debug("Skipping '{}' as already parsed '{}'".format(f["fn"], s_name))
-                continue
-            try:
-                fqc_zip = zipfile.ZipFile(os.path.join(f["root"], f["fn"]))
-            except Exception as e:
-                log.warning("Couldn't read '{}' - Bad zip file".format(f["fn"]))
-                log.debug("Bad zip file error: {}".format(e))
+            if self.zip_s_name(f) in self.fastqc_data.keys():
+                log.debug("Skipping '{}' as already parsed '{}'".format(f["fn"], self.zip_s_name(f)))
                 continue
-            # FastQC zip files should have just one directory inside, containing report
-            d_name = fqc_zip.namelist()[0]
-            try:
-                path = os.path.join(d_name, "fastqc_data.txt")
-                with fqc_zip.open(path) as fh:
-                    r_data = fh.read()
-                    try:
-                        r_data = r_data.decode("utf8")
-                    except UnicodeDecodeError as e:
-                        log.debug(f"Could not parse {path} as Unicode: {e}, attempting the latin-1 encoding")
-                        try:
-                            r_data = r_data.decode("latin-1")
-                        except Exception as e:
-                            log.warning(f"Error reading FastQC data file {path}: {e}. Skipping sample {s_name}.")
-                            continue
-                    self.parse_fastqc_report(r_data, s_name, f)
-            except KeyError:
-                log.warning("Error - can't find fastqc_raw_data.txt in {}".format(f))
+            if parsed is not None:
+                self.save_fastqc_report(f, *parsed)
 
         # Filter to strip out ignored sample names
         self.fastqc_data = self.ignore_samples(self.fastqc_data)
@@ -139,43 +118,137 @@ class MultiqcModule(BaseMultiqcModule):
         self.adapter_content_plot()
         self.status_heatmap()
 
-    def parse_fastqc_report(self, file_contents, s_name=None, f=None):
-        """Takes contents from a fastq_data.txt file and parses out required
-        statistics and data. Returns a dict with keys 'stats' and 'data'.
-        Data is for plotting graphs, stats are for top table."""
-
-        # Make the sample name from the input filename if we find it
-        fn_search = re.search(r"Filename\s+(.+)", file_contents)
-        if fn_search:
-            s_name = self.clean_s_name(fn_search.group(1), f)
+    def parse_fastqc_data_file(self, f):
+        """Parse an unzipped fastqc_data.txt file, named after its directory"""
+        s_name = self.clean_s_name(os.path.basename(f["root"]), f, root=os.path.dirname(f["root"]))
+        return self.parse_fastqc_report(f["f"], s_name, f)
+
+    @staticmethod
+    def zip_s_name(f):
+        """Sample name of a zipped report, from the zip file name"""
+        s_name = f["fn"]
+        if s_name.endswith("_fastqc.zip"):
+            s_name = s_name[:-11]
+        return s_name
+
+    def parse_fastqc_zip_file(self, f):
+        """Parse the fastqc_data.txt file inside a FastQC zip file. Returns None if it can't be read."""
+        s_name = self.zip_s_name(f)
+        # Skip if we already have this report - parsing zip files is slow..
+        if s_name in self.fastqc_data.keys():
+            return None
+        zip_path = os.path.join(f["root"], f["fn"])
+        cache_key = None
+        if getattr(config, "fastqc_config", {}).get("cache_zips", False):
+            cache_key = self.zip_cache_key(zip_path)
+            parsed = self.read_zip_cache(cache_key)
+            if parsed is not None:
+                return self.fastqc_report_result(parsed, s_name, f)
+        try:
+            fqc_zip = zipfile.ZipFile(zip_path)
+        except Exception as e:
+            log.warning("Couldn't read '{}' - Bad zip file".format(f["fn"]))
+            log.debug("Bad zip file error: {}".format(e))
+            return None
+        with fqc_zip:
+            # FastQC zip files should have just one directory inside, containing report
+            d_name = fqc_zip.namelist()[0]
+            path = os.path.join(d_name, "fastqc_data.txt")
+            try:
+                # Decode and parse the report a line at a time, instead of reading it all into memory
+                with fqc_zip.open(path) as fh:
+                    try:
+                        parsed = self.parse_fastqc_lines(io.TextIOWrapper(fh, encoding="utf8"))
+                    except UnicodeDecodeError as e:
+                        log.debug(f"Could not parse {path} as Unicode: {e}, attempting the latin-1 encoding")
+                        parsed = None
+                if parsed is None:
+                    with fqc_zip.open(path) as fh:
+                        parsed = self.parse_fastqc_lines(io.TextIOWrapper(fh, encoding="latin-1"))
+            except KeyError:
+                log.warning("Error - can't find fastqc_raw_data.txt in {}".format(f))
+                return None
+        if cache_key is not None:
+            ZIP_CACHE.write(cache_key, json.dumps(parsed))
+        return self.fastqc_report_result(parsed, s_name, f)
+
+    @staticmethod
+    def zip_cache_key(zip_path):
+        """Cache key for the parsed report in a zip file, only used while the zip path, size and mtime are unchanged"""
+        st = os.stat(zip_path)
+        return (config.version, ZIP_CACHE_FORMAT, os.path.realpath(zip_path), st.st_size, st.st_mtime_ns)
+
+    @staticmethod
+    def read_zip_cache(cache_key):
+        text = ZIP_CACHE.read(cache_key)
+        if text is None:
+            return None
+        try:
+            return json.loads(text)
+        except ValueError:
+            return None
 
+    def save_fastqc_report(self, f, s_name, data, dup_keys):
+        """Add a parsed report to the module data"""
         if s_name in self.fastqc_data.keys():
             log.debug("Duplicate sample name found! Overwriting: {}".format(s_name))
         self.add_data_source(f, s_name)
-        self.fastqc_data[s_name] = {"statuses": dict()}
+        self.fastqc_data[s_name] = data
+        self.dup_keys = dup_keys
+
+    def parse_fastqc_report(self, file_contents, s_name=None, f=None):
+        """Takes contents from a fastq_data.txt file, as a string or an iterable
+        of lines (eg. a file handle), and parses out required statistics and data.
+        Returns the sample name, a dict with the parsed sections and the sequence
+        duplication level keys, in order."""
+        if isinstance(file_contents, str):
+            file_contents = file_contents.splitlines()
+        return self.fastqc_report_result(self.parse_fastqc_lines(file_contents), s_name, f)
+
+    def fastqc_report_result(self, parsed, s_name, f):
+        """Sample name, data and duplication level keys for a report parsed by parse_fastqc_lines()"""
+        # Make the sample name from the input filename if we find it
+        if parsed["filename"] is not None:
+            s_name = self.clean_s_name(parsed["filename"], f)
+        for version in parsed["versions"]:
+            self.add_software_version(version, s_name)
+        return s_name, parsed["data"], parsed["dup_keys"]
+
+    def parse_fastqc_lines(self, lines):
+        """Parse the lines of a fastqc_data.txt file. Returns a dict with the Filename
+        field, the FastQC versions, the parsed sections and the duplication level keys.
+        Doesn't depend on the sample name or config, so the result can be cached."""
+        filename = None
+        versions = []
+        data = {"statuses": dict()}
 
         # Parse the report
         section = None
         s_headers = None
-        self.dup_keys = []
-        for line in file_contents.splitlines():
+        dup_keys = []
+        for line in lines:
+            line = line.rstrip("\r\n")
+            if filename is None:
+                fn_search = re.search(r"Filename\s+(.+)", line)
+                if fn_search:
+                    filename = fn_search.group(1)
             if line.startswith("##FastQC"):
                 version_match = re.search(VERSION_REGEX, line)
                 if version_match:
-                    self.add_software_version(version_match.group(1), s_name)
+                    versions.append(version_match.group(1))
             if line == ">>END_MODULE":
                 section = None
                 s_headers = None
             elif line.startswith(">>"):
                 (section, status) = line[2:].split("\t", 1)
                 section = section.lower().replace(" ", "_")
-                self.fastqc_data[s_name]["statuses"][section] = status
+                data["statuses"][section] = status
             elif section is not None:
                 if line.startswith("#"):
                     s_headers = line[1:].split("\t")
                     # Special case: Total Deduplicated Percentage header line
                     if s_headers[0] == "Total Deduplicated Percentage":
-                        self.fastqc_data[s_name]["basic_statistics"].append(
+                        data["basic_statistics"].append(
                             {"measure": "total_deduplicated_percentage", "value": float(s_headers[1])}
                         )
                     else:
@@ -183,7 +256,7 @@ class MultiqcModule(BaseMultiqcModule):
                         if s_headers[1] == "Relative count":
                             s_headers[1] = "Percentage of total"
                         s_headers = [s.lower().replace(" ", "_") for s in s_headers]
-                        self.fastqc_data[s_name][section] = list()
+                        data[section] = list()
 
                 elif s_headers is not None:
                     s = line.split("\t")
@@ -195,22 +268,20 @@ class MultiqcModule(BaseMultiqcModule):
                         except ValueError:
                             pass
                         row[s_headers[i]] = v
-                    self.fastqc_data[s_name][section].append(row)
+                    data[section].append(row)
                     # Special case - need to remember order of duplication keys
                     if section == "sequence_duplication_levels":
                         try:
-                            self.dup_keys.append(float(s[0]))
+                            dup_keys.append(float(s[0]))
                         except ValueError:
-                            self.dup_keys.append(s[0])
+                            dup_keys.append(s[0])
 
         # Tidy up the Basic Stats
-        self.fastqc_data[s_name]["basic_statistics"] = {
-            d["measure"]: d["value"] for d in self.fastqc_data[s_name]["basic_statistics"]
-        }
+        data["basic_statistics"] = {d["measure"]: d["value"] for d in data["basic_statistics"]}
 
         # we sort by the avg of the range, which is effectively
         # sorting ranges in asc order assuming no overlap
-        sequence_length_distributions = self.fastqc_data[s_name].get("sequence_length_distribution", [])
+        sequence_length_distributions = data.get("sequence_length_distribution", [])
         sequence_length_distributions.sort(key=lambda d: self.avg_bp_from_range(d["length"]))
 
         # Calculate the average sequence length (Basic Statistics gives a range)
@@ -230,9 +301,11 @@ class MultiqcModule(BaseMultiqcModule):
                 median = self.avg_bp_from_range(d["length"])
 
         if total_count > 0:
-            self.fastqc_data[s_name]["basic_statistics"]["avg_sequence_length"] = length_bp / total_count
+            data["basic_statistics"]["avg_sequence_length"] = length_bp / total_count
         if median is not None:
-            self.fastqc_data[s_name]["basic_statistics"]["median_sequence_length"] = median
+            data["basic_statistics"]["median_sequence_length"] = median
+
+        return {"filename": filename, "versions": versions, "data": data, "dup_keys": dup_keys}
 
     def fastqc_general_stats(self):
         """Add some single-number stats to the basic statistics
@@ -125,9 +125,9 @@ class MultiqcModule(BaseMultiqcModule):
         genstats = defaultdict(dict)  # mean coverage
 
         # Parse mean coverage
-        for f in self.find_log_files("mosdepth/summary"):
+        for f in self.find_log_files("mosdepth/summary", mmap=True):
             s_name = self.clean_s_name(f["fn"], f)
-            for line in f["f"].splitlines():
+            for line in f["f"].lines():
                 # The first column can be a contig name, "total", "total_region".
                 # We want to use "total_region" if available. It is available when
                 # --by is specified. It always goes after "total", so we can just
@@ -337,12 +337,12 @@ class MultiqcModule(BaseMultiqcModule):
         xy_cov = dict()
 
         # Parse coverage distributions
-        for f in self.find_log_files(f"mosdepth/{scope}_dist"):
+        for f in self.find_log_files(f"mosdepth/{scope}_dist", mmap=True):
             s_name = self.clean_s_name(f["fn"], f)
             if s_name in cumcov_dist_data:  # both region and global might exist, prioritizing region
                 continue
 
-            for line in f["f"].split("\n"):
+            for line in f["f"].lines():
                 if "\t" not in line:
                     continue
                 contig, cutoff_reads, bases_fraction = line.split("\t")
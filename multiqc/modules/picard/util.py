@@ -23,11 +23,10 @@ def read_histogram(module, program_key, headers, formats, picard_tool, sentieon_
     """
     all_data = dict()
     assert len(formats) == len(headers)
-    sample_data = None
 
-    # Go through logs and find Metrics
-    for f in module.find_log_files(program_key, filehandles=True):
+    def parse_file(f):
         s_name = f["s_name"]
+        sample_data = None
         for line in f["f"]:
             maybe_s_name = extract_sample_name(
                 module,
@@ -54,7 +53,10 @@ def read_histogram(module, program_key, headers, formats, picard_tool, sentieon_
                     for i in range(len(fields)):
                         fields[i] = formats[i](fields[i])
                     sample_data[fields[0]] = dict(zip(headers, fields))
+        return s_name, sample_data
 
+    # Go through logs and find Metrics
+    for f, (s_name, sample_data) in module.parse_files_parallel(program_key, parse_file, filehandles=True):
         # append the data
         if sample_data:
             if s_name in all_data:
@@ -6,7 +6,7 @@
 import logging
 
 from multiqc.modules.base_module import BaseMultiqcModule
-from multiqc.plots import bargraph
+from multiqc.plots import bargraph, table
 from multiqc.utils import report
 
 # Initialise the logger
@@ -34,12 +34,21 @@ class MultiqcModule(BaseMultiqcModule):
 
         self.search_pattern_times_section()
 
+        if report.runtimes["profiles"]:
+            self.module_times_section()
+            self.module_search_keys_section()
+
     def file_search_stats_section(self):
         """Count of all files iterated through by MultiQC, by category"""
 
         pdata = dict()
         pcats = dict()
+        num_searches = 0
         for key in sorted(report.file_search_stats, key=report.file_search_stats.get, reverse=True):
+            # Search cache hits and misses are not search results, mentioned in the description instead
+            if key.startswith("search_cache_"):
+                continue
+            num_searches += report.file_search_stats[key]
             if "skipped_" in key:
                 s_name = "Skipped: {}".format(key.replace("skipped_", "").replace("_", " ").capitalize())
                 pcats[key] = {"name": key, "color": "#999999"}
@@ -56,13 +65,19 @@ class MultiqcModule(BaseMultiqcModule):
             "cpswitch": False,
         }
 
+        description = """
+            Number of files searched by MultiQC, categorised by what happened to them.
+            **Total file searches: {}**.
+        """.format(num_searches)
+        if "search_cache_hits" in report.file_search_stats:
+            description += """
+            Search results for {} files were taken from the search cache, {} files were searched.
+            """.format(report.file_search_stats["search_cache_hits"], report.file_search_stats["search_cache_misses"])
+
         self.add_section(
             name="Files searched",
             anchor="multiqc_runtime_files_searched",
-            description="""
-                Number of files searched by MultiQC, categorised by what happened to them.
-                **Total file searches: {}**.
-            """.format(sum(report.file_search_stats.values())),
+            description=description,
             helptext="""
                 Note that only files are considered in this plot - skipped directories are not shown.
 
@@ -118,3 +133,146 @@ class MultiqcModule(BaseMultiqcModule):
             """,
             plot=bargraph.plot(pdata, None, pconfig),
         )
+
+    def module_times_section(self):
+        """Section with the time, memory and I/O profile of each module"""
+
+        tdata = dict()
+        pdata = dict()
+        for name, prof in report.runtimes["profiles"].items():
+            tdata[name] = {
+                "wall_time": prof["wall_time"],
+                "cpu_time": prof["cpu_time"],
+                "parsing_time": prof["parsing_time"],
+                "plots_time": prof["plots_time"],
+                "data_files_time": prof["data_files_time"],
+                "peak_memory": prof["peak_memory"] / 1e6,
+                "files_opened": prof["files_opened"],
+            }
+            if prof["bytes_read"] is not None:
+                tdata[name]["read"] = prof["bytes_read"] / 1e6
+            pdata[name] = {k: prof[k] for k in ["parsing_time", "plots_time", "data_files_time"]}
+
+        headers = {
+            "wall_time": {"title": "Wall time", "description": "Time to run the module", "suffix": " s"},
+            "cpu_time": {
+                "title": "CPU time",
+                "description": "CPU time used by the module, including worker processes for parsing files",
+                "suffix": " s",
+            },
+            "parsing_time": {
+                "title": "Parsing",
+                "description": "Time spent finding, reading and parsing files, and anything else that isn't in plots or data files",
+                "suffix": " s",
+            },
+            "plots_time": {"title": "Plots", "description": "Time spent in plot functions", "suffix": " s"},
+            "data_files_time": {
+                "title": "Data files",
+                "description": "Time spent writing files to multiqc_data",
+                "suffix": " s",
+            },
+            "peak_memory": {
+                "title": "Peak memory",
+                "description": "Peak memory allocated by Python while the module was running, above what was allocated before",
+                "suffix": " MB",
+                "scale": "OrRd",
+            },
+            "read": {
+                "title": "Read",
+                "description": "Data read by the MultiQC process while the module was running",
+                "suffix": " MB",
+                "scale": "Greens",
+            },
+            "files_opened": {
+                "title": "Files opened",
+                "description": "Number of files opened while the module was running",
+                "format": "{:,.0f}",
+                "scale": "Greens",
+            },
+        }
+        tconfig = {
+            "namespace": "Run time",
+            "id": "multiqc_runtime_modules_table",
+            "table_title": "MultiQC: Module profiles",
+            "col1_header": "Module",
+        }
+        cats = {
+            "parsing_time": {"name": "Parsing"},
+            "plots_time": {"name": "Plots"},
+            "data_files_time": {"name": "Data files"},
+        }
+        pconfig = {
+            "id": "multiqc_runtime_modules_plot",
+            "title": "MultiQC: Time per module",
+            "ylab": "Time (seconds)",
+            "cpswitch_c_active": True,
+        }
+
+        self.add_section(
+            name="Modules",
+            anchor="multiqc_runtime_modules",
+            description="""
+                Time, memory and I/O of each module.
+                **Total time running modules: {:.2f} seconds**.
+            """.format(report.runtimes["total_mods"]),
+            helptext="""
+                Plot and data file times are the time spent in the `multiqc.plots` functions and in
+                `write_data_file()`. Everything else that the module does is counted as parsing.
+
+                Peak memory is measured with `tracemalloc`, which only sees memory allocated by Python
+                and makes modules run more slowly while profiling. Data read is the `rchar` counter in
+                `/proc/self/io`, so it is only shown on Linux, and doesn't include files read by worker
+                processes for `--parse-workers`. The CPU time of those workers is included.
+
+                Set `profile_cprofile: true` in the config to also save a `cProfile` of each module
+                to `multiqc_data/profiles/`, which can be opened with `pstats` or `snakeviz`.
+            """,
+            plot=table.plot(tdata, headers, tconfig) + bargraph.plot(pdata, cats, pconfig),
+        )
+
+    def module_search_keys_section(self):
+        """Section with the files found and the time spent on them for each search pattern key that modules used"""
+
+        tdata = dict()
+        for name, prof in report.runtimes["profiles"].items():
+            for sp_key, stats in prof["search_keys"].items():
+                tdata["{} - {}".format(name, sp_key)] = {
+                    "files": stats["files"],
+                    "file_size": stats["file_size"] / 1e6,
+                    "time": stats["time"],
+                }
+        if not tdata:
+            return
+
+        headers = {
+            "files": {
+                "title": "Files",
+                "description": "Number of files given to the module",
+                "format": "{:,.0f}",
+                "scale": "Greens",
+            },
+            "file_size": {
+                "title": "Size",
+                "description": "Total size of the files",
+                "suffix": " MB",
+                "scale": "Greens",
+            },
+            "time": {
+                "title": "Time",
+                "description": "Time spent getting the files from find_log_files(), including reading them, and parsing them with parse_files_parallel()",
+                "suffix": " s",
+            },
+        }
+        tconfig = {
+            "namespace": "Run time",
+            "id": "multiqc_runtime_search_keys_table",
+            "table_title": "MultiQC: Module search keys",
+            "col1_header": "Module - search key",
+        }
+
+        self.add_section(
+            name="Module search keys",
+            anchor="multiqc_runtime_module_search_keys",
+            description="Files found for each search pattern key used by the modules, and the time spent reading them.",
+            plot=table.plot(tdata, headers, tconfig),
+        )
@@ -23,38 +23,7 @@ class StatsReportMixin:
         """Find Samtools stats logs and parse their data"""
 
         self.samtools_stats = dict()
-        for f in self.find_log_files("samtools/stats"):
-            parsed_data = dict()
-            for line in f["f"].splitlines():
-                # Get version number from file contents
-                if line.startswith("# This file was produced by samtools stats"):
-                    # Look for Samtools version
-                    version_match = re.search(VERSION_REGEX, line)
-                    if version_match is None:
-                        continue
-
-                    # Add Samtools version
-                    samtools_version = version_match.group(1)
-                    self.add_software_version(samtools_version, f["s_name"])
-
-                    # Look for HTSlib version
-                    htslib_version_match = re.search(HTSLIB_REGEX, line)
-                    if htslib_version_match is None:
-                        continue
-
-                    # Add HTSlib version if different from Samtools version
-                    htslib_version = htslib_version_match.group(1)
-                    if htslib_version != samtools_version:
-                        self.add_software_version(htslib_version, f["s_name"], "HTSlib")
-
-                if not line.startswith("SN"):
-                    continue
-                sections = line.split("\t")
-                field = sections[1].strip()[:-1]
-                field = field.replace(" ", "_")
-                value = float(sections[2].strip())
-                parsed_data[field] = value
-
+        for f, parsed_data in self.parse_files_parallel("samtools/stats", self.parse_samtools_stats_file, mmap=True):
             if len(parsed_data) > 0:
                 # Work out some percentages
                 if "raw_total_sequences" in parsed_data:
@@ -205,6 +174,40 @@ class StatsReportMixin:
         # Return the number of logs that were found
         return len(self.samtools_stats)
 
+    def parse_samtools_stats_file(self, f):
+        """Parse the summary numbers from one Samtools stats file"""
+        parsed_data = dict()
+        for line in f["f"].lines():
+            # Get version number from file contents
+            if line.startswith("# This file was produced by samtools stats"):
+                # Look for Samtools version
+                version_match = re.search(VERSION_REGEX, line)
+                if version_match is None:
+                    continue
+
+                # Add Samtools version
+                samtools_version = version_match.group(1)
+                self.add_software_version(samtools_version, f["s_name"])
+
+                # Look for HTSlib version
+                htslib_version_match = re.search(HTSLIB_REGEX, line)
+                if htslib_version_match is None:
+                    continue
+
+                # Add HTSlib version if different from Samtools version
+                htslib_version = htslib_version_match.group(1)
+                if htslib_version != samtools_version:
+                    self.add_software_version(htslib_version, f["s_name"], "HTSlib")
+
+            if not line.startswith("SN"):
+                continue
+            sections = line.split("\t")
+            field = sections[1].strip()[:-1]
+            field = field.replace(" ", "_")
+            value = float(sections[2].strip())
+            parsed_data[field] = value
+        return parsed_data
+
     def alignment_section(self, samples_data):
         bedgraph_data = {}
         for sample_id, data in samples_data.items():
@@ -85,8 +85,8 @@ class MultiqcModule(BaseMultiqcModule):
             group: {software: list(map(str, software_versions)) for software, software_versions in versions.items()}
             for group, versions in mqc_report.software_versions.items()
         }
-        # TSV only allows 2 levels of nesting.
-        if mqc_config.data_format == "tsv":
+        # TSV and the columnar formats only allow 2 levels of nesting.
+        if mqc_config.data_format not in ["json", "yaml"]:
             flat_software_versions = {
                 group: {software: ", ".join(software_versions) for software, software_versions in versions.items()}
                 for group, versions in flat_software_versions.items()
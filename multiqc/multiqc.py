@@ -7,7 +7,6 @@ The main function to run MultiQC. Sorry about the messy namespace.
 Primarily called by multiqc.__main__.py
 Imported by __init__.py so available as multiqc.run()
 """
-import base64
 import errno
 import io
 import os
@@ -18,17 +17,25 @@ import sys
 import tempfile
 import time
 import traceback
-from urllib.request import urlopen
 
-import jinja2
 import rich
 import rich_click as click
-from packaging import version
-from rich.syntax import Syntax
 
-from .modules.base_module import ModuleNoSamplesFound
-from .plots import table
-from .utils import config, log, megaqc, plugin_hooks, report, software_versions, strict_helpers, util_functions
+from .utils import (
+    asset_cache,
+    config,
+    incremental as incremental_report,
+    log,
+    megaqc,
+    module_scheduler,
+    plot_export,
+    plugin_hooks,
+    profiling,
+    report,
+    software_versions,
+    strict_helpers,
+    util_functions,
+)
 
 # Set up logging
 start_execution_time = time.time()
@@ -36,6 +43,9 @@ logger = config.logger
 
 OLDEST_SUPPORTED_PYTHON_VERSION = "3.8"
 
+# Buffer size for writing the HTML report
+REPORT_WRITE_BUFFER = 1024 * 1024
+
 # Configuration for rich-click CLI help
 click.rich_click.USE_RICH_MARKUP = True
 click.rich_click.SHOW_METAVARS_COLUMN = False
@@ -115,6 +125,12 @@ click.rich_click.OPTION_GROUPS = {
                 "--strict",
                 "--require-logs",
                 "--profile-runtime",
+                "--search-workers",
+                "--search-cache",
+                "--module-workers",
+                "--parse-workers",
+                "--incremental",
+                "--plot-workers",
                 "--no-megaqc-upload",
                 "--no-ansi",
                 "--version",
@@ -272,6 +288,47 @@ click.rich_click.OPTION_GROUPS = {
 @click.option("-v", "--verbose", count=True, default=0, help="Increase output verbosity.")
 @click.option("-q", "--quiet", is_flag=True, help="Only show log warnings")
 @click.option("--profile-runtime", is_flag=True, help="Add analysis of how long MultiQC takes to run to the report")
+@click.option(
+    "--search-workers",
+    "search_workers",
+    type=int,
+    metavar="N",
+    help="Number of parallel workers to use when searching for files",
+)
+@click.option(
+    "--search-cache",
+    "search_cache",
+    is_flag=True,
+    help="Cache file search results to skip unchanged files in later runs",
+)
+@click.option(
+    "--module-workers",
+    "module_workers",
+    type=int,
+    metavar="N",
+    help="Number of worker processes for modules listed in config.parallel_modules",
+)
+@click.option(
+    "--parse-workers",
+    "parse_workers",
+    type=int,
+    metavar="N",
+    help="Number of worker processes for modules that parse their files in parallel",
+)
+@click.option(
+    "--incremental",
+    "incremental",
+    type=click.Path(file_okay=False),
+    metavar="PREV_DATA_DIR",
+    help="Reuse the parse results in a previous multiqc_data directory, only parsing new and changed files",
+)
+@click.option(
+    "--plot-workers",
+    "plot_workers",
+    type=int,
+    metavar="N",
+    help="Number of worker processes to draw and save flat plots",
+)
 @click.option("--no-ansi", is_flag=True, help="Disable coloured log output")
 @click.option(
     "--custom-css-file",
@@ -344,6 +401,12 @@ def run(
     verbose=0,
     quiet=False,
     profile_runtime=False,
+    search_workers=None,
+    search_cache=False,
+    module_workers=None,
+    parse_workers=None,
+    incremental=None,
+    plot_workers=None,
     no_ansi=False,
     custom_css_files=(),
     **kwargs,
@@ -399,6 +462,7 @@ def run(
         config.mqc_cl_config(cl_config)
 
     report.init()
+    plot_export.reset()
 
     # Log the command used to launch MultiQC
     report.multiqc_command = " ".join(sys.argv)
@@ -406,6 +470,10 @@ def run(
 
     # Check that we're running the latest version of MultiQC
     if config.no_version_check is not True:
+        from urllib.request import urlopen
+
+        from packaging import version
+
         try:
             response = urlopen("http://multiqc.info/version.php?v={}".format(config.short_version), timeout=5)
             remote_version = response.read().decode("utf-8").strip()
@@ -493,6 +561,18 @@ def run(
         config.require_logs = True
     if profile_runtime:
         config.profile_runtime = True
+    if search_workers is not None:
+        config.search_workers = search_workers
+    if search_cache:
+        config.search_cache = True
+    if module_workers is not None:
+        config.module_workers = module_workers
+    if parse_workers is not None:
+        config.parse_workers = parse_workers
+    if incremental is not None:
+        config.incremental = incremental
+    if plot_workers is not None:
+        config.plot_workers = plot_workers
     if no_ansi:
         config.no_ansi = True
     if custom_css_files:
@@ -674,11 +754,19 @@ def run(
     if not _required_logs_found(run_module_names):
         return {"report": report, "config": config, "sys_exit_code": 1}
 
+    # Load the parse results from the previous run, to only parse files that have changed
+    if config.incremental:
+        incremental_report.load(config.incremental)
+
     # Run the modules!
+    from .modules.base_module import ModuleNoSamplesFound
+
     plugin_hooks.mqc_trigger("before_modules")
     report.modules_output = list()
     sys_exit_code = 0
     total_mods_starttime = time.time()
+    # Start any modules that can run in parallel, results are collected in the module order below
+    scheduler = module_scheduler.ModuleScheduler(run_modules)
     for mod_idx, mod_dict in enumerate(run_modules):
         mod_starttime = time.time()
         this_module = list(mod_dict.keys())[0]
@@ -686,9 +774,12 @@ def run(
         if mod_cust_config is None:
             mod_cust_config = {}
         try:
-            mod = config.avail_modules[this_module].load()
-            mod.mod_cust_config = mod_cust_config  # feels bad doing this, but seems to work
-            output = mod()
+            output = scheduler.get_output(mod_idx)
+            if output is None:
+                mod = config.avail_modules[this_module].load()
+                mod.mod_cust_config = mod_cust_config  # feels bad doing this, but seems to work
+                with profiling.module(this_module):
+                    output = mod()
             if not isinstance(output, list):
                 output = [output]
             for m in output:
@@ -732,6 +823,7 @@ def run(
                 logger.debug(msg)
             logger.debug(f"No samples found: {this_module}")
         except KeyboardInterrupt:
+            scheduler.shutdown()
             shutil.rmtree(tmp_dir)
             logger.critical(
                 "User Cancelled Execution!\n{eq}\n{tb}{eq}\n".format(eq=("=" * 60), tb=traceback.format_exc())
@@ -744,6 +836,9 @@ def run(
                 raise
 
             # Flag the error, but carry on
+            from rich.panel import Panel
+            from rich.syntax import Syntax
+
             class CustomTraceback:
                 def __rich_console__(self, console: rich.console.Console, options: rich.console.ConsoleOptions):
                     sys_tb = sys.exc_info()
@@ -773,7 +868,7 @@ def run(
                 color_system=None if no_ansi else "auto",
             )
             console.print(
-                rich.panel.Panel(
+                Panel(
                     CustomTraceback(),
                     title="Oops! The '[underline]{}[/]' MultiQC module broke...".format(this_module),
                     expand=False,
@@ -792,12 +887,16 @@ def run(
             # Exit code 1 for CI failures etc
             sys_exit_code = 1
 
-        report.runtimes["mods"][run_module_names[mod_idx]] = time.time() - mod_starttime
+        report.runtimes["mods"][run_module_names[mod_idx]] = scheduler.runtimes.get(
+            mod_idx, time.time() - mod_starttime
+        )
+    scheduler.shutdown()
     report.runtimes["total_mods"] = time.time() - total_mods_starttime
 
     # Again, if config.require_logs is set, check if for all explicitly requested
     # modules samples were found.
     if not _required_logs_found([m.anchor for m in report.modules_output]):
+        plot_export.finish(report.modules_output)
         return {"report": report, "config": config, "sys_exit_code": 1}
 
     # Update report with software versions provided in configs
@@ -902,6 +1001,8 @@ def run(
 
     # Generate the General Statistics HTML & write to file
     if len(report.general_stats_data) > 0 and not config.skip_generalstats:
+        from .plots import table
+
         pconfig = {
             "id": "general_stats_table",
             "table_title": "General Statistics",
@@ -912,6 +1013,11 @@ def run(
     else:
         config.skip_generalstats = True
 
+    # Wait for any flat plots that are being drawn in parallel, and add them to the module HTML
+    plot_export_starttime = time.time()
+    plot_export.finish(report.modules_output)
+    report.runtimes["total_mods"] += time.time() - plot_export_starttime
+
     if config.data_dir is not None:
         # Write the report sources to disk
         report.data_sources_tofile()
@@ -923,7 +1029,15 @@ def run(
         # Compress the report plot JSON data
         runtime_compression_start = time.time()
         logger.debug("Compressing plot data")
-        report.plot_compressed_json = report.compress_json(report.plot_data)
+        report.plot_data_compression = _get_template_attr(template_mod, "plot_data_compression", "lzstring")
+        if _get_template_attr(template_mod, "plot_data_per_plot", False):
+            # Compress each plot separately, so that the report only has to decode the plots that are shown
+            report.plot_compressed_data = {
+                plot_id: report.compress_json(plot_data, report.plot_data_compression)
+                for plot_id, plot_data in report.plot_data.items()
+            }
+        else:
+            report.plot_compressed_json = report.compress_json(report.plot_data, report.plot_data_compression)
         report.runtimes["total_compression"] = time.time() - runtime_compression_start
 
     plugin_hooks.mqc_trigger("before_report_generation")
@@ -931,11 +1045,15 @@ def run(
     # Data Export / MegaQC integration - save report data to file or send report data to an API endpoint
     if (config.data_dump_file or config.megaqc_url) and config.megaqc_upload:
         multiqc_json_dump = megaqc.multiqc_dump_json(report)
-        if config.data_dump_file:
-            util_functions.write_data_file(multiqc_json_dump, "multiqc_data", False, "json")
+        if config.data_dump_file and config.data_dir is not None:
+            megaqc.multiqc_dump_json_file(multiqc_json_dump, os.path.join(config.data_dir, "multiqc_data.json"))
         if config.megaqc_url:
             megaqc.multiqc_api_post(multiqc_json_dump)
 
+    # Save the parse results for the next incremental run
+    if config.incremental and config.data_dir is not None:
+        incremental_report.save(config.data_dir)
+
     # Make the final report path & data directories
     if filename != "stdout":
         if config.make_report:
@@ -1073,6 +1191,9 @@ def run(
         # Copy the template files to the tmp directory (`dirs_exist_ok` makes sure
         # parent template files are overwritten)
         shutil.copytree(template_mod.template_dir, tmp_dir, dirs_exist_ok=True)
+        template_dirs = [template_mod.template_dir]
+        if hasattr(template_mod, "template_parent"):
+            template_dirs.append(parent_template.template_dir)
 
         # Function to include file contents in Jinja template
         def include_file(name, fdir=tmp_dir, b64=False):
@@ -1080,8 +1201,14 @@ def run(
                 if fdir is None:
                     fdir = ""
                 if b64:
-                    with io.open(os.path.join(fdir, name), "rb") as f:
-                        return base64.b64encode(f.read()).decode("utf-8")
+                    path = os.path.join(fdir, name)
+                    # Template files are copied to a new tmp dir each run, cache their encoding by the original path
+                    if fdir == tmp_dir:
+                        path = next(
+                            (os.path.join(d, name) for d in template_dirs if os.path.isfile(os.path.join(d, name))),
+                            path,
+                        )
+                    return asset_cache.b64_file(path)
                 else:
                     with io.open(os.path.join(fdir, name), "r", encoding="utf-8") as f:
                         return f.read()
@@ -1089,6 +1216,8 @@ def run(
                 logger.error("Could not include file '{}': {}".format(name, e))
 
         # Load the report template
+        import jinja2
+
         try:
             env = jinja2.Environment(loader=jinja2.FileSystemLoader(tmp_dir))
             env.globals["include_file"] = include_file
@@ -1096,17 +1225,26 @@ def run(
         except:  # noqa: E722
             raise IOError("Could not load {} template file '{}'".format(config.template, template_mod.base_fn))
 
-        # Use jinja2 to render the template and overwrite
+        # Use jinja2 to render the template and overwrite. The report is streamed to the
+        # output in chunks, so that the whole report is never held in memory as one string.
         config.analysis_dir = [os.path.realpath(d) for d in config.analysis_dir]
-        report_output = j_template.render(report=report, config=config)
+        report_stream = j_template.stream(report=report, config=config)
+        report_stream.enable_buffering(size=100)
         if filename == "stdout":
-            print(report_output.encode("utf-8"), file=sys.stdout)
+            report_stream.dump(sys.stdout)
+            print("", file=sys.stdout)
         else:
             try:
-                with io.open(config.output_fn, "w", encoding="utf-8") as f:
-                    print(report_output, file=f)
+                with io.open(config.output_fn, "w", encoding="utf-8", buffering=REPORT_WRITE_BUFFER) as f:
+                    report_stream.dump(f)
+                    print("", file=f)
             except IOError as e:
                 raise IOError("Could not print report to '{}' - {}".format(config.output_fn, IOError(e)))
+            except Exception:
+                # Don't leave a partially written report behind if the template fails to render
+                if os.path.exists(config.output_fn):
+                    os.remove(config.output_fn)
+                raise
 
             # Copy over files if requested by the theme
             try:
@@ -1120,6 +1258,11 @@ def run(
     # Clean up temporary directory
     shutil.rmtree(tmp_dir)
 
+    # Save the run time profile with the other data files
+    if config.profile_runtime and config.data_dir is not None and os.path.isdir(config.data_dir):
+        report.runtimes["total"] = time.time() - start_execution_time
+        profiling.write_runtime_json(os.path.join(config.data_dir, "multiqc_runtime.json"))
+
     # Zip the data directory if requested
     if config.zip_data_dir and config.data_dir is not None:
         shutil.make_archive(config.data_dir, "zip", config.data_dir)
@@ -1219,3 +1362,17 @@ def _required_logs_found(modules_with_logs):
             )
             return False
     return True
+
+
+def _get_template_attr(template_mod, attr, default):
+    """
+    Optional template setting, inherited from the parent template if not set. Used for report
+    features that need support in the template JavaScript, such as `plot_data_compression`
+    (templates that can decode gzip plot data) and `plot_data_per_plot` (templates that load
+    the data for each plot separately). Older templates get the defaults.
+    """
+    value = getattr(template_mod, attr, None)
+    if value is None and hasattr(template_mod, "template_parent"):
+        parent_template = config.avail_templates[template_mod.template_parent].load()
+        value = getattr(parent_template, attr, None)
+    return default if value is None else value
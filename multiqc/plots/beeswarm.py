@@ -7,13 +7,14 @@ import random
 from collections import defaultdict
 
 from multiqc.plots import table_object
-from multiqc.utils import config, report, util_functions
+from multiqc.utils import config, profiling, report, util_functions
 
 logger = logging.getLogger(__name__)
 
 letters = "abcdefghijklmnopqrstuvwxyz"
 
 
+@profiling.timed("plots")
 def plot(data, headers=None, pconfig=None):
     """Helper HTML for a beeswarm plot.
     :param data: A list of data dicts
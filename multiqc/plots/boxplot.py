@@ -9,7 +9,7 @@ import os
 import random
 import sys
 
-from multiqc.utils import config, report
+from multiqc.utils import config, profiling, report
 
 logger = logging.getLogger(__name__)
 
@@ -42,6 +42,7 @@ def get_template_mod():
     return _template_mod
 
 
+@profiling.timed("plots")
 def plot(data, pconfig=None):
     """Plot a box-and-whisker plot
     :param data: 2D dict, first keys as read positions, then as quantile:QV pairs
@@ -6,13 +6,14 @@
 import logging
 import random
 
-from multiqc.utils import config, report
+from multiqc.utils import config, profiling, report
 
 logger = logging.getLogger(__name__)
 
 letters = "abcdefghijklmnopqrstuvwxyz"
 
 
+@profiling.timed("plots")
 def plot(data, xcats, ycats=None, pconfig=None):
     """Plot a 2D heatmap.
     :param data: List of lists, each a representing a row of values.
@@ -2,18 +2,27 @@
 
 """ MultiQC functions to plot a table """
 
+import decimal
 import logging
+import math
 import random
+import re
 from collections import defaultdict
 
+import numpy as np
+
 from multiqc.plots import beeswarm, table_object
-from multiqc.utils import config, mqc_colour, report, util_functions
+from multiqc.utils import config, mqc_colour, profiling, report, util_functions
 
 logger = logging.getLogger(__name__)
 
 letters = "abcdefghijklmnopqrstuvwxyz"
 
+# Column formats that the browser can apply to the numbers in virtual tables, like "{:,.1f}"
+FIXED_FORMAT_RE = re.compile(r"^\{:(,?)\.(\d{1,2})f\}$")
+
 
+@profiling.timed("plots")
 def plot(data, headers=None, pconfig=None):
     """Return HTML for a MultiQC table.
     :param data: 2D dict, first keys as sample names, then x:y data pairs
@@ -34,6 +43,14 @@ def plot(data, headers=None, pconfig=None):
         for s_name in d.keys():
             s_names.add(s_name)
 
+    # Only render the visible rows in the browser, if requested
+    virtual = pconfig.get("virtual")
+    if virtual is None:
+        virtual = config.virtual_tables and len(s_names) >= config.max_table_rows
+    if virtual and not config.simple_output:
+        logger.debug("Plotting virtual table, {} samples".format(len(s_names)))
+        return make_table(dt, virtual=True)
+
     # Make a beeswarm plot if we have lots of samples
     if len(s_names) >= config.max_table_rows and pconfig.get("no_beeswarm") is not True:
         logger.debug("Plotting beeswarm instead of table, {} samples".format(len(s_names)))
@@ -48,10 +65,12 @@ def plot(data, headers=None, pconfig=None):
         return make_table(dt)
 
 
-def make_table(dt: table_object.DataTable):
+def make_table(dt: table_object.DataTable, virtual=False):
     """
     Build the HTML needed for a MultiQC table.
     :param dt: MultiQC datatable object
+    :param virtual: Save the cell values to the plot data instead of the HTML, for the
+        browser to render only the rows that are scrolled into view
     """
 
     table_id = dt.pconfig.get("id", "table_{}".format("".join(random.sample(letters, 4))))
@@ -60,6 +79,9 @@ def make_table(dt: table_object.DataTable):
     t_modal_headers = dict()
     t_rows = dict()
     t_rows_empty = dict()
+    # Cell data for each column of a virtual table, by sample name
+    v_cells = defaultdict(lambda: dict())
+    v_columns = dict()
     dt.raw_vals = defaultdict(lambda: dict())
     empty_cells = dict()
     hidden_cols = 1
@@ -142,7 +164,8 @@ def make_table(dt: table_object.DataTable):
         cond_formatting_colours = header.get("cond_formatting_colours", [])
         cond_formatting_colours.extend(config.table_cond_formatting_colours)
 
-        # Add the data table cells
+        # Collect the cell values for this column
+        column_vals = dict()
         for s_name, samp in dt.data[idx].items():
             if k in samp:
                 val = samp[k]
@@ -154,132 +177,91 @@ def make_table(dt: table_object.DataTable):
                         val = header["modify"](val)
                     except TypeError as e:
                         logger.debug(f"Error modifying table value {kname} : {val} - {e}")
+                column_vals[s_name] = val
+
+        # Look up the background colours for the whole column at once
+        cell_colours = dict()
+        if header["scale"] and c_scale is not None:
+            coloured = [s_name for s_name, val in column_vals.items() if val not in header.get("bgcols", {}).keys()]
+            cell_colours = dict(
+                zip(
+                    coloured,
+                    c_scale.get_colour_list(
+                        [column_vals[s_name] for s_name in coloured], source=f"Table {table_id}, column {k}"
+                    ),
+                )
+            )
 
-                if c_scale and c_scale.name not in c_scale.qualitative_scales:
-                    try:
-                        dmin = header["dmin"]
-                        dmax = header["dmax"]
-                        percentage = ((float(val) - dmin) / (dmax - dmin)) * 100
-                        # Treat 0 as 0-width and make bars width of absolute value
-                        if header.get("bars_zero_centrepoint"):
-                            dmax = max(abs(header["dmin"]), abs(header["dmax"]))
-                            dmin = 0
-                            percentage = ((abs(float(val)) - dmin) / (dmax - dmin)) * 100
-                        percentage = min(percentage, 100)
-                        percentage = max(percentage, 0)
-                    except (ZeroDivisionError, ValueError, TypeError):
-                        percentage = 0
-                else:
-                    percentage = 100
-
-                if "format" in header and callable(header["format"]):
-                    valstring = header["format"](val)
-                else:
-                    try:
-                        # "format" is a format string?
-                        valstring = str(header["format"].format(val))
-                    except ValueError:
-                        try:
-                            valstring = str(header["format"].format(float(val)))
-                        except ValueError:
-                            valstring = str(val)
-                    except Exception:
-                        valstring = str(val)
-
-                    # This is horrible, but Python locale settings are worse
-                    if config.thousandsSep_format is None:
-                        config.thousandsSep_format = '<span class="mqc_thousandSep"></span>'
-                    if config.decimalPoint_format is None:
-                        config.decimalPoint_format = "."
-                    valstring = valstring.replace(".", "DECIMAL").replace(",", "THOUSAND")
-                    valstring = valstring.replace("DECIMAL", config.decimalPoint_format).replace(
-                        "THOUSAND", config.thousandsSep_format
-                    )
-
-                # Percentage suffixes etc
-                valstring += header.get("suffix", "")
-
-                # Conditional formatting
-                # Build empty dict for cformatting matches
-                cmatches = {}
-                for cfc in cond_formatting_colours:
-                    for cfck in cfc:
-                        cmatches[cfck] = False
-                # Find general rules followed by column-specific rules
-                for cfk in ["all_columns", rid, table_id]:
-                    if cfk in cond_formatting_rules:
-                        # Loop through match types
-                        for ftype in cmatches.keys():
-                            # Loop through array of comparison types
-                            for cmp in cond_formatting_rules[cfk].get(ftype, []):
-                                try:
-                                    # Each comparison should be a dict with single key: val
-                                    if "s_eq" in cmp and str(cmp["s_eq"]).lower() == str(val).lower():
-                                        cmatches[ftype] = True
-                                    if "s_contains" in cmp and str(cmp["s_contains"]).lower() in str(val).lower():
-                                        cmatches[ftype] = True
-                                    if "s_ne" in cmp and str(cmp["s_ne"]).lower() != str(val).lower():
-                                        cmatches[ftype] = True
-                                    if "eq" in cmp and float(cmp["eq"]) == float(val):
-                                        cmatches[ftype] = True
-                                    if "ne" in cmp and float(cmp["ne"]) != float(val):
-                                        cmatches[ftype] = True
-                                    if "gt" in cmp and float(cmp["gt"]) < float(val):
-                                        cmatches[ftype] = True
-                                    if "lt" in cmp and float(cmp["lt"]) > float(val):
-                                        cmatches[ftype] = True
-                                except Exception:
-                                    logger.warning(
-                                        "Not able to apply table conditional formatting to '{}' ({})".format(val, cmp)
-                                    )
-                # Apply HTML in order of config keys
-                badge_col = None
-                for cfc in cond_formatting_colours:
-                    for cfck in cfc:  # should always be one, but you never know
-                        if cmatches[cfck]:
-                            badge_col = cfc[cfck]
-                if badge_col is not None:
-                    valstring = '<span class="badge" style="background-color:{}">{}</span>'.format(badge_col, valstring)
-
-                # Categorical background colours supplied
-                if val in header.get("bgcols", {}).keys():
-                    col = 'style="background-color:{} !important;"'.format(header["bgcols"][val])
-                    if s_name not in t_rows:
-                        t_rows[s_name] = dict()
-                    t_rows[s_name][rid] = '<td val="{val}" class="{rid} {h}" {c}>{v}</td>'.format(
-                        val=val, rid=rid, h=hide, c=col, v=valstring
-                    )
-
-                # Build table cell background colour bar
-                elif header["scale"]:
-                    if c_scale is not None:
-                        col = " background-color:{} !important;".format(
-                            c_scale.get_colour(val, source=f"Table {table_id}, column {k}")
-                        )
-                    else:
-                        col = ""
-                    bar_html = '<span class="bar" style="width:{}%;{}"></span>'.format(percentage, col)
-                    val_html = '<span class="val">{}</span>'.format(valstring)
-                    wrapper_html = '<div class="wrapper">{}{}</div>'.format(bar_html, val_html)
-
-                    if s_name not in t_rows:
-                        t_rows[s_name] = dict()
-                    t_rows[s_name][rid] = '<td val="{val}" class="data-coloured {rid} {h}">{c}</td>'.format(
-                        val=val, rid=rid, h=hide, c=wrapper_html
-                    )
-
-                # Scale / background colours are disabled
-                else:
-                    if s_name not in t_rows:
-                        t_rows[s_name] = dict()
-                    t_rows[s_name][rid] = '<td val="{val}" class="{rid} {h}">{v}</td>'.format(
-                        val=val, rid=rid, h=hide, v=valstring
-                    )
-
-                # Is this cell hidden or empty?
-                if s_name not in t_rows_empty:
-                    t_rows_empty[s_name] = dict()
-                t_rows_empty[s_name][rid] = header.get("hidden", False) or str(val).strip() == ""
+        # Work out the bar widths, value strings and conditional formatting for the whole column
+        s_names = list(column_vals.keys())
+        vals = list(column_vals.values())
+        floats, is_float = _column_floats(vals)
+        if c_scale and c_scale.name not in c_scale.qualitative_scales:
+            percentages = _column_percentages(floats, is_float, header)
+        else:
+            percentages = [100] * len(vals)
+        texts, translate = _column_texts(vals, header)
+        badge_cols = _column_badges(
+            vals, floats, is_float, cond_formatting_rules, cond_formatting_colours, rid, table_id
+        )
+
+        # Cells of virtual tables are built by the browser from the values and the column config
+        if virtual:
+            v_columns[rid], texts = _virtual_column(header, texts, translate, c_scale)
+            for i, s_name in enumerate(s_names):
+                val = vals[i]
+                t_rows.setdefault(s_name, dict())[rid] = True
+                v_cells[rid][s_name] = {
+                    # Value used for sorting and plotting
+                    "val": val if val is None or isinstance(val, (str, int, float)) else str(val),
+                    "text": texts[i],
+                    "pct": percentages[i],
+                    "colour": str(cell_colours[s_name]) if c_scale is not None and s_name in cell_colours else None,
+                    "bgcol": header["bgcols"][val] if val in header.get("bgcols", {}).keys() else None,
+                    "badge": badge_cols[i],
+                }
+                t_rows_empty.setdefault(s_name, dict())[rid] = header.get("hidden", False) or str(val).strip() == ""
+            texts = []
+
+        valstrings = _column_valstrings(texts, translate, header)
+
+        # Add the data table cells
+        for s_name, val, percentage, valstring, badge_col in zip(s_names, vals, percentages, valstrings, badge_cols):
+            if badge_col is not None:
+                valstring = '<span class="badge" style="background-color:{}">{}</span>'.format(badge_col, valstring)
+
+            # Categorical background colours supplied
+            if val in header.get("bgcols", {}).keys():
+                col = 'style="background-color:{} !important;"'.format(header["bgcols"][val])
+                if s_name not in t_rows:
+                    t_rows[s_name] = dict()
+                t_rows[s_name][rid] = '<td val="{val}" class="{rid} {h}" {c}>{v}</td>'.format(
+                    val=val, rid=rid, h=hide, c=col, v=valstring
+                )
+
+            # Build table cell background colour bar
+            elif header["scale"]:
+                col = f" background-color:{cell_colours[s_name]} !important;" if c_scale is not None else ""
+                if s_name not in t_rows:
+                    t_rows[s_name] = dict()
+                t_rows[s_name][rid] = (
+                    f'<td val="{val}" class="data-coloured {rid} {hide}"><div class="wrapper">'
+                    f'<span class="bar" style="width:{percentage}%;{col}"></span>'
+                    f'<span class="val">{valstring}</span></div></td>'
+                )
+
+            # Scale / background colours are disabled
+            else:
+                if s_name not in t_rows:
+                    t_rows[s_name] = dict()
+                t_rows[s_name][rid] = '<td val="{val}" class="{rid} {h}">{v}</td>'.format(
+                    val=val, rid=rid, h=hide, v=valstring
+                )
+
+            # Is this cell hidden or empty?
+            if s_name not in t_rows_empty:
+                t_rows_empty[s_name] = dict()
+            t_rows_empty[s_name][rid] = header.get("hidden", False) or str(val).strip() == ""
 
         # Remove header if we don't have any filled cells for it
         if sum([len(rows) for rows in t_rows.values()]) == 0:
@@ -297,7 +279,14 @@ def make_table(dt: table_object.DataTable):
     html = ""
     if not config.simple_output:
         # Copy Table Button
-        html += """
+        if virtual:
+            html += """
+        <button type="button" class="mqc_table_copy_btn mqc_virtual_table_copy_btn btn btn-default btn-sm" data-target="#{tid}">
+            <span class="glyphicon glyphicon-copy"></span> Copy table
+        </button>
+        """.format(tid=table_id)
+        else:
+            html += """
         <button type="button" class="mqc_table_copy_btn btn btn-default btn-sm" data-clipboard-target="#{tid}">
             <span class="glyphicon glyphicon-copy"></span> Copy table
         </button>
@@ -350,34 +339,49 @@ def make_table(dt: table_object.DataTable):
         <small id="{tid}_numrows_text" class="mqc_table_numrows_text">{rows}{cols}.</small>
         """.format(tid=table_id, rows=t_showing_rows_txt, cols=t_showing_cols_txt)
 
-    # Build the table itself
+    # Build the table itself. Virtual tables always scroll in a fixed height container.
     collapse_class = "mqc-table-collapse" if len(t_rows) > 10 and config.collapse_tables else ""
+    table_class = "mqc_table"
+    if virtual:
+        collapse_class = "mqc-table-collapse"
+        table_class = "mqc_table mqc_table_virtual"
     html += """
         <div id="{tid}_container" class="mqc_table_container">
             <div class="table-responsive mqc-table-responsive {cc}">
-                <table id="{tid}" class="table table-condensed mqc_table" data-title="{title}">
-        """.format(tid=table_id, title=table_title, cc=collapse_class)
+                <table id="{tid}" class="table table-condensed {tc}" data-title="{title}">
+        """.format(tid=table_id, title=table_title, cc=collapse_class, tc=table_class)
 
     # Build the header row
     col1_header = dt.pconfig.get("col1_header", "Sample Name")
     html += '<thead><tr><th class="rowheader">{}</th>{}</tr></thead>'.format(col1_header, "".join(t_headers.values()))
 
     # Build the table body
-    html += "<tbody>"
+    body = ["<tbody>"]
     t_row_keys = t_rows.keys()
     if dt.pconfig.get("sortRows") is not False:
         t_row_keys = sorted(t_row_keys)
+    if virtual:
+        # Rows are built by the browser as they scroll into view
+        t_row_keys = list(t_row_keys)
+        report.plot_data[table_id] = {
+            "plot_type": "table",
+            "samples": t_row_keys,
+            "separators": [config.decimalPoint_format, config.thousandsSep_format],
+            "columns": {rid: _virtual_column_cells(v_columns[rid], v_cells[rid], t_row_keys) for rid in t_headers},
+        }
+        t_row_keys = []
     for s_name in t_row_keys:
         # Hide the row if all cells are empty or hidden
         row_hidden = ' style="display:none"' if all(t_rows_empty[s_name].values()) else ""
-        html += "<tr{}>".format(row_hidden)
+        body.append("<tr{}>".format(row_hidden))
         # Sample name row header
-        html += '<th class="rowheader" data-original-sn="{sn}">{sn}</th>'.format(sn=s_name)
-        for k in t_headers:
-            html += t_rows[s_name].get(k, empty_cells[k])
-        html += "</tr>"
-    html += "</tbody></table></div>"
-    if len(t_rows) > 10 and config.collapse_tables:
+        body.append('<th class="rowheader" data-original-sn="{sn}">{sn}</th>'.format(sn=s_name))
+        row = t_rows[s_name]
+        body.extend(row.get(k, empty_cells[k]) for k in t_headers)
+        body.append("</tr>")
+    body.append("</tbody></table></div>")
+    html += "".join(body)
+    if len(t_rows) > 10 and config.collapse_tables and not virtual:
         html += '<div class="mqc-table-expand"><span class="glyphicon glyphicon-chevron-down" aria-hidden="true"></span></div>'
     html += "</div>"
 
@@ -425,3 +429,265 @@ def make_table(dt: table_object.DataTable):
         report.saved_raw_data[fn] = dt.raw_vals
 
     return html
+
+
+def _column_floats(vals):
+    """
+    Convert the values of a table column to floats. Returns a float array (NaN where the value
+    can't be converted) and a boolean array saying which values could be converted.
+    """
+    floats = np.full(len(vals), np.nan)
+    is_float = np.zeros(len(vals), dtype=bool)
+    for i, val in enumerate(vals):
+        try:
+            floats[i] = float(val)
+            is_float[i] = True
+        except Exception:
+            pass
+    return floats, is_float
+
+
+def _column_percentages(floats, is_float, header):
+    """Width of the background bar for each cell in a column, as a percentage"""
+    try:
+        dmin = header["dmin"]
+        dmax = header["dmax"]
+        drange = dmax - dmin
+        if header.get("bars_zero_centrepoint"):
+            # Treat 0 as 0-width and make bars width of absolute value
+            if drange == 0:
+                raise ZeroDivisionError
+            dmax = max(abs(header["dmin"]), abs(header["dmax"]))
+            dmin = 0
+            drange = dmax - dmin
+            floats = np.abs(floats)
+        if drange == 0:
+            raise ZeroDivisionError
+        percentages = (((floats - dmin) / drange) * 100).tolist()
+    except (ZeroDivisionError, ValueError, TypeError):
+        return [0] * len(floats)
+    # Keep the same types as min(percentage, 100) and max(percentage, 0) for the HTML
+    return [(100 if p > 100 else 0 if p < 0 else p) if ok else 0 for p, ok in zip(percentages, is_float.tolist())]
+
+
+def _column_texts(vals, header):
+    """
+    Formatted values of the cells in a column, before swapping the decimal and thousands separators and
+    adding the suffix. Also returns whether the separators should be swapped, which isn't done for format functions.
+    """
+    if "format" in header and callable(header["format"]):
+        return [header["format"](val) for val in vals], False
+
+    valstrings = []
+    for val in vals:
+        try:
+            # "format" is a format string?
+            valstrings.append(str(header["format"].format(val)))
+        except ValueError:
+            try:
+                valstrings.append(str(header["format"].format(float(val))))
+            except ValueError:
+                valstrings.append(str(val))
+        except Exception:
+            valstrings.append(str(val))
+    return valstrings, True
+
+
+def _separators():
+    """Decimal point and thousands separator for the table cells"""
+    # This is horrible, but Python locale settings are worse
+    if config.thousandsSep_format is None:
+        config.thousandsSep_format = '<span class="mqc_thousandSep"></span>'
+    if config.decimalPoint_format is None:
+        config.decimalPoint_format = "."
+    return config.decimalPoint_format, config.thousandsSep_format
+
+
+def _column_valstrings(texts, translate, header):
+    """Value strings for the cells in a column, from _column_texts()"""
+    suffix = header.get("suffix", "")
+    if not translate:
+        return [text + suffix for text in texts]
+
+    placeholders = ["DECIMAL", "THOUSAND"]
+    decimal_point, thousands_sep = _separators()
+    separators = str.maketrans({".": decimal_point, ",": thousands_sep})
+    if any(p in sep for p in placeholders for sep in [decimal_point, thousands_sep]):
+        separators = None
+    valstrings = list(texts)
+    for i, valstring in enumerate(valstrings):
+        # Swap both separators in one pass, unless the value happens to contain the placeholder words
+        if separators is not None and not any(p in valstring for p in placeholders):
+            valstring = valstring.translate(separators)
+        else:
+            valstring = valstring.replace(".", "DECIMAL").replace(",", "THOUSAND")
+            valstring = valstring.replace("DECIMAL", config.decimalPoint_format).replace(
+                "THOUSAND", config.thousandsSep_format
+            )
+        valstrings[i] = valstring + suffix
+    return valstrings
+
+
+def _column_badges(vals, floats, is_float, cond_formatting_rules, cond_formatting_colours, rid, table_id):
+    """
+    Conditional formatting badge colour for each cell in a column (None for no badge).
+    Each comparison is tested against the whole column at once.
+    """
+    # Matches for each type of conditional formatting
+    cmatches = {}
+    for cfc in cond_formatting_colours:
+        for cfck in cfc:
+            cmatches[cfck] = np.zeros(len(vals), dtype=bool)
+
+    str_vals = None
+    # Find general rules followed by column-specific rules
+    for cfk in ["all_columns", rid, table_id]:
+        if cfk not in cond_formatting_rules:
+            continue
+        # Loop through match types
+        for ftype in cmatches.keys():
+            # Loop through array of comparison types
+            for cmp in cond_formatting_rules[cfk].get(ftype, []):
+                if str_vals is None:
+                    str_vals = np.array([str(val).lower() for val in vals], dtype=object)
+                # Cells that are still being compared. A comparison that fails for a cell
+                # skips the rest of the comparisons in cmp for that cell.
+                ok = np.ones(len(vals), dtype=bool)
+                failed = np.zeros(len(vals), dtype=bool)
+                try:
+                    # Each comparison should be a dict with single key: val
+                    if "s_eq" in cmp:
+                        cmatches[ftype] |= str_vals == str(cmp["s_eq"]).lower()
+                    if "s_contains" in cmp:
+                        needle = str(cmp["s_contains"]).lower()
+                        cmatches[ftype] |= np.array([needle in s for s in str_vals], dtype=bool)
+                    if "s_ne" in cmp:
+                        cmatches[ftype] |= str_vals != str(cmp["s_ne"]).lower()
+                    for op, compare in [
+                        ("eq", np.equal),
+                        ("ne", np.not_equal),
+                        ("gt", np.less),
+                        ("lt", np.greater),
+                    ]:
+                        if op in cmp:
+                            cmp_val = float(cmp[op])
+                            failed |= ok & ~is_float
+                            ok &= is_float
+                            cmatches[ftype] |= ok & compare(cmp_val, floats)
+                except Exception:
+                    failed = ok | failed
+                for i in np.flatnonzero(failed):
+                    logger.warning("Not able to apply table conditional formatting to '{}' ({})".format(vals[i], cmp))
+
+    # Apply HTML in order of config keys
+    badge_cols = [None] * len(vals)
+    for cfc in cond_formatting_colours:
+        for cfck in cfc:  # should always be one, but you never know
+            for i in np.flatnonzero(cmatches[cfck]).tolist():
+                badge_cols[i] = cfc[cfck]
+    return badge_cols
+
+
+def _virtual_column(header, texts, translate, c_scale):
+    """
+    Config for building the cells of a virtual table column in the browser. Returns the config
+    and the cell texts, which have the separators swapped already if the browser can't do it.
+    """
+    if translate:
+        placeholders = ["DECIMAL", "THOUSAND"]
+        if any(p in sep for p in placeholders for sep in _separators()) or any(
+            p in text for p in placeholders for text in texts
+        ):
+            # The browser swaps both separators in one pass, which only gives the same result without these
+            texts = _column_valstrings(texts, True, {})
+            translate = False
+    column = {"kind": "bar" if header["scale"] else "plain", "suffix": header.get("suffix", ""), "translate": translate}
+    fixed_format = FIXED_FORMAT_RE.match(header["format"]) if isinstance(header.get("format"), str) else None
+    if translate and fixed_format is not None:
+        column["fmt"] = [fixed_format.group(1) == ",", int(fixed_format.group(2))]
+    column["scaled"] = bool(header["scale"]) and c_scale is not None
+    return column, texts
+
+
+def _js_fixed(val, thousands, decimals):
+    """The value formatted like Number.toFixed(decimals) in the browser, with commas between thousands if set"""
+    try:
+        x = float(val)
+    except OverflowError:
+        return None
+    # toFixed() switches to exponent notation for large numbers
+    if not math.isfinite(x) or abs(x) >= 1e21:
+        return None
+    with decimal.localcontext() as ctx:
+        ctx.prec = 100
+        # Rounds the exact binary value, with ties going away from zero
+        text = "{:f}".format(
+            decimal.Decimal(abs(x)).quantize(decimal.Decimal(1).scaleb(-decimals), rounding=decimal.ROUND_HALF_UP)
+        )
+    if thousands:
+        int_part, point, frac = text.partition(".")
+        text = "{:,}".format(int(int_part)) + point + frac
+    return ("-" if x < 0 else "") + text
+
+
+def _js_text(val, column):
+    """Cell text that the browser shows for a value when the text isn't saved, or None if it can't make it"""
+    if type(val) is str:
+        return val
+    if type(val) in (int, float) and "fmt" in column:
+        return _js_fixed(val, *column["fmt"])
+    if type(val) is int and abs(val) < 2**53:
+        return str(val)
+    return None
+
+
+def _virtual_column_cells(column, cells, s_names):
+    """
+    Data for a virtual table column, in the order of s_names. Cell texts are only saved when the browser
+    can't make them from the values. Background colours are indexes into a palette of the column's colours,
+    and categorical background colours, badges and missing cells are saved only for the cells that have them.
+    """
+    data = {k: v for k, v in column.items() if k != "scaled"}
+    vals = []
+    texts = []
+    pcts = []
+    colours = []
+    palette = dict()
+    bgcols = dict()
+    badges = dict()
+    missing = []
+    for i, s_name in enumerate(s_names):
+        cell = cells.get(s_name)
+        if cell is None:
+            missing.append(i)
+            vals.append(None)
+            texts.append(None)
+            pcts.append(0)
+            colours.append(None)
+            continue
+        vals.append(cell["val"])
+        texts.append(None if _js_text(cell["val"], column) == cell["text"] else cell["text"])
+        pct = cell["pct"]
+        pcts.append(round(pct, 2) if isinstance(pct, float) else pct)
+        colour = cell["colour"]
+        colours.append(None if colour is None else palette.setdefault(colour, len(palette)))
+        if cell["bgcol"] is not None:
+            bgcols[i] = cell["bgcol"]
+        if cell["badge"] is not None:
+            badges[i] = cell["badge"]
+
+    data["vals"] = vals
+    if any(text is not None for text in texts):
+        data["text"] = texts
+    if column["kind"] == "bar":
+        data["pct"] = pcts
+        if column["scaled"]:
+            data["palette"] = list(palette)
+            data["colour"] = colours
+    if bgcols:
+        data["bgcol"] = bgcols
+    if badges:
+        data["badge"] = badges
+    if missing:
+        data["missing"] = missing
+    return data
@@ -20,3 +20,8 @@ import os
 
 template_dir = os.path.dirname(__file__)
 base_fn = "base.html"
+
+# The report JavaScript can decode gzip compressed plot data, much faster to create than lzstring
+plot_data_compression = "gzip"
+# Plot data is compressed separately for each plot and only decoded when the plot is shown
+plot_data_per_plot = True
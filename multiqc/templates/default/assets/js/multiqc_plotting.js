@@ -22,9 +22,6 @@ $(function () {
   // Show loading warning
   $(".mqc_loading_warning").show();
 
-  // Decompress the JSON plot data
-  mqc_plots = JSON.parse(LZString.decompressFromBase64(mqc_compressed_plotdata));
-
   // HighCharts Defaults
   window.HCDefaults = $.extend(true, {}, Highcharts.getOptions(), {});
   Highcharts.setOptions({
@@ -61,20 +58,53 @@ $(function () {
     },
   });
 
-  // Render plots on page load
-  $(".hc-plot.not_rendered:visible:not(.gt_max_num_ds)").each(function () {
-    var target = $(this).attr("id");
-    // Only one point per dataset, so multiply limit by arbitrary number.
-    var max_num = mqc_config["num_datasets_plot_limit"] * 50;
-    // Deferring each plot call prevents browser from locking up
-    setTimeout(function () {
-      plot_graph(target, undefined, max_num);
-      if ($(".hc-plot.not_rendered:visible:not(.gt_max_num_ds)").length == 0) {
-        $(".mqc_loading_warning").hide();
-      }
-    }, 50);
-  });
-  if ($(".hc-plot.not_rendered:visible:not(.gt_max_num_ds)").length == 0) {
+  // Render plots on page load. Where the browser supports it, plots are only rendered (and their
+  // data decoded) when they are scrolled into view, so that big reports can be used straight away.
+  var onload_plots = $(".hc-plot.not_rendered:visible:not(.gt_max_num_ds)");
+  var render_onload = function (targets) {
+    return Promise.all(
+      targets.map(function (target) {
+        return new Promise(function (resolve) {
+          // Deferring each plot call prevents browser from locking up
+          setTimeout(function () {
+            // Only one point per dataset, so multiply limit by arbitrary number.
+            var max_num = mqc_config["num_datasets_plot_limit"] * 50;
+            resolve(plot_graph(target, undefined, max_num));
+          }, 50);
+        });
+      }),
+    );
+  };
+  if (typeof IntersectionObserver === "undefined") {
+    var targets = onload_plots.map(function () {
+      return $(this).attr("id");
+    });
+    render_onload(targets.get()).then(function () {
+      $(".mqc_loading_warning").hide();
+    });
+  } else {
+    var plot_observer = new IntersectionObserver(
+      function (entries, observer) {
+        var targets = [];
+        entries.forEach(function (entry) {
+          if (entry.isIntersecting) {
+            observer.unobserve(entry.target);
+            if ($(entry.target).is(".not_rendered:not(.gt_max_num_ds)")) {
+              targets.push($(entry.target).attr("id"));
+            }
+          }
+        });
+        render_onload(targets).then(function () {
+          $(".mqc_loading_warning").hide();
+        });
+      },
+      { rootMargin: "500px 0px" },
+    );
+    onload_plots.each(function () {
+      plot_observer.observe(this);
+    });
+  }
+  if (onload_plots.length == 0) {
     $(".mqc_loading_warning").hide();
   }
 
@@ -112,6 +142,14 @@ $(function () {
     $(this).addClass("active");
     var target = $(this).data("target");
     var action = $(this).data("action");
+    // Decode the plot data first if the plot hasn't been shown yet
+    if (mqc_plots[target] === undefined && mqc_compressed_plotdata[target] !== undefined) {
+      var button = this;
+      mqc_load_plot_data(target).then(function () {
+        $(button).click();
+      });
+      return;
+    }
     // Switch between values and percentages
     if (action == "set_percent" || action == "set_numbers") {
       var sym = action == "set_percent" ? "%" : "#";
@@ -227,6 +265,13 @@ $(function () {
   $(".mqc_heatmap_sortHighlight").click(function (e) {
     e.preventDefault();
     var target = $(this).data("target").substr(1);
+    if (mqc_plots[target] === undefined && mqc_compressed_plotdata[target] !== undefined) {
+      var button = this;
+      mqc_load_plot_data(target).then(function () {
+        $(button).click();
+      });
+      return;
+    }
     if (mqc_plots[target]["config"]["sortHighlights"] == true) {
       mqc_plots[target]["config"]["sortHighlights"] = false;
       $(this).removeClass("active");
@@ -239,9 +284,105 @@ $(function () {
   });
 });
 
+// Load the data for a plot the first time that it is needed. Returns a Promise for the plot data.
+// The compressed data for each plot is kept in its own script element until then (see head.html).
+var mqc_plotdata_loading = {};
+function mqc_load_plot_data(target) {
+  if (mqc_plots[target] !== undefined || mqc_compressed_plotdata[target] === undefined) {
+    return Promise.resolve(mqc_plots[target]);
+  }
+  if (mqc_plotdata_loading[target] === undefined) {
+    var el = mqc_compressed_plotdata[target];
+    var decoded = mqc_decompress_plotdata(el.textContent, el.getAttribute("data-compression"));
+    mqc_plotdata_loading[target] = decoded.then(function (plotdata) {
+      mqc_plots[target] = plotdata;
+      delete mqc_compressed_plotdata[target];
+      delete mqc_plotdata_loading[target];
+      // Free the compressed data
+      el.remove();
+      return plotdata;
+    });
+  }
+  return mqc_plotdata_loading[target];
+}
+
+// Decode the base64 plot data embedded in the report. Returns a Promise for the plot data object.
+// gzip data is decoded natively with DecompressionStream where available, or with JSZip in older browsers.
+// Reports from templates that don't support gzip use LZString.
+function mqc_decompress_plotdata(data, compression) {
+  if (compression != "gzip") {
+    return Promise.resolve(JSON.parse(LZString.decompressFromBase64(data)));
+  }
+  var binary = atob(data);
+  var bytes = new Uint8Array(binary.length);
+  for (var i = 0; i < binary.length; i++) {
+    bytes[i] = binary.charCodeAt(i);
+  }
+  if (typeof DecompressionStream !== "undefined") {
+    var stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream("gzip"));
+    return new Response(stream).text().then(JSON.parse);
+  }
+  return JSZip.loadAsync(mqc_gzip_to_zip(bytes))
+    .then(function (zip) {
+      return zip.file("plotdata.json").async("string");
+    })
+    .then(JSON.parse);
+}
+
+// Wrap the deflate stream from gzip data in a zip file with a single entry, so that JSZip can read it.
+// Assumes a plain 10 byte gzip header, as written by MultiQC. The gzip trailer has the CRC32 and size.
+function mqc_gzip_to_zip(gz) {
+  var name = "plotdata.json";
+  var deflated = gz.subarray(10, gz.length - 8);
+  var trailer = new DataView(gz.buffer, gz.byteOffset + gz.length - 8, 8);
+  var crc32 = trailer.getUint32(0, true);
+  var size = trailer.getUint32(4, true);
+  var zip = new Uint8Array(30 + name.length + deflated.length + 46 + name.length + 22);
+  var view = new DataView(zip.buffer);
+  // Local file header
+  view.setUint32(0, 0x04034b50, true);
+  view.setUint16(4, 20, true); // version needed to extract
+  view.setUint16(8, 8, true); // deflate
+  view.setUint32(14, crc32, true);
+  view.setUint32(18, deflated.length, true);
+  view.setUint32(22, size, true);
+  view.setUint16(26, name.length, true);
+  for (var i = 0; i < name.length; i++) {
+    zip[30 + i] = name.charCodeAt(i);
+  }
+  zip.set(deflated, 30 + name.length);
+  // Central directory
+  var cd = 30 + name.length + deflated.length;
+  view.setUint32(cd, 0x02014b50, true);
+  view.setUint16(cd + 4, 20, true); // version made by
+  view.setUint16(cd + 6, 20, true); // version needed to extract
+  view.setUint16(cd + 10, 8, true); // deflate
+  view.setUint32(cd + 16, crc32, true);
+  view.setUint32(cd + 20, deflated.length, true);
+  view.setUint32(cd + 24, size, true);
+  view.setUint16(cd + 28, name.length, true);
+  for (var i = 0; i < name.length; i++) {
+    zip[cd + 46 + i] = name.charCodeAt(i);
+  }
+  // End of central directory
+  var eocd = cd + 46 + name.length;
+  view.setUint32(eocd, 0x06054b50, true);
+  view.setUint16(eocd + 8, 1, true); // entries on this disk
+  view.setUint16(eocd + 10, 1, true); // total entries
+  view.setUint32(eocd + 12, 46 + name.length, true);
+  view.setUint32(eocd + 16, cd, true);
+  return zip;
+}
+
 // Call to render any plot
 function plot_graph(target, ds, max_num) {
   if (mqc_plots[target] === undefined) {
+    // Plot shown for the first time, decode the data and then render it
+    if (mqc_compressed_plotdata[target] !== undefined) {
+      return mqc_load_plot_data(target).then(function () {
+        return plot_graph(target, ds, max_num);
+      });
+    }
     return false;
   }
 
@@ -65,18 +65,42 @@ $(function () {
 
       return text;
     };
-    $(".mqc_table").tablesorter({ sortInitialOrder: "desc", textExtraction: get_sort_val });
+    $(".mqc_table:not(.mqc_table_virtual)").tablesorter({ sortInitialOrder: "desc", textExtraction: get_sort_val });
 
     // Update tablesorter if samples renamed
     $(document).on("mqc_renamesamples", function (e, f_texts, t_texts, regex_mode) {
-      $(".mqc_table").trigger("update");
+      $(".mqc_table:not(.mqc_table_virtual)").trigger("update");
+    });
+
+    // Load the data for virtual tables and render the first rows
+    $(".mqc_table_virtual").each(function () {
+      mqc_virtual_table_init($(this).attr("id"));
+    });
+
+    // Sort virtual tables on the data, as most rows are not in the page
+    $(".mqc_table_virtual thead th").click(function () {
+      var th = $(this);
+      var tid = th.closest("table").attr("id");
+      var desc = !th.hasClass("headerSortDown");
+      th.closest("thead").find("th").removeClass("headerSortDown headerSortUp");
+      th.addClass(desc ? "headerSortDown" : "headerSortUp");
+      var c_id = th.attr("id");
+      mqc_virtual_table_each(function (vt) {
+        mqc_virtual_table_sort(vt, c_id === undefined ? undefined : c_id.replace(/^header_/, ""), desc);
+      }, tid);
     });
 
     // Copy table contents to clipboard
-    var clipboard = new Clipboard(".mqc_table_copy_btn");
+    var clipboard = new Clipboard(".mqc_table_copy_btn:not(.mqc_virtual_table_copy_btn)");
     clipboard.on("success", function (e) {
       e.clearSelection();
     });
+    // Virtual tables are copied from the data, as most rows are not in the page
+    new Clipboard(".mqc_virtual_table_copy_btn", {
+      text: function (trigger) {
+        return mqc_virtual_table_tsv($(trigger).data("target").replace(/^#/, ""));
+      },
+    });
     $(".mqc_table_copy_btn").click(function () {
       var btn = $(this);
       btn.addClass("active").html('<span class="glyphicon glyphicon-copy"></span> Copied!');
@@ -93,6 +117,23 @@ $(function () {
         .css("transform", "translate(0," + $(this).scrollTop() + "px)");
     });
 
+    // Render the rows of virtual tables that have scrolled into view
+    $(".mqc_table_virtual").each(function () {
+      var tid = $(this).attr("id");
+      var frame_requested = false;
+      $(this)
+        .closest(".mqc-table-responsive")
+        .scroll(function () {
+          if (!frame_requested) {
+            frame_requested = true;
+            window.requestAnimationFrame(function () {
+              frame_requested = false;
+              mqc_virtual_table_render(tid);
+            });
+          }
+        });
+    });
+
     // Table header-specific bootstrap tooltips
     $(".mqc_table_tooltip").tooltip({ container: "body" });
 
@@ -132,6 +173,12 @@ $(function () {
           $(target + "_configModal_table ." + cclass).addClass("text-muted");
         }
       });
+      // Virtual tables work out the empty rows from the data
+      if ($(target).hasClass("mqc_table_virtual")) {
+        mqc_virtual_table_each(mqc_virtual_table_update, target.replace(/^#/, ""));
+        $(target + "_numcols").text($(target + " thead th:visible").length - 1);
+        return;
+      }
       // Hide empty rows
       $(target + " tbody tr").show();
       $(target + " tbody tr").each(function () {
@@ -177,7 +224,19 @@ $(function () {
     $(document).on("mqc_highlights", function (e, f_texts, f_cols, regex_mode) {
       $(".mqc_table_sortHighlight").hide();
       $(".mqc_table tbody th").removeClass("highlighted").removeData("highlight");
-      $(".mqc_table tbody th").each(function (i) {
+      mqc_virtual_table_each(function (vt) {
+        vt.highlights = {};
+        $.each(vt.names, function (i, s_name) {
+          $.each(f_texts, function (idx, f_text) {
+            if ((regex_mode && s_name.match(f_text)) || (!regex_mode && s_name.indexOf(f_text) > -1)) {
+              vt.highlights[i] = { idx: idx, col: f_cols[idx] };
+              $(".mqc_table_sortHighlight").show();
+            }
+          });
+        });
+        mqc_virtual_table_render(vt.tid);
+      });
+      $(".mqc_table:not(.mqc_table_virtual) tbody th").each(function (i) {
         var th = $(this);
         var thtext = $(this).text();
         var thiscol = "#333";
@@ -196,6 +255,14 @@ $(function () {
     $(".mqc_table_sortHighlight").click(function (e) {
       e.preventDefault();
       var target = $(this).data("target");
+      if ($(target).hasClass("mqc_table_virtual")) {
+        var direction = $(this).data("direction");
+        mqc_virtual_table_each(function (vt) {
+          mqc_virtual_table_sort_highlights(vt, direction == "desc");
+        }, target.replace(/^#/, ""));
+        $(this).data("direction", direction == "desc" ? "asc" : "desc");
+        return;
+      }
       // collect highlighted rows
       var hrows = $(target + " tbody th.highlighted")
         .parent()
@@ -215,8 +282,7 @@ $(function () {
 
     // Rename samples
     $(document).on("mqc_renamesamples", function (e, f_texts, t_texts, regex_mode) {
-      $(".mqc_table tbody th").each(function () {
-        var s_name = String($(this).data("original-sn"));
+      var rename = function (s_name) {
         $.each(f_texts, function (idx, f_text) {
           if (regex_mode) {
             var re = new RegExp(f_text, "g");
@@ -225,14 +291,41 @@ $(function () {
             s_name = s_name.replace(f_text, t_texts[idx]);
           }
         });
-        $(this).text(s_name);
+        return s_name;
+      };
+      $(".mqc_table:not(.mqc_table_virtual) tbody th").each(function () {
+        $(this).text(rename(String($(this).data("original-sn"))));
+      });
+      mqc_virtual_table_each(function (vt) {
+        vt.names = $.map(vt.data.samples, function (s_name) {
+          return rename(String(s_name));
+        });
+        mqc_virtual_table_render(vt.tid);
       });
     });
 
     // Hide samples
     $(document).on("mqc_hidesamples", function (e, f_texts, regex_mode) {
+      var hide_match = function (hfilter) {
+        var match = false;
+        $.each(f_texts, function (idx, f_text) {
+          if ((regex_mode && hfilter.match(f_text)) || (!regex_mode && hfilter.indexOf(f_text) > -1)) {
+            match = true;
+          }
+        });
+        return window.mqc_hide_mode == "show" ? !match : match;
+      };
+      mqc_virtual_table_each(function (vt) {
+        vt.hidden = {};
+        $.each(vt.names, function (i, s_name) {
+          if (hide_match(s_name)) {
+            vt.hidden[i] = true;
+          }
+        });
+        mqc_virtual_table_update(vt);
+      });
       // Hide rows in MultiQC tables
-      $(".mqc_table tbody th").each(function () {
+      $(".mqc_table:not(.mqc_table_virtual) tbody th").each(function () {
         var match = false;
         var hfilter = $(this).text();
         $.each(f_texts, function (idx, f_text) {
@@ -251,11 +344,13 @@ $(function () {
       });
       $(".mqc_table_numrows").each(function () {
         var tid = $(this).attr("id").replace("_numrows", "");
-        $(this).text($("#" + tid + " tbody tr:visible").length);
+        if (!$("#" + tid).hasClass("mqc_table_virtual")) {
+          $(this).text($("#" + tid + " tbody tr:visible").length);
+        }
       });
 
       // Hide empty columns
-      $(".mqc_table").each(function () {
+      $(".mqc_table:not(.mqc_table_virtual)").each(function () {
         var table = $(this);
         var gsthidx = 0;
         table.find("thead th, tbody tr td").show();
@@ -353,7 +448,19 @@ $(function () {
         },
         datasets: [[]],
       };
-      $(tid + " tbody tr").each(function (e) {
+      if ($(tid).hasClass("mqc_table_virtual")) {
+        var vt = mqc_virtual_tables[tid.replace(/^#/, "")];
+        if (vt !== undefined && vt.data.columns[col1] !== undefined && vt.data.columns[col2] !== undefined) {
+          $.each(vt.rows, function (idx, i) {
+            var val_1 = parseFloat(vt.data.columns[col1].vals[i]);
+            var val_2 = parseFloat(vt.data.columns[col2].vals[i]);
+            if (isFinite(val_1) && isFinite(val_2)) {
+              mqc_plots["tableScatterPlot"]["datasets"][0].push({ name: vt.names[i], x: val_1, y: val_2 });
+            }
+          });
+        }
+      }
+      $(tid + ":not(.mqc_table_virtual) tbody tr").each(function (e) {
         var s_name = $(this).children("th.rowheader").text();
         var val_1 = $(this)
           .children("td." + col1)
@@ -423,4 +530,309 @@ function change_mqc_table_col_order(table) {
       }
     }
   });
+  // Virtual tables build their rows in the new header order
+  mqc_virtual_table_render(target);
+}
+
+////////////////////////////////////////////////
+// Virtual tables
+// The cell values of tables with a very large number of rows are saved in the plot data.
+// Only the rows that are scrolled into view are added to the page, with spacer rows
+// above and below them to keep the scroll height of the full table. The cells are built
+// from the values and the column config in the same way as the cells of other tables.
+////////////////////////////////////////////////
+
+var mqc_virtual_tables = {};
+var mqc_virtual_tables_loading = {};
+// Rows to render above and below the visible ones, so that short scrolls don't show empty space
+var mqc_virtual_table_overscan = 20;
+
+// Load the data for a virtual table. Returns a Promise for the table state.
+function mqc_virtual_table_init(tid) {
+  mqc_virtual_tables_loading[tid] = mqc_load_plot_data(tid).then(function (data) {
+    $.each(data.columns, function (rid, column) {
+      column.is_missing = {};
+      $.each(column.missing || [], function (idx, i) {
+        column.is_missing[i] = true;
+      });
+    });
+    var separators = data.separators || [];
+    var vt = {
+      tid: tid,
+      data: data,
+      // Sample names as currently shown, after renaming
+      names: $.map(data.samples, function (s_name) {
+        return String(s_name);
+      }),
+      // Sample indexes in the current sort order
+      order: $.map(data.samples, function (s_name, i) {
+        return i;
+      }),
+      // Sample indexes to show, after hiding samples and empty rows
+      rows: [],
+      hidden: {},
+      highlights: {},
+      row_height: undefined,
+      decimal_point: separators[0] == null ? "." : separators[0],
+      thousands_sep: separators[1] == null ? '<span class="mqc_thousandSep"></span>' : separators[1],
+    };
+    mqc_virtual_tables[tid] = vt;
+    mqc_virtual_table_update(vt);
+    return vt;
+  });
+  return mqc_virtual_tables_loading[tid];
+}
+
+// Run a function on one or all virtual tables once their data has loaded
+function mqc_virtual_table_each(fn, tid) {
+  $.each(mqc_virtual_tables_loading, function (loading_tid, loading) {
+    if (tid === undefined || tid == loading_tid) {
+      loading.then(fn);
+    }
+  });
+}
+
+// Columns of a virtual table in the current order
+function mqc_virtual_table_columns(tid) {
+  var cols = [];
+  $("#" + tid + " thead th").each(function () {
+    var c_id = $(this).attr("id");
+    if (c_id !== undefined) {
+      cols.push({ rid: c_id.replace(/^header_/, ""), hidden: $(this).hasClass("hidden") });
+    }
+  });
+  return cols;
+}
+
+function mqc_virtual_table_cell_empty(column, i) {
+  if (column === undefined || column.is_missing[i]) {
+    return true;
+  }
+  var val = column.vals[i];
+  return typeof val === "string" && val.trim() === "";
+}
+
+// Work out which rows to show, then render the table
+function mqc_virtual_table_update(vt) {
+  var cols = mqc_virtual_table_columns(vt.tid).filter(function (c) {
+    return !c.hidden;
+  });
+  vt.rows = vt.order.filter(function (i) {
+    if (vt.hidden[i]) {
+      return false;
+    }
+    // Hide the row if all visible cells are empty
+    return cols.some(function (c) {
+      return !mqc_virtual_table_cell_empty(vt.data.columns[c.rid], i);
+    });
+  });
+  $("#" + vt.tid + "_numrows").text(vt.rows.length);
+  mqc_virtual_table_render(vt.tid);
+}
+
+function mqc_virtual_table_escape(text) {
+  return String(text).replace(/&/g, "&amp;").replace(/</g, "&lt;").replace(/>/g, "&gt;").replace(/"/g, "&quot;");
+}
+
+// A number formatted like the "{:,.1f}" style column formats
+function mqc_virtual_table_fixed(val, fmt) {
+  var text = val.toFixed(fmt[1]);
+  if (fmt[0]) {
+    var parts = text.split(".");
+    parts[0] = parts[0].replace(/\B(?=(\d{3})+(?!\d))/g, ",");
+    text = parts.join(".");
+  }
+  return text;
+}
+
+// HTML for a cell of a virtual table, the same as table.py makes for other tables
+function mqc_virtual_table_cell(vt, column, rid, i) {
+  if (column === undefined || column.is_missing[i]) {
+    return '<td class="data-coloured ' + rid + '"></td>';
+  }
+  var val = column.vals[i];
+  var text = column.text === undefined ? null : column.text[i];
+  if (text === null) {
+    text = typeof val === "number" && column.fmt !== undefined ? mqc_virtual_table_fixed(val, column.fmt) : String(val);
+  }
+  if (column.translate) {
+    text = text.replace(/[.,]/g, function (c) {
+      return c == "." ? vt.decimal_point : vt.thousands_sep;
+    });
+  }
+  text += column.suffix;
+  if (column.badge !== undefined && column.badge[i] !== undefined) {
+    text = '<span class="badge" style="background-color:' + column.badge[i] + '">' + text + "</span>";
+  }
+  var val_attr = ' val="' + mqc_virtual_table_escape(val) + '"';
+  if (column.bgcol !== undefined && column.bgcol[i] !== undefined) {
+    return (
+      "<td" +
+      val_attr +
+      ' class="' +
+      rid +
+      '" style="background-color:' +
+      column.bgcol[i] +
+      ' !important;">' +
+      text +
+      "</td>"
+    );
+  }
+  if (column.kind == "bar") {
+    var colour = column.colour === undefined ? null : column.colour[i];
+    var style = colour === null ? "" : " background-color:" + column.palette[colour] + " !important;";
+    return (
+      "<td" +
+      val_attr +
+      ' class="data-coloured ' +
+      rid +
+      '"><div class="wrapper"><span class="bar" style="width:' +
+      column.pct[i] +
+      "%;" +
+      style +
+      '"></span><span class="val">' +
+      text +
+      "</span></div></td>"
+    );
+  }
+  return "<td" + val_attr + ' class="' + rid + '">' + text + "</td>";
+}
+
+// Build the rows of a virtual table that are currently scrolled into view
+function mqc_virtual_table_render(tid) {
+  var vt = mqc_virtual_tables[tid];
+  if (vt === undefined) {
+    return;
+  }
+  var table = $("#" + tid);
+  var tbody = table.find("tbody");
+  var container = table.closest(".mqc-table-responsive");
+  var cols = mqc_virtual_table_columns(tid);
+  var row_height = vt.row_height || 30;
+  var first = Math.max(0, Math.floor(container.scrollTop() / row_height) - mqc_virtual_table_overscan);
+  var last = Math.min(
+    vt.rows.length,
+    Math.ceil((container.scrollTop() + container.innerHeight()) / row_height) + mqc_virtual_table_overscan,
+  );
+  var spacer = function (nrows) {
+    return (
+      '<tr class="mqc_virtual_table_spacer"><td colspan="' +
+      (cols.length + 1) +
+      '" style="height:' +
+      nrows * row_height +
+      'px; padding:0; border:0;"></td></tr>'
+    );
+  };
+  var html = [spacer(first)];
+  for (var r = first; r < last; r++) {
+    var i = vt.rows[r];
+    var th_attrs = ' data-original-sn="' + mqc_virtual_table_escape(vt.data.samples[i]) + '"';
+    if (vt.highlights[i] !== undefined) {
+      th_attrs +=
+        ' class="rowheader highlighted" data-highlight="' +
+        vt.highlights[i].idx +
+        '" style="color:' +
+        vt.highlights[i].col +
+        ';"';
+    } else {
+      th_attrs += ' class="rowheader"';
+    }
+    html.push("<tr><th" + th_attrs + ">" + mqc_virtual_table_escape(vt.names[i]) + "</th>");
+    $.each(cols, function (idx, c) {
+      html.push(mqc_virtual_table_cell(vt, vt.data.columns[c.rid], c.rid, i));
+    });
+    html.push("</tr>");
+  }
+  html.push(spacer(vt.rows.length - last));
+  tbody.html(html.join(""));
+
+  // Cells take their visibility from the column header
+  $.each(cols, function (idx, c) {
+    tbody.find("td." + c.rid).toggleClass("hidden", c.hidden);
+  });
+
+  // Measure the row height the first time rows are shown, and render again if the guess was wrong
+  if (vt.row_height === undefined && last > first) {
+    var height = tbody.find("tr").eq(1).outerHeight();
+    if (height > 0) {
+      vt.row_height = height;
+      if (height != row_height) {
+        mqc_virtual_table_render(tid);
+      }
+    }
+  }
+}
+
+// Value used to sort a cell: numbers first, then text, then empty cells
+function mqc_virtual_table_sort_val(column, i) {
+  if (column === undefined || column.is_missing[i] || column.vals[i] === null) {
+    return [2, ""];
+  }
+  var val = column.vals[i];
+  if (typeof val !== "number" && !isNaN(parseFloat(val)) && isFinite(val)) {
+    val = parseFloat(val);
+  }
+  return typeof val === "number" ? [0, val] : [1, String(val)];
+}
+
+// Sort the rows of a virtual table by a column, or by sample name if rid is undefined
+function mqc_virtual_table_sort(vt, rid, desc) {
+  var keys = {};
+  $.each(vt.order, function (idx, i) {
+    keys[i] = rid === undefined ? [1, vt.names[i]] : mqc_virtual_table_sort_val(vt.data.columns[rid], i);
+  });
+  vt.order.sort(function (a, b) {
+    var ka = keys[a];
+    var kb = keys[b];
+    if (ka[0] != kb[0]) {
+      return ka[0] - kb[0];
+    }
+    var cmp = ka[1] < kb[1] ? -1 : ka[1] > kb[1] ? 1 : 0;
+    return desc ? -cmp : cmp;
+  });
+  mqc_virtual_table_update(vt);
+}
+
+// Move the highlighted rows of a virtual table to the top (desc) or bottom
+function mqc_virtual_table_sort_highlights(vt, desc) {
+  var hrows = vt.order.filter(function (i) {
+    return vt.highlights[i] !== undefined;
+  });
+  var others = vt.order.filter(function (i) {
+    return vt.highlights[i] === undefined;
+  });
+  hrows.sort(function (a, b) {
+    return vt.highlights[a].idx - vt.highlights[b].idx;
+  });
+  vt.order = desc ? hrows.reverse().concat(others) : others.concat(hrows);
+  mqc_virtual_table_update(vt);
+}
+
+// Tab-separated text of the visible rows and columns of a virtual table
+function mqc_virtual_table_tsv(tid) {
+  var vt = mqc_virtual_tables[tid];
+  if (vt === undefined) {
+    return "";
+  }
+  var cols = mqc_virtual_table_columns(tid).filter(function (c) {
+    return !c.hidden;
+  });
+  var lines = [
+    [$("#" + tid + " thead th.rowheader").text()]
+      .concat(
+        $.map(cols, function (c) {
+          return $("#" + tid + " thead th#header_" + c.rid).text();
+        }),
+      )
+      .join("\t"),
+  ];
+  $.each(vt.rows, function (idx, i) {
+    var line = [vt.names[i]];
+    $.each(cols, function (cidx, c) {
+      var val = vt.data.columns[c.rid].vals[i];
+      line.push(val === null || val === undefined ? "" : val);
+    });
+    lines.push(line.join("\t"));
+  });
+  return lines.join("\n");
 }
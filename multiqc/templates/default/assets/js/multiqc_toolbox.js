@@ -342,6 +342,21 @@ $(function () {
     $("#mqc_exportplots").submit(function (e) {
       e.preventDefault();
       var checked_plots = $("#mqc_export_selectplots input:checked");
+      // Plot data is only decoded when a plot is first shown, so decode any selected plots first
+      var not_loaded = checked_plots.get().filter(function (input) {
+        return mqc_plots[input.value] === undefined && mqc_compressed_plotdata[input.value] !== undefined;
+      });
+      if (not_loaded.length > 0) {
+        var form = this;
+        Promise.all(
+          not_loaded.map(function (input) {
+            return mqc_load_plot_data(input.value);
+          }),
+        ).then(function () {
+          $(form).submit();
+        });
+        return;
+      }
       if (checked_plots.length > zip_threshold) {
         var zip = new JSZip();
       }
@@ -355,6 +370,10 @@ $(function () {
         var f_height = parseInt($("#mqc_exp_height").val()) / f_scale;
         checked_plots.each(function () {
           var fname = $(this).val();
+          // Render plots that haven't been scrolled into view yet
+          if ($("#" + fname).is(".not_rendered:visible:not(.gt_max_num_ds)")) {
+            plot_graph(fname, undefined, mqc_config["num_datasets_plot_limit"] * 50);
+          }
           var hc = $("#" + fname).highcharts();
           var cfg = {
             type: ft,
@@ -0,0 +1,46 @@
+#!/usr/bin/env python
+
+""" MultiQC asset cache. Keeps the base64 encoding of static files included
+in reports (fonts, logos, images), so that they don't have to be read and
+encoded again every time a report is written. """
+
+
+import base64
+import io
+import os
+
+from . import config
+from .file_cache import FileCache
+
+logger = config.logger
+
+_cache = FileCache("assets", ".b64")
+
+# Encodings already used in this session, keyed on (path, size, mtime_ns)
+_session_cache = dict()
+
+
+def b64_file(path):
+    """
+    Return the base64 encoding of a file as a string. With config.asset_cache, the
+    encoding is saved in the cache directory and reused as long as the file path,
+    size and modification time are unchanged.
+    """
+    path = os.path.realpath(path)
+    if not config.asset_cache:
+        with io.open(path, "rb") as f:
+            return base64.b64encode(f.read()).decode("utf-8")
+
+    st = os.stat(path)
+    key = (path, st.st_size, st.st_mtime_ns)
+    if key in _session_cache:
+        return _session_cache[key]
+
+    encoded = _cache.read(key)
+    if encoded is None:
+        with io.open(path, "rb") as f:
+            encoded = base64.b64encode(f.read()).decode("utf-8")
+        _cache.write(key, encoded)
+
+    _session_cache[key] = encoded
+    return encoded
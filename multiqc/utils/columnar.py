@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+
+""" MultiQC columnar data files. Writes the tables saved with write_data_file()
+as typed columns, so that they can be loaded without parsing text: Parquet and
+Feather files with pyarrow, if it is installed, or NumPy .npz files. """
+
+
+import numbers
+import zipfile
+
+import numpy as np
+
+from . import config
+
+logger = config.logger
+
+# Columnar values of config.data_format
+FORMATS = ["parquet", "feather", "npz"]
+
+# Formats that need pyarrow
+ARROW_FORMATS = ["parquet", "feather"]
+
+_warned_missing = False
+
+
+def _import_pyarrow():
+    """Optional dependency, used for the Parquet and Feather formats. Imported when needed, as it is slow to import."""
+    try:
+        import pyarrow
+        import pyarrow.feather
+        import pyarrow.parquet
+    except ImportError:
+        return None
+    return pyarrow
+
+
+def available(data_format):
+    """Can files be written in this format? Warns once if pyarrow is needed but not installed."""
+    global _warned_missing
+    if data_format not in ARROW_FORMATS or _import_pyarrow() is not None:
+        return True
+    if not _warned_missing:
+        logger.warning(f"Writing data files as '{data_format}' needs pyarrow, which is not installed. Using tsv.")
+        _warned_missing = True
+    return False
+
+
+def _column_kind(values):
+    """Type of a column: bool, int, float or str. Missing values are None and don't count."""
+    kind = None
+    for val in values:
+        if val is None:
+            continue
+        if isinstance(val, (bool, np.bool_)):
+            val_kind = "bool"
+        elif isinstance(val, numbers.Integral):
+            # Integers that don't fit in 64 bits are kept as strings
+            if not -(2**63) <= val < 2**63:
+                return "str"
+            val_kind = "int"
+        elif isinstance(val, numbers.Real):
+            val_kind = "float"
+        else:
+            return "str"
+        if kind is None or kind == val_kind:
+            kind = val_kind
+        elif {kind, val_kind} <= {"int", "float"}:
+            kind = "float"
+        else:
+            return "str"
+    return kind or "str"
+
+
+def table_columns(data, headers):
+    """
+    Columns of a 2D dict, the first key being the sample name (row) and the second the
+    field (column). Rows are sorted by sample name, like the tsv files.
+    :return: List of (column name, kind, values) with a "Sample" column first, where kind is
+             one of bool, int, float or str and missing values are None. Column names are unique:
+             fields named "Sample", or that are the same as another once converted to a string
+             (eg. 1 and "1"), get a "_1", "_2" etc. suffix.
+    """
+    s_names = sorted(data.keys())
+    columns = [("Sample", "str", [str(s_name) for s_name in s_names])]
+    names = {"Sample"}
+    for h in headers:
+        values = [data[s_name].get(h) for s_name in s_names]
+        kind = _column_kind(values)
+        if kind == "str":
+            values = [None if val is None else str(val) for val in values]
+        name = _unique_name(str(h), names)
+        names.add(name)
+        columns.append((name, kind, values))
+    return columns
+
+
+def _unique_name(name, names):
+    """The column name with a numbered suffix if it is already used, as the formats don't allow duplicate names"""
+    if name not in names:
+        return name
+    i = 1
+    while f"{name}_{i}" in names:
+        i += 1
+    logger.debug(f"Duplicate data column name '{name}', saving it as '{name}_{i}'")
+    return f"{name}_{i}"
+
+
+def write(columns, path, data_format):
+    """Write the columns from table_columns() to a file in one of the FORMATS"""
+    if data_format == "npz":
+        _write_npz(columns, path)
+        return
+    pyarrow = _import_pyarrow()
+    arrow_types = {"bool": pyarrow.bool_(), "int": pyarrow.int64(), "float": pyarrow.float64(), "str": pyarrow.string()}
+    table = pyarrow.Table.from_arrays(
+        [pyarrow.array(values, type=arrow_types[kind]) for _, kind, values in columns],
+        names=[name for name, _, _ in columns],
+    )
+    if data_format == "parquet":
+        pyarrow.parquet.write_table(table, path)
+    else:
+        pyarrow.feather.write_feather(table, path)
+
+
+def _npz_array(kind, values):
+    """NumPy array for a column. Columns with missing values are stored as floats with NaN, or strings with ''."""
+    if kind == "str":
+        return np.array(["" if val is None else val for val in values], dtype=str)
+    if any(val is None for val in values):
+        return np.array([np.nan if val is None else val for val in values], dtype=np.float64)
+    dtypes = {"bool": np.bool_, "int": np.int64, "float": np.float64}
+    return np.array(values, dtype=dtypes[kind])
+
+
+def _write_npz(columns, path):
+    """
+    Write the columns as a .npz file that can be opened with numpy.load(). The archive is written
+    directly rather than with numpy.savez(), which takes the column names as keyword arguments.
+    """
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_STORED, allowZip64=True) as zf:
+        for name, kind, values in columns:
+            with zf.open(name + ".npy", "w", force_zip64=True) as fh:
+                np.lib.format.write_array(fh, _npz_array(kind, values), allow_pickle=False)
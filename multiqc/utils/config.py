@@ -9,6 +9,7 @@ import inspect
 # Default logger will be replaced by caller
 import logging
 import os
+import pickle
 import subprocess
 import sys
 from datetime import datetime
@@ -20,35 +21,156 @@ import multiqc
 
 logger = logging.getLogger("multiqc")
 
+# The LibYAML parser is much faster than the pure-Python one, when PyYAML has been built with it
+YamlLoader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+# Version of the startup cache, increased when its contents change
+STARTUP_CACHE_FORMAT = 1
+
+# Entry point groups kept in the startup cache
+ENTRY_POINT_GROUPS = ["multiqc.modules.v1", "multiqc.templates.v1", "multiqc.hooks.v1"]
+
+
+def _git_hash(path):
+    """
+    Commit hash of the git checkout that MultiQC is running from, or None.
+    Reads the .git directory directly, falling back to git itself for
+    worktrees, submodules and anything else that isn't a plain checkout.
+    """
+    while not os.path.exists(os.path.join(path, ".git")):
+        parent = os.path.dirname(path)
+        if parent == path:
+            return None
+        path = parent
+    git_dir = os.path.join(path, ".git")
+    try:
+        if os.path.isdir(git_dir):
+            with open(os.path.join(git_dir, "HEAD")) as fh:
+                head = fh.read().strip()
+            if not head.startswith("ref: "):
+                return head
+            ref = head[5:]
+            try:
+                with open(os.path.join(git_dir, *ref.split("/"))) as fh:
+                    return fh.read().strip()
+            except FileNotFoundError:
+                with open(os.path.join(git_dir, "packed-refs")) as fh:
+                    for line in fh:
+                        if line.rstrip("\n").endswith(" " + ref):
+                            return line.split(" ", 1)[0]
+    except OSError:
+        pass
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "HEAD"], cwd=path, stderr=subprocess.STDOUT, universal_newlines=True
+        ).strip()
+    except Exception:
+        return None
+
+
+def _startup_cache_path():
+    """
+    Startup cache file. The user config isn't loaded yet, so this is always in the
+    default cache directory. Set MULTIQC_NO_STARTUP_CACHE to skip the cache.
+    """
+    if os.environ.get("MULTIQC_NO_STARTUP_CACHE"):
+        return None
+    cache_dir = os.environ.get("XDG_CACHE_HOME") or os.path.expanduser(os.path.join("~", ".cache"))
+    return os.path.join(cache_dir, "multiqc", "startup_cache.pkl")
+
+
+def _startup_cache_key(yaml_paths):
+    """
+    Everything that the cached startup data depends on: the MultiQC YAML files, and the
+    directories on the Python path, which change when any distribution is installed,
+    upgraded or removed. The working directory is left out, as reports are written there.
+    """
+    key = [STARTUP_CACHE_FORMAT, sys.version, MULTIQC_DIR]
+    for path in yaml_paths:
+        st = os.stat(path)
+        key.append((path, st.st_size, st.st_mtime_ns))
+    cwd = os.getcwd()
+    for path in sys.path:
+        if path in ("", cwd):
+            continue
+        try:
+            key.append((path, os.stat(path).st_mtime_ns))
+        except OSError:
+            pass
+    return key
+
+
+def _load_startup_data(defaults_fn, sp_fn):
+    """
+    The MultiQC version, config defaults, search patterns and entry points of the installed
+    packages. Reading these takes most of the time to import MultiQC, so they are kept in a
+    cache that is used until the installed packages or the YAML files change.
+    """
+    cache_path = _startup_cache_path()
+    try:
+        key = _startup_cache_key([defaults_fn, sp_fn])
+    except OSError:
+        cache_path = None
+    if cache_path is not None:
+        try:
+            with open(cache_path, "rb") as fh:
+                data = pickle.load(fh)
+            if data["key"] == key:
+                return data
+        except Exception:
+            pass
+
+    data = {"version": importlib_metadata.version("multiqc"), "entry_points": dict()}
+    with open(defaults_fn) as f:
+        data["configs"] = yaml.load(f, Loader=YamlLoader)
+    with open(sp_fn) as f:
+        data["sp"] = yaml.load(f, Loader=YamlLoader)
+    for group in ENTRY_POINT_GROUPS:
+        data["entry_points"][group] = [(ep.name, ep.value) for ep in importlib_metadata.entry_points(group=group)]
+
+    if cache_path is not None:
+        data["key"] = key
+        try:
+            os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+            tmp_path = "{}.{}.tmp".format(cache_path, os.getpid())
+            with open(tmp_path, "wb") as fh:
+                pickle.dump(data, fh, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            pass
+    return data
+
+
+def entry_points(group):
+    """Entry points of the installed packages for one of the ENTRY_POINT_GROUPS"""
+    return [
+        importlib_metadata.EntryPoint(name=name, value=value, group=group)
+        for name, value in _startup_data["entry_points"][group]
+    ]
+
+
+# Constants
+MULTIQC_DIR = os.path.dirname(os.path.realpath(inspect.getfile(multiqc)))
+
+##### MultiQC Defaults
+# Default MultiQC config and module filename search patterns
+_startup_data = _load_startup_data(
+    os.path.join(MULTIQC_DIR, "utils", "config_defaults.yaml"),
+    os.path.join(MULTIQC_DIR, "utils", "search_patterns.yaml"),
+)
+for c, v in _startup_data["configs"].items():
+    globals()[c] = v
+sp = _startup_data["sp"]
+
 # Get the MultiQC version
-version = importlib_metadata.version("multiqc")
+version = _startup_data["version"]
 short_version = version
 script_path = os.path.dirname(os.path.realpath(__file__))
-git_hash = None
+git_hash = _git_hash(script_path)
 git_hash_short = None
-try:
-    git_hash = subprocess.check_output(
-        ["git", "rev-parse", "HEAD"], cwd=script_path, stderr=subprocess.STDOUT, universal_newlines=True
-    ).strip()
+if git_hash:
     git_hash_short = git_hash[:7]
     version = "{} ({})".format(version, git_hash_short)
-except Exception:
-    pass
-
-# Constants
-MULTIQC_DIR = os.path.dirname(os.path.realpath(inspect.getfile(multiqc)))
-
-##### MultiQC Defaults
-# Default MultiQC config
-searchp_fn = os.path.join(MULTIQC_DIR, "utils", "config_defaults.yaml")
-with open(searchp_fn) as f:
-    configs = yaml.safe_load(f)
-    for c, v in configs.items():
-        globals()[c] = v
-# Module filename search patterns
-searchp_fn = os.path.join(MULTIQC_DIR, "utils", "search_patterns.yaml")
-with open(searchp_fn) as f:
-    sp = yaml.safe_load(f)
 
 # Other defaults that can't be set in YAML
 data_tmp_dir = "/tmp"  # will be overwritten by core script
@@ -63,7 +185,7 @@ megaqc_access_token = os.environ.get("MEGAQC_ACCESS_TOKEN")
 # Modules must be listed in setup.py under entry_points['multiqc.modules.v1']
 # Get all modules, including those from other extension packages
 avail_modules = dict()
-for entry_point in importlib_metadata.entry_points(group="multiqc.modules.v1"):
+for entry_point in entry_points("multiqc.modules.v1"):
     nicename = entry_point.name
     avail_modules[nicename] = entry_point
 
@@ -71,7 +193,7 @@ for entry_point in importlib_metadata.entry_points(group="multiqc.modules.v1"):
 # Templates must be listed in setup.py under entry_points['multiqc.templates.v1']
 # Get all templates, including those from other extension packages
 avail_templates = {}
-for entry_point in importlib_metadata.entry_points(group="multiqc.templates.v1"):
+for entry_point in entry_points("multiqc.templates.v1"):
     nicename = entry_point.name
     avail_templates[nicename] = entry_point
 
@@ -125,7 +247,7 @@ def mqc_load_config(yaml_config):
     if os.path.isfile(yaml_config):
         try:
             with open(yaml_config) as f:
-                new_config = yaml.safe_load(f)
+                new_config = yaml.load(f, Loader=YamlLoader)
                 logger.debug("Loading config settings from: {}".format(yaml_config))
                 mqc_add_config(new_config, yaml_config)
         except (IOError, AttributeError) as e:
@@ -138,11 +260,11 @@ def mqc_load_config(yaml_config):
 def mqc_cl_config(cl_config):
     for clc_str in cl_config:
         try:
-            parsed_clc = yaml.safe_load(clc_str)
+            parsed_clc = yaml.load(clc_str, Loader=YamlLoader)
             # something:var fails as it needs a space. Fix this (a common mistake)
             if isinstance(parsed_clc, str) and ":" in clc_str:
                 clc_str = ": ".join(clc_str.split(":"))
-                parsed_clc = yaml.safe_load(clc_str)
+                parsed_clc = yaml.load(clc_str, Loader=YamlLoader)
             assert isinstance(parsed_clc, dict)
         except yaml.scanner.ScannerError as e:
             logger.error("Could not parse command line config: {}\n{}".format(clc_str, e))
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+
+""" MultiQC file caches. Small files kept in a subdirectory of the cache directory
+between runs, such as the encoded report assets and parsed FastQC zip files.
+Entries that haven't been used for config.cache_max_age days are removed, and
+then the least recently used ones while the cache is over config.cache_max_size MB. """
+
+
+import hashlib
+import io
+import os
+import time
+
+from . import config
+from .search_cache import get_cache_dir
+
+logger = config.logger
+
+
+class FileCache(object):
+    """
+    Text entries in a subdirectory of the cache directory, keyed on any value with a stable repr().
+    Reading an entry marks it as used. Old entries are removed after the first write in each run.
+    Errors reading or writing the cache are only logged at debug level, eg. for a read-only home directory.
+    """
+
+    def __init__(self, subdir, suffix):
+        self.subdir = subdir
+        self.suffix = suffix
+        self._pruned = False
+
+    def _dir(self):
+        # Not fixed on creation, as config.cache_dir can be set after import
+        return os.path.join(get_cache_dir(), self.subdir)
+
+    def _path(self, key):
+        return os.path.join(self._dir(), hashlib.sha1(repr(key).encode("utf-8")).hexdigest() + self.suffix)
+
+    def read(self, key):
+        """Cached text for a key, or None if there isn't any"""
+        path = self._path(key)
+        try:
+            with io.open(path, "r", encoding="utf-8") as fh:
+                text = fh.read()
+        except (OSError, IOError, ValueError):
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return text
+
+    def write(self, key, text):
+        """Save the text for a key"""
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write to a temporary file first so that concurrent runs never see a partial entry
+            tmp_path = "{}.{}.tmp".format(path, os.getpid())
+            with io.open(tmp_path, "w", encoding="utf-8") as fh:
+                fh.write(text)
+            os.replace(tmp_path, path)
+        except (OSError, IOError) as e:
+            logger.debug(f"Could not write to the cache '{self._dir()}': {e}")
+            return
+        if not self._pruned:
+            self._pruned = True
+            self.prune()
+
+    def prune(self):
+        """Remove entries that haven't been used for a while, then the least recently used ones if over the size limit"""
+        now = time.time()
+        max_age = config.cache_max_age * 24 * 60 * 60 if config.cache_max_age is not None else None
+        max_size = config.cache_max_size * 1024 * 1024 if config.cache_max_size is not None else None
+        entries = []
+        try:
+            with os.scandir(self._dir()) as it:
+                for entry in it:
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((st.st_mtime, st.st_size, entry.path))
+        except OSError as e:
+            logger.debug(f"Could not clean up the cache '{self._dir()}': {e}")
+            return
+
+        entries.sort()
+        total_size = sum(size for _, size, _ in entries)
+        removed = 0
+        for mtime, size, path in entries:
+            too_old = max_age is not None and now - mtime > max_age
+            too_big = max_size is not None and total_size > max_size
+            if not too_old and not too_big:
+                # Entries are oldest first, so the rest are kept too
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total_size -= size
+            removed += 1
+        if removed > 0:
+            logger.debug(f"Removed {removed} old entries from the cache '{self._dir()}'")
@@ -0,0 +1,200 @@
+#!/usr/bin/env python
+
+""" MultiQC incremental reports. Keeps the result of parsing each file with
+BaseMultiqcModule.parse_files_parallel() in the multiqc_data directory, so that
+a later run given that directory with --incremental only parses the files that
+are new or have changed, and builds the report from the merged results.
+The results are saved as JSON, so that loading them can't run any code. """
+
+
+import gzip
+import hashlib
+import json
+import os
+
+from . import config, report
+
+logger = config.logger
+
+STATE_FN = "multiqc_parse_state.json.gz"
+
+# Version of the saved state, increased when its structure or the recorded calls change
+STATE_FORMAT = 2
+
+# Key marking an encoded value that JSON doesn't have a type for
+TYPE_KEY = "__mqc_type__"
+
+# Config that changes the sample names or the parsed results, on top of the module `*_config` dicts
+FINGERPRINT_CONFIG = [
+    "fn_clean_sample_names",
+    "fn_clean_exts",
+    "fn_clean_trim",
+    "prepend_dirs",
+    "prepend_dirs_sep",
+    "prepend_dirs_depth",
+    "use_filename_as_sample_name",
+    "sample_names_replace",
+    "sample_names_replace_regex",
+    "sample_names_replace_exact",
+    "sample_names_replace_complete",
+]
+
+# Results from the previous run, keyed on (module anchor, search pattern key, parse function) and then file path
+_previous = dict()
+
+
+class ParsedFile(object):
+    """Stands in for the file dict in recorded calls, replaced by the file dict when the calls are made"""
+
+
+def _encode(obj):
+    """
+    Parse result as a JSON value. Tuples, sets, dicts with keys that aren't strings and ParsedFile are
+    tagged with TYPE_KEY so that _decode() gives back the same types. Raises TypeError for any other
+    type, including subclasses of the built-in types, so that the result isn't saved at all rather
+    than changed.
+    """
+    obj_type = type(obj)
+    if obj is None or obj_type in (bool, int, float, str):
+        return obj
+    if obj_type is list:
+        return [_encode(v) for v in obj]
+    if obj_type is dict:
+        if TYPE_KEY not in obj and all(type(k) is str for k in obj):
+            return {k: _encode(v) for k, v in obj.items()}
+        return {TYPE_KEY: "dict", "items": [[_encode(k), _encode(v)] for k, v in obj.items()]}
+    if obj_type in (tuple, set, frozenset):
+        return {TYPE_KEY: obj_type.__name__, "items": [_encode(v) for v in obj]}
+    if obj_type is ParsedFile:
+        return {TYPE_KEY: "file"}
+    raise TypeError(f"can't save values of type '{obj_type.__name__}'")
+
+
+def _decode(obj):
+    """Value from _encode()"""
+    if isinstance(obj, list):
+        return [_decode(v) for v in obj]
+    if not isinstance(obj, dict):
+        return obj
+    obj_type = obj.get(TYPE_KEY)
+    if obj_type is None:
+        return {k: _decode(v) for k, v in obj.items()}
+    if obj_type == "file":
+        return ParsedFile()
+    items = [_decode(v) for v in obj["items"]]
+    if obj_type == "dict":
+        return {k: v for k, v in items}
+    if obj_type in ("tuple", "set", "frozenset"):
+        return {"tuple": tuple, "set": set, "frozenset": frozenset}[obj_type](items)
+    raise ValueError(f"unknown type '{obj_type}'")
+
+
+def fingerprint():
+    """Hash of the MultiQC version and config that the parsed results depend on"""
+    data = {k: getattr(config, k, None) for k in FINGERPRINT_CONFIG}
+    data.update({k: v for k, v in vars(config).items() if k.endswith("_config") and isinstance(v, dict)})
+    data = json.dumps([config.version, STATE_FORMAT, data], sort_keys=True, default=str)
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+
+def load(prev_data_dir):
+    """Load the parse results saved in the data directory of a previous run"""
+    _previous.clear()
+    path = os.path.join(prev_data_dir, STATE_FN)
+    try:
+        with gzip.open(path, "rt", encoding="utf-8") as fh:
+            state = json.load(fh)
+        if state.get("fingerprint") != fingerprint():
+            logger.info("MultiQC version or sample name config changed since the previous report, parsing all files")
+            return
+        for group in state["results"]:
+            group_key = (group["module"], group["sp_key"], group["parse_fn"])
+            _previous[group_key] = {fn: ((r["size"], r["mtime_ns"]), r["parsed"]) for fn, r in group["files"].items()}
+    except FileNotFoundError:
+        logger.warning(f"No saved parse results found in '{prev_data_dir}', parsing all files")
+        return
+    except Exception as e:
+        _previous.clear()
+        logger.warning(f"Could not load the saved parse results '{path}', parsing all files: {e}")
+        return
+    num_files = sum(len(results) for results in _previous.values())
+    logger.info(f"Incremental report: loaded the parse results for {num_files} files from '{prev_data_dir}'")
+
+
+def _group_key(anchor, sp_key, parse_fn):
+    return anchor, sp_key, getattr(parse_fn, "__qualname__", repr(parse_fn))
+
+
+def _file_key(f):
+    """Absolute path, size and modification time of a file found by find_log_files(), or None if it can't be read"""
+    path = os.path.abspath(os.path.join(f["root"], f["fn"]))
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return path, st.st_size, st.st_mtime_ns
+
+
+def get(anchor, sp_key, parse_fn, f):
+    """
+    Return the (file dict changes, result, recorded calls) for a file from the previous run,
+    if it has the same path, size and modification time. Otherwise returns None.
+    """
+    if not config.incremental:
+        return None
+    key = _file_key(f)
+    if key is None:
+        return None
+    group_key = _group_key(anchor, sp_key, parse_fn)
+    prev = _previous.get(group_key, {}).get(key[0])
+    if prev is None or prev[0] != key[1:]:
+        return None
+    try:
+        parsed = _decode(prev[1])
+    except (ValueError, KeyError, TypeError) as e:
+        logger.debug(f"Could not load the saved parse result for '{key[0]}': {e}")
+        return None
+    report.parse_state.setdefault(group_key, dict())[key[0]] = prev
+    return parsed
+
+
+def add(anchor, sp_key, parse_fn, f, parsed):
+    """
+    Keep the result of parsing a file, to be saved with the data for the next incremental run.
+    The result is encoded straight away, as modules often add to the parsed data afterwards.
+    """
+    if not config.incremental or parsed[1] is None:
+        return
+    key = _file_key(f)
+    if key is None:
+        return
+    try:
+        encoded = _encode(parsed)
+    except (TypeError, RecursionError) as e:
+        # Parsed again next time
+        logger.debug(f"Could not save the parse result for '{key[0]}': {e}")
+        return
+    report.parse_state.setdefault(_group_key(anchor, sp_key, parse_fn), dict())[key[0]] = (key[1:], encoded)
+
+
+def save(data_dir):
+    """Save the parse results of this run to the data directory"""
+    path = os.path.join(data_dir, STATE_FN)
+    results = []
+    for (anchor, sp_key, parse_fn), files in report.parse_state.items():
+        results.append(
+            {
+                "module": anchor,
+                "sp_key": sp_key,
+                "parse_fn": parse_fn,
+                "files": {
+                    fn: {"size": stat[0], "mtime_ns": stat[1], "parsed": encoded}
+                    for fn, (stat, encoded) in files.items()
+                },
+            }
+        )
+    try:
+        with gzip.open(path, "wt", encoding="utf-8", compresslevel=1) as fh:
+            json.dump({"fingerprint": fingerprint(), "results": results}, fh)
+    except (OSError, ValueError) as e:
+        logger.warning(f"Could not save the parse results for incremental reports: {e}")
@@ -3,29 +3,98 @@
 """ MultiQC code to export data to MegaQC / flat JSON files """
 
 
-import gzip
-import io
 import json
 import os
-
-import requests
+import zlib
 
 from . import config
 
 log = config.logger
 
+# Size of the blocks of JSON that are written or compressed at a time
+JSON_CHUNK_SIZE = 1024 * 1024
+
+# Types that the JSON encoder writes as they are, and that it accepts as dict keys
+JSON_SCALAR_TYPES = (str, int, float, bool, type(None))
+
 
 # Custom encoder to handle lambda functions
 class MQCJSONEncoder(json.JSONEncoder):
     def default(self, obj):
         if callable(obj):
             try:
-                return obj(1)
+                val = obj(1)
+                check_json_types(val)
+                return val
             except Exception:
                 return None
         return json.JSONEncoder.default(self, obj)
 
 
+def check_json_types(obj):
+    """
+    Check that the JSON encoder can write an object, without serialising it.
+    Raises TypeError if it contains anything other than dicts, lists, tuples,
+    strings, numbers, booleans and None. Functions are allowed, as the encoder
+    writes the value that they return. Raises ValueError if a container contains
+    itself, like the encoder does.
+    """
+    # Containers on the path from the top level object to the one being checked.
+    # The same container can be used more than once, as long as it isn't inside itself.
+    path_ids = set()
+    # Objects to check, and (None, id) markers for leaving a container
+    stack = [(obj, None)]
+    while stack:
+        obj, leave_id = stack.pop()
+        if leave_id is not None:
+            path_ids.discard(leave_id)
+            continue
+        if isinstance(obj, JSON_SCALAR_TYPES) or callable(obj):
+            continue
+        if isinstance(obj, (dict, list, tuple)):
+            if id(obj) in path_ids:
+                raise ValueError("Circular reference detected")
+            path_ids.add(id(obj))
+            stack.append((None, id(obj)))
+        if isinstance(obj, dict):
+            for k in obj:
+                if not isinstance(k, JSON_SCALAR_TYPES):
+                    raise TypeError(f"keys must be str, int, float, bool or None, not {type(k).__name__}")
+            stack.extend((v, None) for v in obj.values())
+        elif isinstance(obj, (list, tuple)):
+            stack.extend((v, None) for v in obj)
+        else:
+            raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def json_chunks(data, indent):
+    """
+    Encode data as JSON a block at a time, as UTF-8 bytes. The output is the same
+    as json.dumps(), without the whole string being held in memory.
+    """
+    encoder = MQCJSONEncoder(indent=indent, ensure_ascii=False)
+    buf = []
+    size = 0
+    for s in encoder.iterencode(data):
+        buf.append(s)
+        size += len(s)
+        if size >= JSON_CHUNK_SIZE:
+            yield "".join(buf).encode("utf-8", "ignore")
+            buf = []
+            size = 0
+    yield "".join(buf).encode("utf-8", "ignore")
+
+
+def gzip_chunks(chunks):
+    """Gzip compress a stream of bytes a block at a time"""
+    compressor = zlib.compressobj(9, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
 def multiqc_dump_json(report):
     exported_data = dict()
     export_vars = {
@@ -59,10 +128,17 @@ def multiqc_dump_json(report):
                     d = {"{}_{}".format(s, k): getattr(config, k)}
                 elif s == "report":
                     d = {"{}_{}".format(s, k): getattr(report, k)}
+                    if k == "plot_data":
+                        # Virtual table plot data is only for the report JavaScript, the values are in saved_raw_data
+                        d["report_plot_data"] = {
+                            pid: pdata
+                            for pid, pdata in report.plot_data.items()
+                            if not (isinstance(pdata, dict) and pdata.get("plot_type") == "table")
+                        }
                 if d:
-                    json.dumps(d, cls=MQCJSONEncoder, ensure_ascii=False)  # Test that exporting to JSON works
+                    check_json_types(d)  # Test that exporting to JSON works
                     exported_data.update(d)
-            except (TypeError, KeyError, AttributeError):
+            except (TypeError, ValueError, KeyError, AttributeError):
                 log.warning("Couldn't export data key '{}.{}'".format(s, k))
         # Get the absolute paths of analysis directories
         exported_data["config_analysis_dir_abs"] = list()
@@ -74,19 +150,25 @@ def multiqc_dump_json(report):
     return exported_data
 
 
+def multiqc_dump_json_file(exported_data, path):
+    """Write the exported data to a JSON file, a block at a time"""
+    with open(path, "wb") as fh:
+        for chunk in json_chunks(exported_data, indent=4):
+            fh.write(chunk)
+        fh.write(b"\n")
+
+
 def multiqc_api_post(exported_data):
+    # Imported here, as requests takes a while to import and is only needed to upload
+    import requests
+
     headers = {"Content-Type": "application/json", "content-encoding": "gzip"}
     if config.megaqc_access_token is not None:
         headers["access_token"] = config.megaqc_access_token
-    post_data = json.dumps({"data": exported_data}, cls=MQCJSONEncoder, ensure_ascii=False, indent=2)
-    post_data = post_data.encode("utf-8", "ignore")
-
-    # Gzip the JSON for massively decreased filesize
-    sio_obj = io.BytesIO()
-    gzfh = gzip.GzipFile(fileobj=sio_obj, mode="w")
-    gzfh.write(post_data)
-    gzfh.close()
-    request_body = sio_obj.getvalue()
+
+    # Gzip the JSON for massively decreased filesize. The body is a generator, so that it's
+    # encoded and compressed as it is sent, with chunked transfer encoding
+    request_body = gzip_chunks(json_chunks({"data": exported_data}, indent=2))
 
     log.debug("Sending data to MegaQC")
     log.debug("MegaQC URL: {}".format(config.megaqc_url))
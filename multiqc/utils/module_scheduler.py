@@ -0,0 +1,253 @@
+#!/usr/bin/env python
+
+""" MultiQC module scheduler. Runs modules that have opted in to parallel
+execution in a pool of worker processes, and merges their results back into
+the report in the configured module order. """
+
+
+import concurrent.futures
+import multiprocessing
+import os
+import pickle
+import random
+import shutil
+import tempfile
+import time
+import traceback
+from collections import defaultdict
+
+# Optional dependency, used to send back module results that contain lambdas (eg. in table headers)
+try:
+    import cloudpickle
+except ImportError:
+    cloudpickle = None
+
+from . import config, profiling, report
+
+logger = config.logger
+
+# Output directories for the module that is running in this worker process
+_worker_dirs = dict()
+
+
+def _init_worker(data_dir, plots_dir):
+    """Remember the real output directories, and make sure that workers don't share a random state"""
+    _worker_dirs["data_dir"] = data_dir
+    _worker_dirs["plots_dir"] = plots_dir
+    random.seed()
+
+
+def _reset_report_state():
+    """Reset the report variables that are filled by modules, so that the worker can return just its own results"""
+    report.general_stats_data = list()
+    report.general_stats_headers = list()
+    report.data_sources = defaultdict(lambda: defaultdict(lambda: defaultdict()))
+    report.plot_data = dict()
+    report.html_ids = report.HtmlIdRegistry()
+    report.lint_errors = list()
+    report.num_hc_plots = 0
+    report.num_mpl_plots = 0
+    report.saved_raw_data = dict()
+    report.software_versions = defaultdict(lambda: defaultdict(list))
+    report.parse_state = dict()
+
+
+def _report_state():
+    """Report variables filled by the module, as plain dicts so that they can be pickled"""
+    return {
+        "general_stats_data": report.general_stats_data,
+        "general_stats_headers": report.general_stats_headers,
+        "data_sources": {
+            mod: {section: dict(sources) for section, sources in sections.items()}
+            for mod, sections in report.data_sources.items()
+        },
+        "plot_data": report.plot_data,
+        "html_ids": report.html_ids,
+        "lint_errors": report.lint_errors,
+        "num_hc_plots": report.num_hc_plots,
+        "num_mpl_plots": report.num_mpl_plots,
+        "saved_raw_data": report.saved_raw_data,
+        "software_versions": {group: dict(versions) for group, versions in report.software_versions.items()},
+        "last_found_file": report.last_found_file,
+        "parse_state": report.parse_state,
+    }
+
+
+def _run_module(this_module, mod_cust_config):
+    """
+    Run a single module in a worker process. Data files and exported plots are written to
+    private directories, which are moved to the real output directories if the result is used.
+    """
+    from multiqc.modules.base_module import ModuleNoSamplesFound
+
+    starttime = time.time()
+    _reset_report_state()
+    tmp_dir = None
+    if _worker_dirs["data_dir"] is not None or _worker_dirs["plots_dir"] is not None:
+        tmp_dir = tempfile.mkdtemp(prefix="module_", dir=os.path.dirname(config.data_tmp_dir))
+    if _worker_dirs["data_dir"] is not None:
+        config.data_dir = os.path.join(tmp_dir, "data")
+        os.makedirs(config.data_dir)
+    if _worker_dirs["plots_dir"] is not None:
+        config.plots_dir = os.path.join(tmp_dir, "plots")
+        os.makedirs(config.plots_dir)
+
+    result = {"tmp_dir": tmp_dir, "output": None, "exception": None}
+    try:
+        mod = config.avail_modules[this_module].load()
+        mod.mod_cust_config = mod_cust_config
+        with profiling.module(this_module):
+            output = mod()
+        if not isinstance(output, list):
+            output = [output]
+        result["output"] = output
+    except (ModuleNoSamplesFound, UserWarning) as e:
+        # Expected when a module finds no samples, raised again in the main process
+        result["exception"] = e
+    except Exception:
+        # Anything else is re-run in the main process to report the error exactly as usual
+        result["error"] = traceback.format_exc()
+        return result
+    result["report"] = _report_state()
+    result["runtime"] = time.time() - starttime
+    result["profile"] = report.runtimes["profiles"].get(this_module)
+    if cloudpickle is not None:
+        try:
+            return cloudpickle.dumps(result)
+        except Exception:
+            result = {"tmp_dir": tmp_dir, "error": traceback.format_exc()}
+    return result
+
+
+class ModuleScheduler(object):
+    """
+    Starts the modules listed in config.parallel_modules in a pool of config.module_workers
+    processes, as soon as the scheduler is created. The main process then goes through the
+    modules in order and calls get_output() for each, which either returns the output of a
+    module that ran in a worker, or None if the module should be run as usual.
+
+    Workers are forked from the main process before any modules have run, so their results
+    are merged into the report variables in the module order. If the result of a worker
+    conflicts with the report so far (duplicate HTML IDs or data file names), or if the module
+    failed, it is discarded and the module is run again in the main process. This keeps the
+    report exactly the same as when running all modules one after another.
+    """
+
+    def __init__(self, run_modules):
+        self.executor = None
+        self.futures = dict()
+        self.runtimes = dict()
+
+        parallel_idxs = [
+            idx for idx, mod_dict in enumerate(run_modules) if list(mod_dict.keys())[0] in config.parallel_modules
+        ]
+        if config.module_workers < 2 or len(parallel_idxs) == 0:
+            return
+        if "fork" not in multiprocessing.get_all_start_methods():
+            logger.debug("Running modules in parallel needs the 'fork' start method, running all modules in sequence")
+            return
+
+        logger.debug(f"Running {len(parallel_idxs)} modules with {config.module_workers} worker processes")
+        self.executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=config.module_workers,
+            mp_context=multiprocessing.get_context("fork"),
+            initializer=_init_worker,
+            initargs=(config.data_dir, config.plots_dir),
+        )
+        for idx in parallel_idxs:
+            this_module = list(run_modules[idx].keys())[0]
+            mod_cust_config = list(run_modules[idx].values())[0] or {}
+            self.futures[idx] = (this_module, self.executor.submit(_run_module, this_module, mod_cust_config))
+
+    def get_output(self, mod_idx):
+        """
+        Wait for the module with this index in run_modules to finish and merge its
+        results into the report. Returns the list of module outputs, or None if the
+        module didn't run in parallel and should be run by the caller instead.
+        """
+        if mod_idx not in self.futures:
+            return None
+        this_module, future = self.futures.pop(mod_idx)
+        try:
+            result = future.result()
+            if isinstance(result, bytes):
+                result = pickle.loads(result)
+        except Exception as e:
+            # Eg. the module output couldn't be pickled
+            logger.debug(f"Running module '{this_module}' in parallel failed, running it again: {e}")
+            return None
+
+        if "error" in result:
+            logger.debug(f"Module '{this_module}' failed in a worker process, running it again:\n{result['error']}")
+            self._cleanup(result)
+            return None
+
+        state = result["report"]
+        duplicate_ids = set(state["html_ids"]) & set(report.html_ids)
+        duplicate_fns = set(state["saved_raw_data"]) & set(report.saved_raw_data)
+        if duplicate_ids or duplicate_fns:
+            logger.debug(
+                f"Module '{this_module}' used HTML IDs or data file names that were already taken "
+                f"({', '.join(sorted(duplicate_ids | duplicate_fns))}), running it again"
+            )
+            self._cleanup(result)
+            return None
+
+        self._merge_report_state(state)
+        self._move_files(result)
+        self.runtimes[mod_idx] = result["runtime"]
+        if result.get("profile") is not None:
+            report.runtimes["profiles"][this_module] = result["profile"]
+        if result["exception"] is not None:
+            raise result["exception"]
+        return result["output"]
+
+    @staticmethod
+    def _merge_report_state(state):
+        """Add the report variables from a worker, in the same way that the module would have done"""
+        report.general_stats_data.extend(state["general_stats_data"])
+        report.general_stats_headers.extend(state["general_stats_headers"])
+        for mod, sections in state["data_sources"].items():
+            for section, sources in sections.items():
+                report.data_sources[mod][section].update(sources)
+        report.plot_data.update(state["plot_data"])
+        report.html_ids.extend(state["html_ids"])
+        report.lint_errors.extend(state["lint_errors"])
+        report.num_hc_plots += state["num_hc_plots"]
+        report.num_mpl_plots += state["num_mpl_plots"]
+        report.saved_raw_data.update(state["saved_raw_data"])
+        for group, versions in state["software_versions"].items():
+            report.software_versions[group].update(versions)
+        if state["last_found_file"] is not None:
+            report.last_found_file = state["last_found_file"]
+        for group_key, results in state["parse_state"].items():
+            report.parse_state.setdefault(group_key, dict()).update(results)
+
+    @staticmethod
+    def _move_files(result):
+        """Move the files written by the worker to the real output directories"""
+        if result["tmp_dir"] is None:
+            return
+        for subdir, dest_dir in [("data", config.data_dir), ("plots", config.plots_dir)]:
+            src_dir = os.path.join(result["tmp_dir"], subdir)
+            if dest_dir is None or not os.path.isdir(src_dir):
+                continue
+            for root, _, filenames in os.walk(src_dir):
+                dest_root = os.path.join(dest_dir, os.path.relpath(root, src_dir))
+                os.makedirs(dest_root, exist_ok=True)
+                for fn in filenames:
+                    os.replace(os.path.join(root, fn), os.path.join(dest_root, fn))
+        shutil.rmtree(result["tmp_dir"], ignore_errors=True)
+
+    @staticmethod
+    def _cleanup(result):
+        if result.get("tmp_dir") is not None:
+            shutil.rmtree(result["tmp_dir"], ignore_errors=True)
+
+    def shutdown(self):
+        """Stop the worker processes, cancelling any modules that haven't been collected"""
+        if self.executor is not None:
+            for _, future in self.futures.values():
+                future.cancel()
+            self.executor.shutdown(wait=True)
+            self.executor = None
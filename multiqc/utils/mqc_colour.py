@@ -6,6 +6,7 @@ import hashlib
 
 # Default logger will be replaced by caller
 import logging
+import math
 import re
 
 import numpy as np
@@ -345,14 +346,18 @@ class mqc_colour_scale(object):
             self.minval = float(minval)
             self.maxval = float(maxval)
 
+        # Colours are cached by lighten value: lookup tables across [minval, maxval] for
+        # sequential scales, filled in as they are used, and the colours of qualitative scales
+        self._spectra_scale = None
+        self._luts = dict()
+        self._lightened = dict()
+
+    # Number of colours in the lookup table across [minval, maxval] for sequential scales
+    LUT_SIZE = 1024
+
     def get_colour(self, val, colformat="hex", lighten=0.3, source=None):
         """Given a value, return a colour within the colour scale"""
 
-        # Ported from the original JavaScript for continuity
-        # Seems to work better than adjusting brightness / saturation / luminosity
-        def rgb_converter(x):
-            return max(0, min(1, 1 + ((x - 1) * lighten)))
-
         try:
             if self.name in mqc_colour_scale.qualitative_scales and isinstance(val, float):
                 if config.strict:
@@ -373,38 +378,108 @@ class mqc_colour_scale(object):
                     # values assigned with the same color. But instead we will get a hash from a string to hope to assign
                     # a unique color for each possible enumeration value.
                     val = deterministic_hash(val)
-                thecolour = spectra.html(self.colours[val % len(self.colours)])
-                thecolour = spectra.rgb(*[rgb_converter(v) for v in thecolour.rgb])
-                return thecolour.hexcode
+                return self._lightened_colour(val % len(self.colours), lighten)
 
             # When there is only 1 color in scale, spectra.scale() will crash with DivisionByZero
             elif len(self.colours) == 1:
-                thecolour = spectra.html(self.colours[0])
-                thecolour = spectra.rgb(*[rgb_converter(v) for v in thecolour.rgb])
-                return thecolour.hexcode
+                return self._lightened_colour(0, lighten)
 
             else:
-                # Sanity checks
-                val = re.sub(r"[^0-9\.\-e]", "", str(val))
-                if val == "":
-                    val = self.minval
-                val = float(val)
-                val = max(val, self.minval)
-                val = min(val, self.maxval)
-
-                domain_nums = list(np.linspace(self.minval, self.maxval, len(self.colours)))
-                my_scale = spectra.scale(self.colours).domain(domain_nums)
-
-                # Lighten colours
-                thecolour = spectra.rgb(*[rgb_converter(v) for v in my_scale(val).rgb])
-
-                return thecolour.hexcode
+                val = self._sanitise_value(val)
+                return self._lut_colour(
+                    round((val - self.minval) / (self.maxval - self.minval) * (self.LUT_SIZE - 1)), lighten
+                )
 
         except Exception as e:
             # Shouldn't crash all of MultiQC just for colours
             logger.warning(f"{self.id + ': ' if self.id else ''}Error getting colour: {e}")
             return ""
 
+    def get_colour_list(self, values, lighten=0.3, source=None):
+        """
+        Given a list (or array) of values, return a list of colours within the colour scale.
+        Same as calling get_colour() for each value, but sequential scales look up all of
+        the colours at once.
+        """
+        if self.name in mqc_colour_scale.qualitative_scales or len(self.colours) == 1:
+            return [self.get_colour(val, lighten=lighten, source=source) for val in values]
+
+        if isinstance(values, np.ndarray) and values.dtype.kind in "iuf":
+            vals = np.clip(np.where(np.isfinite(values), values, self.minval), self.minval, self.maxval)
+            return self._lut_colours(vals, lighten)
+
+        # Plain numbers don't need the sanity checks
+        if all(type(val) is float or type(val) is int for val in values):
+            try:
+                vals = np.asarray(values, dtype=float)
+            except OverflowError:
+                vals = None
+            if vals is not None and np.isfinite(vals).all():
+                return self._lut_colours(np.clip(vals, self.minval, self.maxval), lighten)
+
+        vals = []
+        failed = []
+        for i, val in enumerate(values):
+            try:
+                vals.append(self._sanitise_value(val))
+            except Exception as e:
+                logger.warning(f"{self.id + ': ' if self.id else ''}Error getting colour: {e}")
+                vals.append(self.minval)
+                failed.append(i)
+        colours = self._lut_colours(vals, lighten)
+        for i in failed:
+            colours[i] = ""
+        return colours
+
+    def _sanitise_value(self, val):
+        """Parse a value for a sequential scale, clipped to [minval, maxval]"""
+        # Finite numbers are already clean, anything else goes through the sanity checks
+        if type(val) is float or type(val) is int:
+            try:
+                if not math.isfinite(val):
+                    val = str(val)
+            except OverflowError:
+                val = str(val)
+        if not (type(val) is float or type(val) is int):
+            val = re.sub(r"[^0-9\.\-e]", "", str(val))
+            if val == "":
+                val = self.minval
+        val = float(val)
+        val = max(val, self.minval)
+        val = min(val, self.maxval)
+        return val
+
+    def _lut_colours(self, vals, lighten):
+        """Return the colours for a list of values already clipped to [minval, maxval]"""
+        idx = np.rint(
+            (np.asarray(vals, dtype=float) - self.minval) / (self.maxval - self.minval) * (self.LUT_SIZE - 1)
+        ).astype(int)
+        lut = {i: self._lut_colour(i, lighten) for i in np.unique(idx).tolist()}
+        return [lut[i] for i in idx.tolist()]
+
+    def _lut_colour(self, i, lighten):
+        """
+        Colour number i of the lookup table for this lighten value. Table entries
+        are computed the first time that they are used.
+        """
+        lut = self._luts.get(lighten)
+        if lut is None:
+            lut = self._luts[lighten] = [None] * self.LUT_SIZE
+        if lut[i] is None:
+            if self._spectra_scale is None:
+                domain_nums = list(np.linspace(self.minval, self.maxval, len(self.colours)))
+                self._spectra_scale = spectra.scale(self.colours).domain(domain_nums)
+            val = self.minval + (self.maxval - self.minval) * i / (self.LUT_SIZE - 1)
+            lut[i] = _lighten(self._spectra_scale(val), lighten)
+        return lut[i]
+
+    def _lightened_colour(self, idx, lighten):
+        """Colour number idx of the scale, lightened"""
+        key = (idx, lighten)
+        if key not in self._lightened:
+            self._lightened[key] = _lighten(spectra.html(self.colours[idx]), lighten)
+        return self._lightened[key]
+
     def get_colours(self, name="GnBu"):
         """Function to get a colour scale by name
         Input: Name of colour scale (suffix with -rev for reversed)
@@ -593,6 +668,17 @@ class mqc_colour_scale(object):
     }
 
 
+def _lighten(colour, lighten):
+    """Lighten a spectra colour, returns the hex code"""
+
+    # Ported from the original JavaScript for continuity
+    # Seems to work better than adjusting brightness / saturation / luminosity
+    def rgb_converter(x):
+        return max(0, min(1, 1 + ((x - 1) * lighten)))
+
+    return spectra.rgb(*[rgb_converter(v) for v in colour.rgb]).hexcode
+
+
 def deterministic_hash(x):
     """
     Deterministic hash function for strings. This is useful for assigning a unique color
@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+
+""" MultiQC flat plot export. Draws matplotlib plots and saves them in the export
+formats, either straight away or in a pool of worker processes. With workers, the
+plot functions get a placeholder instead of the base64 encoded image, which is
+replaced in the module HTML once all plots are done. """
+
+
+import base64
+import concurrent.futures
+import io
+import itertools
+import multiprocessing
+import os
+import pickle
+import re
+
+from . import config, profiling
+
+logger = config.logger
+
+# Placeholder for an embedded image that is being drawn in a worker
+PLACEHOLDER = "mqc_plot_export_{}"
+PLACEHOLDER_RE = re.compile(r"mqc_plot_export_\d+")
+
+_executor = None
+_finished = False
+_pending = dict()
+_counter = itertools.count()
+
+
+def render(fig_fn, args, pid, embed_png):
+    """
+    Draw a figure with fig_fn(*args), which returns the matplotlib figure and any extra
+    savefig() arguments for the exported files. The figure is saved to the plots directory
+    in each of the export formats, if exporting plots.
+    :return: The base64 encoded PNG if embed_png is set, otherwise None. With config.plot_workers
+             the figure is drawn in a worker process, and a placeholder is returned for the PNG,
+             until finish() has been called. Plots made after that are drawn straight away.
+    """
+    job = (
+        fig_fn,
+        args,
+        pid,
+        config.plots_dir if config.export_plots else None,
+        list(config.export_plot_formats),
+        embed_png,
+    )
+    executor = _get_executor()
+    if executor is None:
+        return _render(*job)
+    # Pickle now, as the plot data may be changed by the module once the plot function has returned
+    try:
+        pickled_job = pickle.dumps(job, protocol=pickle.HIGHEST_PROTOCOL)
+    except Exception as e:
+        logger.debug(f"Could not send plot '{pid}' to a worker, drawing it here: {e}")
+        return _render(*job)
+    placeholder = PLACEHOLDER.format(next(_counter))
+    _pending[placeholder] = (executor.submit(_render_pickled, pickled_job), pid, pickled_job)
+    return placeholder if embed_png else None
+
+
+def _get_executor():
+    """Pool of processes to draw plots, or None to draw them in this process"""
+    global _executor
+    if _executor is not None:
+        return _executor
+    # Nothing would replace the placeholders of plots made after finish()
+    if _finished or config.plot_workers < 2 or "fork" not in multiprocessing.get_all_start_methods():
+        return None
+    # Don't start more processes from a module that's already running in a worker
+    if multiprocessing.parent_process() is not None:
+        return None
+    logger.debug(f"Drawing flat plots with {config.plot_workers} worker processes")
+    _executor = concurrent.futures.ProcessPoolExecutor(
+        max_workers=config.plot_workers,
+        mp_context=multiprocessing.get_context("fork"),
+        initializer=profiling.init_worker,
+    )
+    return _executor
+
+
+def _render_pickled(pickled_job):
+    return _render(*pickle.loads(pickled_job))
+
+
+def _render(fig_fn, args, pid, plots_dir, export_formats, embed_png):
+    import matplotlib.pyplot as plt
+
+    fig, savefig_kwargs = fig_fn(*args)
+    try:
+        # Save the plot to the data directory if export is requested
+        if plots_dir is not None:
+            for fformat in export_formats:
+                # Make the directory if it doesn't already exist
+                plot_dir = os.path.join(plots_dir, fformat)
+                os.makedirs(plot_dir, exist_ok=True)
+                # Save the plot
+                plot_fn = os.path.join(plot_dir, "{}.{}".format(pid, fformat))
+                fig.savefig(plot_fn, format=fformat, bbox_inches="tight", **savefig_kwargs)
+
+        # Output the figure to a base64 encoded string
+        if embed_png:
+            img_buffer = io.BytesIO()
+            fig.savefig(img_buffer, format="png", bbox_inches="tight")
+            b64_img = base64.b64encode(img_buffer.getvalue()).decode("utf8")
+            img_buffer.close()
+            return b64_img
+    finally:
+        plt.close(fig)
+
+
+def reset():
+    """Allow drawing plots in workers again, for a new report"""
+    global _finished
+    _finished = False
+
+
+def finish(modules_output):
+    """
+    Wait for the plots being drawn in workers, and put the images in place of the placeholders in the module HTML.
+    Called once all modules have been added to the report. Any plots made afterwards are drawn straight away.
+    """
+    global _executor, _finished
+    _finished = True
+    if _executor is None:
+        return
+    images = dict()
+    for placeholder, (future, pid, pickled_job) in _pending.items():
+        try:
+            images[placeholder] = future.result()
+        except Exception as e:
+            logger.debug(f"Drawing plot '{pid}' in a worker failed, drawing it again: {e}")
+            images[placeholder] = _render_pickled(pickled_job)
+    _pending.clear()
+    _executor.shutdown(wait=True)
+    _executor = None
+
+    def replace(text):
+        if isinstance(text, str) and "mqc_plot_export_" in text:
+            return PLACEHOLDER_RE.sub(lambda m: images.get(m.group(), m.group()) or "", text)
+        return text
+
+    for mod in modules_output:
+        # Modules without a description don't have an intro
+        if hasattr(mod, "intro"):
+            mod.intro = replace(mod.intro)
+        for section in mod.sections:
+            for key, value in section.items():
+                section[key] = replace(value)
@@ -4,11 +4,11 @@
 to run their own custom subroutines at predefined
 trigger points during MultiQC execution. """
 
-from importlib_metadata import entry_points
+from . import config
 
 # Load the hooks
 hook_functions = {}
-for entry_point in entry_points(group="multiqc.hooks.v1"):
+for entry_point in config.entry_points("multiqc.hooks.v1"):
     try:
         hook_functions[entry_point.name].append(entry_point.load())
     except KeyError:
@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+
+""" MultiQC module profiling. With --profile-runtime, records the wall time,
+CPU time, peak memory and I/O of each module, the time spent in plot functions
+and writing data files, and the files found for each search pattern key.
+Optionally saves a cProfile of each module to multiqc_data/profiles/. """
+
+
+import contextlib
+import functools
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+# Not available on Windows
+try:
+    import resource
+except ImportError:
+    resource = None
+
+from . import config, report
+
+logger = config.logger
+
+# Profile of the module that is running, or None when not profiling
+_active = None
+
+_audit_hook_added = False
+
+
+class ModuleProfile(object):
+    """Counters for one module run. Times in categories are exclusive, so that nested calls aren't counted twice."""
+
+    def __init__(self, name):
+        self.name = name
+        self.times = {"plots": 0.0, "data_files": 0.0}
+        self.search_keys = dict()
+        self.files_opened = 0
+        # Time spent in nested timed calls, for each timed call in progress
+        self._child_times = []
+
+    def start_timer(self):
+        self._child_times.append(0.0)
+        return time.perf_counter()
+
+    def stop_timer(self, start):
+        """Time since start_timer(), less the time in timed calls made in the meantime"""
+        elapsed = time.perf_counter() - start
+        child_time = self._child_times.pop()
+        if self._child_times:
+            self._child_times[-1] += elapsed
+        return elapsed - child_time
+
+
+def _audit(event, args):
+    """Count the files opened by the running module"""
+    if event == "open" and _active is not None:
+        _active.files_opened += 1
+
+
+def _bytes_read():
+    """Bytes read by this process so far, or None if the OS doesn't tell us (Linux only)"""
+    try:
+        with open("/proc/self/io") as fh:
+            for line in fh:
+                if line.startswith("rchar:"):
+                    return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def _cpu_time():
+    """CPU time used by this process and its finished child processes, eg. workers for parsing files"""
+    if resource is None:
+        return time.process_time()
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return time.process_time() + children.ru_utime + children.ru_stime
+
+
+@contextlib.contextmanager
+def module(name):
+    """Profile a module run, saving the results in report.runtimes["profiles"][name]"""
+    global _active, _audit_hook_added
+    if not config.profile_runtime or _active is not None:
+        yield
+        return
+
+    if not _audit_hook_added:
+        # Audit hooks can't be removed, so this is only added when profiling
+        sys.addaudithook(_audit)
+        _audit_hook_added = True
+    started_tracemalloc = not tracemalloc.is_tracing()
+    if started_tracemalloc:
+        tracemalloc.start()
+    elif hasattr(tracemalloc, "reset_peak"):
+        # Python 3.9+
+        tracemalloc.reset_peak()
+    start_memory = tracemalloc.get_traced_memory()[0]
+    profiler = None
+    if config.profile_cprofile and config.data_dir is not None:
+        import cProfile
+
+        profiler = cProfile.Profile()
+
+    prof = ModuleProfile(name)
+    start_read = _bytes_read()
+    start_cpu = _cpu_time()
+    start_wall = time.time()
+    _active = prof
+    if profiler is not None:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        _active = None
+        wall_time = time.time() - start_wall
+        cpu_time = _cpu_time() - start_cpu
+        end_read = _bytes_read()
+        peak_memory = tracemalloc.get_traced_memory()[1] - start_memory
+        if started_tracemalloc:
+            tracemalloc.stop()
+
+        report.runtimes["profiles"][name] = {
+            "wall_time": wall_time,
+            "cpu_time": cpu_time,
+            "parsing_time": max(0.0, wall_time - prof.times["plots"] - prof.times["data_files"]),
+            "plots_time": prof.times["plots"],
+            "data_files_time": prof.times["data_files"],
+            "peak_memory": peak_memory,
+            "bytes_read": None if start_read is None or end_read is None else end_read - start_read,
+            "files_opened": prof.files_opened,
+            "search_keys": prof.search_keys,
+        }
+        if profiler is not None:
+            _save_cprofile(profiler, name)
+
+
+def init_worker():
+    """
+    Pool initializer for worker processes forked while a module is being profiled. Memory tracing
+    is only stopped in the parent process, and would slow down everything the worker does afterwards.
+    """
+    global _active
+    _active = None
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def _save_cprofile(profiler, name):
+    """Save the cProfile stats of a module to the profiles directory in multiqc_data"""
+    profiles_dir = os.path.join(config.data_dir, "profiles")
+    try:
+        os.makedirs(profiles_dir, exist_ok=True)
+        profiler.dump_stats(os.path.join(profiles_dir, "{}.prof".format(name)))
+    except OSError as e:
+        logger.warning(f"Could not save the profile for module '{name}': {e}")
+
+
+def timed(category):
+    """Decorator to add the time spent in a function to a category of the running module's profile"""
+
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            prof = _active
+            if prof is None:
+                return fn(*args, **kwargs)
+            start = prof.start_timer()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                prof.times[category] += prof.stop_timer(start)
+
+        return wrapper
+
+    return decorator
+
+
+def search_key(sp_key, files, count_files=True):
+    """
+    Time the iteration over the files found for a search pattern key, as returned by find_log_files().
+    The number and total size of the files are also counted, unless count_files is False.
+    Returns the files unchanged when not profiling.
+    """
+    if _active is None:
+        return files
+    return _profile_search_key(_active, sp_key, files, count_files)
+
+
+def _profile_search_key(prof, sp_key, files, count_files):
+    stats = prof.search_keys.setdefault(sp_key, {"files": 0, "file_size": 0, "time": 0.0})
+    with contextlib.closing(iter(files)) as files:
+        while True:
+            start = prof.start_timer()
+            try:
+                f = next(files)
+            except StopIteration:
+                return
+            finally:
+                stats["time"] += prof.stop_timer(start)
+            if count_files:
+                stats["files"] += 1
+                try:
+                    stats["file_size"] += os.path.getsize(os.path.join(f["root"], f["fn"]))
+                except (OSError, KeyError, TypeError):
+                    pass
+            yield f
+
+
+def write_runtime_json(path):
+    """Save the run times and module profiles as JSON"""
+    data = {"runtimes": report.runtimes, "file_search_stats": report.file_search_stats}
+    try:
+        with open(path, "w") as fh:
+            json.dump(data, fh, indent=4)
+    except (OSError, TypeError) as e:
+        logger.warning(f"Could not save the run time profile: {e}")
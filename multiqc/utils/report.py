@@ -5,13 +5,20 @@ module. Is available to subsequent modules. Contains
 helper functions to generate markup for report. """
 
 
+import base64
+import concurrent.futures
 import fnmatch
+import functools
+import gzip
 import inspect
 import io
+import itertools
 import json
+import math
 import mimetypes
 import os
 import re
+import stat
 import time
 from collections import defaultdict, OrderedDict
 
@@ -20,7 +27,7 @@ import rich.progress
 import yaml
 from yaml.representer import Representer
 
-from multiqc.utils import lzstring
+from multiqc.utils import lzstring, search_cache, search_matcher
 
 from . import config
 
@@ -31,6 +38,83 @@ yaml.add_representer(defaultdict, Representer.represent_dict)
 yaml.add_representer(OrderedDict, Representer.represent_dict)
 
 
+class HtmlIdRegistry(list):
+    """
+    The HTML IDs used in the report, in the order that they were saved.
+    Keeps a set of the IDs for fast duplicate checks, and the last suffix
+    used for each duplicated ID so that the next free one is found directly.
+    All of the list methods that change the IDs keep the set up to date.
+    """
+
+    def __init__(self, html_ids=()):
+        super().__init__(html_ids)
+        self._ids = set(self)
+        self._suffixes = dict()
+
+    def __contains__(self, html_id):
+        return html_id in self._ids
+
+    def __reduce__(self):
+        return self.__class__, (list(self),)
+
+    def append(self, html_id):
+        super().append(html_id)
+        self._ids.add(html_id)
+
+    def extend(self, html_ids):
+        html_ids = list(html_ids)
+        super().extend(html_ids)
+        self._ids.update(html_ids)
+
+    def __iadd__(self, html_ids):
+        self.extend(html_ids)
+        return self
+
+    def insert(self, index, html_id):
+        super().insert(index, html_id)
+        self._ids.add(html_id)
+
+    def _reset(self):
+        """Rebuild the set of IDs after some have been removed or replaced"""
+        self._ids = set(self)
+        # Removed IDs free up their suffixes
+        self._suffixes.clear()
+
+    def __setitem__(self, index, value):
+        super().__setitem__(index, value)
+        self._reset()
+
+    def __delitem__(self, index):
+        super().__delitem__(index)
+        self._reset()
+
+    def __imul__(self, n):
+        super().__imul__(n)
+        self._reset()
+        return self
+
+    def remove(self, html_id):
+        super().remove(html_id)
+        self._reset()
+
+    def pop(self, index=-1):
+        html_id = super().pop(index)
+        self._reset()
+        return html_id
+
+    def clear(self):
+        super().clear()
+        self._reset()
+
+    def next_suffix(self, html_id_base):
+        """First suffix i for which '<base>-<i>' is not taken. Counting resumes from the last suffix found."""
+        i = self._suffixes.get(html_id_base, 1)
+        while "{}-{}".format(html_id_base, i) in self._ids:
+            i += 1
+        self._suffixes[html_id_base] = i
+        return i
+
+
 # Set up global variables shared across modules
 # Inside a function so that the global vars are reset if MultiQC is run more than once within a single session / environment
 def init():
@@ -50,7 +134,7 @@ def init():
     plot_data = dict()
 
     global html_ids
-    html_ids = list()
+    html_ids = HtmlIdRegistry()
 
     global lint_errors
     lint_errors = list()
@@ -67,6 +151,9 @@ def init():
     global last_found_file
     last_found_file = None
 
+    global parse_state
+    parse_state = dict()
+
     global runtimes
     runtimes = {
         "total": 0,
@@ -75,6 +162,7 @@ def init():
         "total_compression": 0,
         "sp": defaultdict(),
         "mods": defaultdict(),
+        "profiles": dict(),
     }
 
     global file_search_stats
@@ -168,66 +256,10 @@ def get_filelist(run_module_names):
         logger.info("Skipping {} file search patterns".format(len(skipped_patterns)))
         logger.debug("Skipping search patterns: {}".format(", ".join(skipped_patterns)))
 
-    def add_file(fn, root):
-        """
-        Function applied to each file found when walking the analysis
-        directories. Runs through all search patterns and returns True
-        if a match is found.
-        """
-        f = {"fn": fn, "root": root}
-
-        # Check that this is a file and not a pipe or anything weird
-        if not os.path.isfile(os.path.join(root, fn)):
-            file_search_stats["skipped_not_a_file"] += 1
-            return False
-
-        # Check that we don't want to ignore this file
-        i_matches = [n for n in config.fn_ignore_files if fnmatch.fnmatch(fn, n)]
-        if len(i_matches) > 0:
-            file_search_stats["skipped_ignore_pattern"] += 1
-            return False
-
-        # Limit search to small files, to avoid 30GB FastQ files etc.
-        try:
-            f["filesize"] = os.path.getsize(os.path.join(root, fn))
-        except (IOError, OSError, ValueError, UnicodeDecodeError):
-            logger.debug("Couldn't read file when checking filesize: {}".format(fn))
-        else:
-            if f["filesize"] > config.log_filesize_limit:
-                file_search_stats["skipped_filesize_limit"] += 1
-                return False
-
-        # Use mimetypes to exclude binary files where possible
-        if not re.match(r".+_mqc\.(png|jpg|jpeg)", f["fn"]) and config.ignore_images:
-            (ftype, encoding) = mimetypes.guess_type(os.path.join(f["root"], f["fn"]))
-            if encoding is not None:
-                return False
-            if ftype is not None and ftype.startswith("image"):
-                return False
-
-        # Test file for each search pattern
-        file_matched = False
-        for patterns in spatterns:
-            for key, sps in patterns.items():
-                start = time.time()
-                for sp in sps:
-                    if search_file(sp, f, key):
-                        # Check that we shouldn't exclude this file
-                        if not exclude_file(sp, f):
-                            # Looks good! Remember this file
-                            files[key].append(f)
-                            file_search_stats[key] = file_search_stats.get(key, 0) + 1
-                            file_matched = True
-                        # Don't keep searching this file for other modules
-                        if not sp.get("shared", False):
-                            runtimes["sp"][key] = runtimes["sp"].get(key, 0) + (time.time() - start)
-                            return True
-                        # Don't look at other patterns for this module
-                        else:
-                            break
-                runtimes["sp"][key] = runtimes["sp"].get(key, 0) + (time.time() - start)
-
-        return file_matched
+    # Index the filename patterns so that each file is only tested against patterns that can match it
+    matcher = search_matcher.SearchPatternMatcher(spatterns, config.fn_ignore_files)
+    ignore_dirs = search_matcher.GlobMatcher([n.rstrip(os.sep) for n in config.fn_ignore_dirs])
+    ignore_paths = search_matcher.GlobMatcher([n.rstrip(os.sep) for n in config.fn_ignore_paths])
 
     # Go through the analysis directories and get file list
     multiqc_installation_dir_files = [
@@ -242,57 +274,45 @@ def get_filelist(run_module_names):
         ".gitignore",
     ]
     total_sp_starttime = time.time()
+    # File stat results, in the same order as searchfiles
+    searchfile_stats = []
     for path in config.analysis_dir:
         if os.path.islink(path) and config.ignore_symlinks:
             file_search_stats["skipped_symlinks"] += 1
             continue
         elif os.path.isfile(path):
             searchfiles.append([os.path.basename(path), os.path.dirname(path)])
+            searchfile_stats.append(_stat(path))
         elif os.path.isdir(path):
-            for root, dirnames, filenames in os.walk(path, followlinks=(not config.ignore_symlinks), topdown=True):
+            for root, dirnames, filenames in _scandir_walk(path, followlinks=(not config.ignore_symlinks)):
                 bname = os.path.basename(root)
 
                 # Skip any sub-directories matching ignore params
-                orig_dirnames = dirnames[:]
-                for n in config.fn_ignore_dirs:
-                    dirnames[:] = [d for d in dirnames if not fnmatch.fnmatch(d, n.rstrip(os.sep))]
-                    if len(orig_dirnames) != len(dirnames):
-                        removed_dirs = [
-                            os.path.join(root, d) for d in set(orig_dirnames).symmetric_difference(set(dirnames))
-                        ]
-                        file_search_stats["skipped_directory_fn_ignore_dirs"] += len(removed_dirs)
-                        orig_dirnames = dirnames[:]
-                for n in config.fn_ignore_paths:
-                    dirnames[:] = [d for d in dirnames if not fnmatch.fnmatch(os.path.join(root, d), n.rstrip(os.sep))]
-                    if len(orig_dirnames) != len(dirnames):
-                        removed_dirs = [
-                            os.path.join(root, d) for d in set(orig_dirnames).symmetric_difference(set(dirnames))
-                        ]
-                        file_search_stats["skipped_directory_fn_ignore_dirs"] += len(removed_dirs)
+                num_dirnames = len(dirnames)
+                dirnames[:] = [
+                    d for d in dirnames if not ignore_dirs.match(d) and not ignore_paths.match(os.path.join(root, d))
+                ]
+                file_search_stats["skipped_directory_fn_ignore_dirs"] += num_dirnames - len(dirnames)
 
                 # Skip *this* directory if matches ignore params
-                d_matches = [n for n in config.fn_ignore_dirs if fnmatch.fnmatch(bname, n.rstrip(os.sep))]
-                if len(d_matches) > 0:
-                    file_search_stats["skipped_directory_fn_ignore_dirs"] += 1
-                    continue
-                p_matches = [n for n in config.fn_ignore_paths if fnmatch.fnmatch(root, n.rstrip(os.sep))]
-                if len(p_matches) > 0:
+                if ignore_dirs.match(bname) or ignore_paths.match(root):
                     file_search_stats["skipped_directory_fn_ignore_dirs"] += 1
                     continue
 
                 # Sanity check - make sure that we're not just running in the installation directory
-                if len(filenames) > 0 and all([fn in filenames for fn in multiqc_installation_dir_files]):
+                fns = set(fn for fn, _ in filenames)
+                if len(fns) > 0 and all([fn in fns for fn in multiqc_installation_dir_files]):
                     logger.error("Error: MultiQC is running in source code directory! {}".format(root))
                     logger.warning(
                         "Please see the docs for how to use MultiQC: https://multiqc.info/docs/#running-multiqc"
                     )
                     dirnames[:] = []
-                    filenames[:] = []
                     continue
 
                 # Search filenames in this directory
-                for fn in filenames:
+                for fn, st in filenames:
                     searchfiles.append([fn, root])
+                    searchfile_stats.append(st)
 
     # Search through collected files
     console = rich.console.Console(
@@ -312,14 +332,57 @@ def get_filelist(run_module_names):
         console=console,
         disable=config.no_ansi or config.quiet,
     )
+    # Look up files that haven't changed since the last run in the search cache
+    cache = None
+    cached_results = dict()
+    if config.search_cache:
+        search_config = {k: getattr(config, k) for k in SEARCH_CONFIG_KEYS}
+        cache = search_cache.SearchCache.open(search_cache.fingerprint(spatterns, search_config))
+    if cache is not None:
+        for idx, (fn, root) in enumerate(searchfiles):
+            cached = cache.get(os.path.join(root, fn), searchfile_stats[idx])
+            if cached is not None:
+                cached_result = _cached_file_result(fn, root, cached)
+                if cached_result is None:
+                    # Search the file as usual, which logs and skips it if it still can't be read
+                    cache.discard(os.path.join(root, fn), searchfile_stats[idx])
+                else:
+                    cached_results[idx] = cached_result
+        file_search_stats["search_cache_hits"] = cache.hits
+        file_search_stats["search_cache_misses"] = cache.misses
+    to_search = [
+        (fn, root, searchfile_stats[idx]) for idx, (fn, root) in enumerate(searchfiles) if idx not in cached_results
+    ]
+
     with progress_obj as progress:
         mqc_task = progress.add_task("searching", total=len(searchfiles), s_fn="")
-        for sf in searchfiles:
-            progress.update(mqc_task, advance=1, s_fn=os.path.join(sf[1], sf[0])[-50:])
-            if not add_file(sf[0], sf[1]):
-                file_search_stats["skipped_no_match"] += 1
+        progress.update(mqc_task, advance=len(cached_results))
+        if config.search_workers > 1 and len(to_search) > 1:
+            search_results = _search_files_parallel(to_search, matcher, progress, mqc_task)
+        else:
+            search_results = [_search_files(to_search, matcher, progress, mqc_task)]
         progress.update(mqc_task, s_fn="")
 
+    # Merge the search results in the original file order, so that parallel
+    # and cached searches give exactly the same result as a serial search
+    searched_results = iter(file_result for file_results, _ in search_results for file_result in file_results)
+    for idx, (fn, root) in enumerate(searchfiles):
+        if idx in cached_results:
+            matches, stats = cached_results[idx]
+        else:
+            matches, stats = next(searched_results)
+            if cache is not None:
+                cache.add(os.path.join(root, fn), _file_result_for_cache(matches, stats))
+        for key, f in matches:
+            files[key].append(f)
+        for key, count in stats.items():
+            file_search_stats[key] = file_search_stats.get(key, 0) + count
+    for _, sp_times in search_results:
+        for key, sp_time in sp_times.items():
+            runtimes["sp"][key] = runtimes["sp"].get(key, 0) + sp_time
+    if cache is not None:
+        cache.save()
+
     runtimes["total_sp"] = time.time() - total_sp_starttime
     if config.profile_runtime:
         logger.info(f"Profile-runtime: Searching files took {runtimes['total_sp']:.2f}s")
@@ -332,19 +395,234 @@ def get_filelist(run_module_names):
     logger.debug(f"Summary of files that were skipped by the search: [{'] // ['.join(summaries)}]")
 
 
-def search_file(pattern, f, module_key):
+def _stat(path):
+    """Stat a file, following symlinks. Returns None if this fails."""
+    try:
+        return os.stat(path)
+    except (OSError, ValueError):
+        return None
+
+
+def _scandir_walk(top, followlinks=False):
+    """
+    Walk a directory tree top-down in the same order as os.walk(), but keep the
+    stat results for the files so that they don't have to be fetched again.
+    Yields (root, dirnames, filenames) tuples, where filenames is a list of
+    (filename, stat result) pairs. The stat result is None if the file could
+    not be stat'ed, eg. for broken symlinks. As with os.walk(), dirnames can be
+    modified in-place to prune the walk.
+    """
+    stack = [top]
+    while stack:
+        root = stack.pop()
+        dirnames = []
+        dir_symlinks = set()
+        filenames = []
+        try:
+            with os.scandir(root) as it:
+                for entry in it:
+                    try:
+                        is_dir = entry.is_dir()
+                    except OSError:
+                        is_dir = False
+                    if is_dir:
+                        dirnames.append(entry.name)
+                        try:
+                            if entry.is_symlink():
+                                dir_symlinks.add(entry.name)
+                        except OSError:
+                            pass
+                    else:
+                        try:
+                            filenames.append((entry.name, entry.stat()))
+                        except OSError:
+                            filenames.append((entry.name, None))
+        except OSError:
+            # Like os.walk(), silently skip directories that can't be read
+            continue
+        yield root, dirnames, filenames
+        # Push in reverse so that sub-directories are walked in order
+        for d in reversed(dirnames):
+            if followlinks or d not in dir_symlinks:
+                stack.append(os.path.join(root, d))
+
+
+def _add_file(fn, root, matcher, matches, stats, sp_times, st=None):
+    """
+    Function applied to each file found when walking the analysis
+    directories. Runs through all search patterns and returns True
+    if a match is found. Matches, search stats and timings are collected
+    in the supplied containers rather than the global report variables,
+    so that this can run in parallel worker processes. The stat result
+    from walking the directories is used to check the file type and size.
+    """
+    f = {"fn": fn, "root": root}
+
+    # Check that this is a file and not a pipe or anything weird
+    if st is None or not stat.S_ISREG(st.st_mode):
+        stats["skipped_not_a_file"] += 1
+        return False
+
+    # Check that we don't want to ignore this file
+    if matcher.ignore_files.match(fn):
+        stats["skipped_ignore_pattern"] += 1
+        return False
+
+    # Limit search to small files, to avoid 30GB FastQ files etc.
+    f["filesize"] = st.st_size
+    if f["filesize"] > config.log_filesize_limit:
+        stats["skipped_filesize_limit"] += 1
+        return False
+
+    # Use mimetypes to exclude binary files where possible
+    if not re.match(r".+_mqc\.(png|jpg|jpeg)", f["fn"]) and config.ignore_images:
+        (ftype, encoding) = mimetypes.guess_type(os.path.join(f["root"], f["fn"]))
+        if encoding is not None:
+            return False
+        if ftype is not None and ftype.startswith("image"):
+            return False
+
+    # Test file for each search pattern that could match this filename
+    file_matched = False
+    matched_keys = set()
+    contents_scan = search_matcher.FileContentsScan(matcher)
+    for pid in matcher.candidates(fn):
+        key, sp = matcher.patterns[pid]
+        # Don't look at other patterns for this module
+        if key in matched_keys:
+            continue
+        start = time.time()
+        if search_file(sp, f, key, stats, contents_scan):
+            matched_keys.add(key)
+            # Check that we shouldn't exclude this file
+            if not exclude_file(sp, f):
+                # Looks good! Remember this file
+                matches.append((key, f))
+                stats[key] += 1
+                file_matched = True
+            # Don't keep searching this file for other modules
+            if not sp.get("shared", False):
+                sp_times[key] += time.time() - start
+                return True
+        sp_times[key] += time.time() - start
+
+    return file_matched
+
+
+def _search_files(searchfiles_chunk, matcher, progress=None, mqc_task=None):
+    """
+    Search a list of (fn, root, stat result) tuples against the search patterns.
+    Returns a tuple with a list of results for each file, and the time
+    spent on each search pattern key. The result for each file is a
+    tuple of the matched (key, file) pairs and the file search stats.
+    """
+    file_results = []
+    sp_times = defaultdict(float)
+    for fn, root, st in searchfiles_chunk:
+        if progress is not None:
+            progress.update(mqc_task, advance=1, s_fn=os.path.join(root, fn)[-50:])
+        matches = []
+        stats = defaultdict(int)
+        if not _add_file(fn, root, matcher, matches, stats, sp_times, st):
+            stats["skipped_no_match"] += 1
+        file_results.append((matches, stats))
+    return file_results, sp_times
+
+
+def _file_result_for_cache(matches, stats):
+    """Summarise the search result for a file so that it can be saved in the search cache"""
+    result = {"keys": [key for key, _ in matches], "stats": stats}
+    if len(matches) > 0:
+        f = matches[0][1]
+        result["filesize"] = f.get("filesize")
+        # Some modules use the lines read during the search, remember how many to read again
+        if "contents_lines" in f:
+            result["num_lines"] = len(f["contents_lines"])
+    return result
+
+
+def _cached_file_result(fn, root, cached):
+    """Recreate the search result for a file from the search cache. Returns None if the file can't be read any more."""
+    matches = []
+    if len(cached["keys"]) > 0:
+        f = {"fn": fn, "root": root}
+        if cached.get("filesize") is not None:
+            f["filesize"] = cached["filesize"]
+        if "num_lines" in cached:
+            try:
+                with io.open(os.path.join(root, fn), "r", encoding="utf-8") as fh:
+                    f["contents_lines"] = [line for line in itertools.islice(fh, cached["num_lines"])]
+            except (IOError, OSError, ValueError, UnicodeDecodeError) as e:
+                logger.debug(f"Couldn't read cached file {os.path.join(root, fn)}, searching it again: {e}")
+                return None
+        matches = [(key, f) for key in cached["keys"]]
+    return matches, cached["stats"]
+
+
+# Config variables that are used when searching files, passed on to worker processes
+SEARCH_CONFIG_KEYS = [
+    "fn_ignore_files",
+    "log_filesize_limit",
+    "ignore_images",
+    "filesearch_lines_limit",
+    "report_readerrors",
+]
+
+
+def _init_search_worker(search_config):
+    """Set the search config in a worker process, in case it was not forked from the main process"""
+    config.update(search_config)
+
+
+def _search_files_parallel(searchfiles, matcher, progress, mqc_task):
+    """
+    Split the list of files into chunks and search them with a pool of
+    workers. Returns the results for each chunk in the original file order.
+    """
+    num_workers = config.search_workers
+    # Several chunks per worker to balance the load, but not so many that the overhead takes over
+    chunk_size = max(1, math.ceil(len(searchfiles) / (num_workers * 4)))
+    chunks = [searchfiles[i : i + chunk_size] for i in range(0, len(searchfiles), chunk_size)]
+    logger.debug(
+        f"Searching {len(searchfiles)} files with {num_workers} {config.search_workers_backend} workers "
+        f"in {len(chunks)} chunks"
+    )
+
+    if config.search_workers_backend == "thread":
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=num_workers)
+    else:
+        if config.search_workers_backend != "process":
+            logger.warning(
+                f"Unrecognised search_workers_backend '{config.search_workers_backend}', using 'process' instead"
+            )
+        search_config = {k: getattr(config, k) for k in SEARCH_CONFIG_KEYS}
+        executor = concurrent.futures.ProcessPoolExecutor(
+            max_workers=num_workers, initializer=_init_search_worker, initargs=(search_config,)
+        )
+
+    with executor:
+        futures = {executor.submit(_search_files, chunk, matcher): chunk for chunk in chunks}
+        for future in concurrent.futures.as_completed(futures):
+            chunk = futures[future]
+            progress.update(mqc_task, advance=len(chunk), s_fn=os.path.join(chunk[-1][1], chunk[-1][0])[-50:])
+        return [future.result() for future in futures]
+
+
+def search_file(pattern, f, module_key, stats=None, contents_scan=None):
     """
     Function to searach a single file for a single search pattern.
     """
 
     global file_search_stats
+    if stats is None:
+        stats = file_search_stats
     fn_matched = False
     contents_matched = False
 
     # Search pattern specific filesize limit
     if pattern.get("max_filesize") is not None and "filesize" in f:
         if f["filesize"] > pattern.get("max_filesize"):
-            file_search_stats["skipped_module_specific_max_filesize"] += 1
+            stats["skipped_module_specific_max_filesize"] += 1
             return False
 
     # Search by file name (glob)
@@ -367,9 +645,13 @@ def search_file(pattern, f, module_key):
 
     # Search by file contents
     if pattern.get("contents") is not None or pattern.get("contents_re") is not None:
-        if pattern.get("contents_re") is not None:
-            repattern = re.compile(pattern["contents_re"])
-        if "contents_lines" not in f or ("num_lines" in pattern and len(f["contents_lines"]) < pattern["num_lines"]):
+        if contents_scan is None:
+            contents_scan = search_matcher.FileContentsScan()
+        if "contents_lines" not in f or (
+            "num_lines" in pattern
+            and len(f["contents_lines"]) < pattern["num_lines"]
+            and f["contents_lines"] is not contents_scan.complete_lines
+        ):
             f["contents_lines"] = []
             file_path = os.path.join(f["root"], f["fn"])
             try:
@@ -378,33 +660,20 @@ def search_file(pattern, f, module_key):
                         f["contents_lines"].append(line)
                         if i >= config.filesearch_lines_limit and i >= pattern.get("num_lines", 0):
                             break
+                    else:
+                        # Got to the end of the file, no need to read it again for patterns wanting more lines
+                        contents_scan.complete_lines = f["contents_lines"]
             # Can't open file - usually because it's a binary file, and we're reading as utf-8
             except (IOError, OSError, ValueError, UnicodeDecodeError) as e:
                 if config.report_readerrors:
                     logger.debug(f"Couldn't read file when looking for output: {file_path}, {e}")
-                file_search_stats["skipped_file_contents_search_errors"] += 1
+                stats["skipped_file_contents_search_errors"] += 1
                 return False
 
-        # Go through the parsed file contents
-        for i, line in enumerate(f["contents_lines"]):
-            # Break if we've searched enough lines for this pattern
-            if pattern.get("num_lines") and i >= pattern.get("num_lines"):
-                break
-
-            # Search by file contents (string)
-            if pattern.get("contents") is not None:
-                if pattern["contents"] in line:
-                    contents_matched = True
-                    if pattern.get("fn") is None and pattern.get("fn_re") is None:
-                        return True
-                    break
-            # Search by file contents (regex)
-            elif pattern.get("contents_re") is not None:
-                if re.search(repattern, line):
-                    contents_matched = True
-                    if pattern.get("fn") is None and pattern.get("fn_re") is None:
-                        return True
-                    break
+        # The file contents are scanned once for all patterns, then this is just a lookup
+        contents_matched = contents_scan.matches(pattern, f["contents_lines"])
+        if contents_matched and pattern.get("fn") is None and pattern.get("fn_re") is None:
+            return True
 
     return fn_matched and contents_matched
 
@@ -451,12 +720,14 @@ def exclude_file(sp, f):
 
 
 def data_sources_tofile():
-    fn = "multiqc_sources.{}".format(config.data_format_extensions[config.data_format])
+    # Written as tsv for the columnar data formats
+    data_format = config.data_format if config.data_format in ["json", "yaml"] else "tsv"
+    fn = "multiqc_sources.{}".format(config.data_format_extensions[data_format])
     with io.open(os.path.join(config.data_dir, fn), "w", encoding="utf-8") as f:
-        if config.data_format == "json":
+        if data_format == "json":
             jsonstr = json.dumps(data_sources, indent=4, ensure_ascii=False)
             print(jsonstr.encode("utf-8", "ignore").decode("utf-8"), file=f)
-        elif config.data_format == "yaml":
+        elif data_format == "yaml":
             yaml.dump(data_sources, f, default_flow_style=False)
         else:
             lines = [["Module", "Section", "Sample Name", "Source"]]
@@ -475,13 +746,14 @@ def dois_tofile(modules_output):
     for mod in modules_output:
         if mod.doi is not None and mod.doi != "" and mod.doi != []:
             dois[mod.anchor] = mod.doi
-    # Write to a file
-    fn = "multiqc_citations.{}".format(config.data_format_extensions[config.data_format])
+    # Write to a file, as tsv for the columnar data formats
+    data_format = config.data_format if config.data_format in ["json", "yaml"] else "tsv"
+    fn = "multiqc_citations.{}".format(config.data_format_extensions[data_format])
     with io.open(os.path.join(config.data_dir, fn), "w", encoding="utf-8") as f:
-        if config.data_format == "json":
+        if data_format == "json":
             jsonstr = json.dumps(dois, indent=4, ensure_ascii=False)
             print(jsonstr.encode("utf-8", "ignore").decode("utf-8"), file=f)
-        elif config.data_format == "yaml":
+        elif data_format == "yaml":
             yaml.dump(dois, f, default_flow_style=False)
         else:
             body = ""
@@ -497,18 +769,7 @@ def save_htmlid(html_id, skiplint=False):
     global html_ids
     global lint_errors
 
-    # Trailing whitespace
-    html_id_clean = html_id.strip()
-
-    # Trailing underscores
-    html_id_clean = html_id_clean.strip("_")
-
-    # Must begin with a letter
-    if re.match(r"^[a-zA-Z]", html_id_clean) is None:
-        html_id_clean = "mqc_{}".format(html_id_clean)
-
-    # Replace illegal characters
-    html_id_clean = re.sub("[^a-zA-Z0-9_-]+", "_", html_id_clean)
+    html_id_clean = _clean_htmlid(html_id)
 
     # Validate if linting
     if config.strict and not skiplint:
@@ -527,25 +788,56 @@ def save_htmlid(html_id, skiplint=False):
         lint_errors.append(errmsg)
 
     # Check for duplicates
-    i = 1
-    html_id_base = html_id_clean
-    while html_id_clean in html_ids:
-        html_id_clean = "{}-{}".format(html_id_base, i)
-        i += 1
-        if config.strict and not skiplint:
-            errmsg = "LINT: {}HTML ID was a duplicate ({}) ## {}".format(modname, html_id_clean, codeline)
-            logger.error(errmsg)
-            lint_errors.append(errmsg)
+    if html_id_clean in html_ids:
+        if (config.strict and not skiplint) or not isinstance(html_ids, HtmlIdRegistry):
+            # Try each suffix in turn, so that every duplicate is reported
+            i = 1
+            html_id_base = html_id_clean
+            while html_id_clean in html_ids:
+                html_id_clean = "{}-{}".format(html_id_base, i)
+                i += 1
+                if config.strict and not skiplint:
+                    errmsg = "LINT: {}HTML ID was a duplicate ({}) ## {}".format(modname, html_id_clean, codeline)
+                    logger.error(errmsg)
+                    lint_errors.append(errmsg)
+        else:
+            html_id_clean = "{}-{}".format(html_id_clean, html_ids.next_suffix(html_id_clean))
 
     # Remember and return
     html_ids.append(html_id_clean)
     return html_id_clean
 
 
-def compress_json(data):
-    """Take a Python data object. Convert to JSON and compress using lzstring"""
+@functools.lru_cache(maxsize=None)
+def _clean_htmlid(html_id):
+    """Sanitise a HTML ID"""
+    # Trailing whitespace
+    html_id_clean = html_id.strip()
+
+    # Trailing underscores
+    html_id_clean = html_id_clean.strip("_")
+
+    # Must begin with a letter
+    if re.match(r"^[a-zA-Z]", html_id_clean) is None:
+        html_id_clean = "mqc_{}".format(html_id_clean)
+
+    # Replace illegal characters
+    html_id_clean = re.sub("[^a-zA-Z0-9_-]+", "_", html_id_clean)
+    return html_id_clean
+
+
+def compress_json(data, compression="lzstring"):
+    """
+    Take a Python data object. Convert to JSON and compress to a base64 string.
+    Uses gzip if the report template can decode it, else the (much slower) lzstring.
+    """
     json_string = json.dumps(data).encode("utf-8", "ignore").decode("utf-8")
     json_string = sanitise_json(json_string)
+    if compression == "gzip":
+        # Fixed mtime so that the same data always gives the same report. Level 6 is
+        # several times faster than the default of 9, for a slightly bigger file.
+        gzipped = gzip.compress(json_string.encode("utf-8"), compresslevel=6, mtime=0)
+        return base64.b64encode(gzipped).decode("ascii")
     x = lzstring.LZString()
     return x.compressToBase64(json_string)
 
@@ -561,6 +853,9 @@ def sanitise_json(json_string):
     (case-sensitive) will have it switched for "null". Hopefully that doesn't happen
     a lot, otherwise we'll have to do this in a more complicated manner.
     """
-    json_string = re.sub(r"\bNaN\b", "null", json_string)
-    json_string = re.sub(r"\b-?Infinity\b", "null", json_string)
+    # Plain substring checks are much faster than the regexes, and usually there's nothing to replace
+    if "NaN" in json_string:
+        json_string = re.sub(r"\bNaN\b", "null", json_string)
+    if "Infinity" in json_string:
+        json_string = re.sub(r"\b-?Infinity\b", "null", json_string)
     return json_string
@@ -0,0 +1,239 @@
+#!/usr/bin/env python
+
+""" MultiQC sample name cleaning. Turns file names into sample names using the
+fn_clean_exts, fn_clean_trim and sample_names_replace config, with the config
+parsed and the regexes compiled once per module instead of for every file.
+Also matches sample names against the sample_names_ignore patterns. """
+
+
+import fnmatch
+import functools
+import logging
+import os
+import re
+
+from . import config
+
+logger = logging.getLogger(__name__)
+
+# Cleaned names remembered by each cleaner
+MEMO_SIZE = 100000
+
+# Cleaners for each module anchor
+_cleaners = dict()
+
+# Matcher for the sample_names_ignore config
+_ignore_matcher = None
+
+
+def get_cleaner(anchor):
+    """Return the sample name cleaner for a module, built again if the config has changed"""
+    key = _config_key()
+    cleaner = _cleaners.get(anchor)
+    if cleaner is None or cleaner.config_key != key:
+        cleaner = SampleNameCleaner(anchor, key)
+        _cleaners[anchor] = cleaner
+    return cleaner
+
+
+def _config_key():
+    """
+    Snapshot of the config used to clean sample names. The list and dict options
+    are copied and compared by their contents, as they can be changed in place.
+    """
+    return (
+        config.fn_clean_sample_names,
+        tuple(tuple(ext.items()) if isinstance(ext, dict) else ext for ext in config.fn_clean_exts),
+        tuple(config.fn_clean_trim),
+        str(config.prepend_dirs),
+        config.prepend_dirs_sep,
+        config.prepend_dirs_depth,
+        str(config.use_filename_as_sample_name),
+        tuple((config.sample_names_replace or {}).items()),
+        config.sample_names_replace_regex,
+        config.sample_names_replace_exact,
+        config.sample_names_replace_complete,
+    )
+
+
+def is_ignored(s_name):
+    """Should a sample name be ignored? Matches config.sample_names_ignore and sample_names_ignore_re"""
+    global _ignore_matcher
+    key = (tuple(config.sample_names_ignore), tuple(config.sample_names_ignore_re))
+    if _ignore_matcher is None or _ignore_matcher.config_key != key:
+        _ignore_matcher = SampleIgnoreMatcher(key)
+    return _ignore_matcher.match(s_name)
+
+
+class SampleIgnoreMatcher(object):
+    """
+    Matches sample names against the ignore config. Globs without wildcards are looked up
+    in a set, the other globs are merged into one regex, and the result for each name is remembered.
+    """
+
+    def __init__(self, config_key):
+        self.config_key = config_key
+        self.names = set()
+        globs = []
+        for pattern in config.sample_names_ignore:
+            pattern = os.path.normcase(pattern)
+            if any(c in pattern for c in "*?["):
+                globs.append(fnmatch.translate(pattern))
+            else:
+                self.names.add(pattern)
+        self.globs_re = re.compile("|".join(globs)) if globs else None
+        self.regexes = [re.compile(pattern) for pattern in config.sample_names_ignore_re]
+        self.match = functools.lru_cache(maxsize=MEMO_SIZE)(self._match)
+
+    def _match(self, s_name):
+        name = os.path.normcase(s_name)
+        if name in self.names or (self.globs_re is not None and self.globs_re.match(name)):
+            return True
+        return any(regex.match(s_name) for regex in self.regexes)
+
+
+class SampleNameCleaner(object):
+    """Cleans sample names for one module, with the results for each file remembered"""
+
+    def __init__(self, anchor, config_key):
+        self.anchor = anchor
+        self.config_key = config_key
+        self.clean_exts = self._compile_clean_exts()
+        self.replacements = self._compile_replacements()
+        self.clean = functools.lru_cache(maxsize=MEMO_SIZE)(self._clean)
+
+    def _compile_clean_exts(self):
+        """List of (type, pattern) steps from config.fn_clean_exts that apply to this module"""
+        clean_exts = []
+        if not config.fn_clean_sample_names:
+            return clean_exts
+        for ext in config.fn_clean_exts:
+            if isinstance(ext, str):
+                ext = {"type": "truncate", "pattern": ext}
+
+            # Check if this config is limited to a module, without changing the config used in the cache key
+            if "module" in ext:
+                modules = [ext["module"]] if isinstance(ext["module"], str) else ext["module"]
+                if not any([m == self.anchor for m in modules]):
+                    continue
+
+            # Go through different filter types
+            if ext.get("type") in ("truncate", "remove"):
+                clean_exts.append((ext["type"], ext["pattern"]))
+            elif ext.get("type") == "replace":
+                logger.warning(
+                    "use 'config.fn_clean_sample_names.remove' instead "
+                    "of 'config.fn_clean_sample_names.replace' [deprecated]"
+                )
+                clean_exts.append(("remove", ext["pattern"]))
+            elif ext.get("type") in ("regex", "regex_keep"):
+                clean_exts.append((ext["type"], re.compile(ext["pattern"])))
+            elif ext.get("type") is None:
+                logger.error('config.fn_clean_exts config was missing "type" key: {}'.format(ext))
+            else:
+                logger.error("Unrecognised config.fn_clean_exts type: {}".format(ext.get("type")))
+        return clean_exts
+
+    def _compile_replacements(self):
+        """List of (search, replace) pairs from config.sample_names_replace, with regexes compiled"""
+        replacements = []
+        for s_name_search, s_name_replace in (config.sample_names_replace or {}).items():
+            if config.sample_names_replace_regex:
+                try:
+                    s_name_search = re.compile(s_name_search)
+                except re.error as e:
+                    logger.error("Error with sample name replacement regex: {}".format(e))
+                    continue
+            replacements.append((s_name_search, s_name_replace))
+        return replacements
+
+    def _clean(self, s_name, root, filename, seach_pattern_key):
+        s_name_original = s_name
+
+        # For modules setting s_name from file contents, set s_name back to the filename
+        # (if wanted in the config)
+        if filename is not None and (
+            config.use_filename_as_sample_name is True
+            or (
+                isinstance(config.use_filename_as_sample_name, list)
+                and seach_pattern_key is not None
+                and seach_pattern_key in config.use_filename_as_sample_name
+            )
+        ):
+            s_name = filename
+
+        # Set root to empty string if not known
+        if root is None:
+            root = ""
+
+        # if s_name comes from file contents, it may have a file path
+        # For consistency with other modules, we keep just the basename
+        s_name = os.path.basename(s_name)
+
+        # Prepend sample name with directory
+        if config.prepend_dirs:
+            sep = config.prepend_dirs_sep
+            root = root.lstrip(".{}".format(os.sep))
+            dirs = [d.strip() for d in root.split(os.sep) if d.strip() != ""]
+            if config.prepend_dirs_depth != 0:
+                d_idx = config.prepend_dirs_depth * -1
+                if config.prepend_dirs_depth > 0:
+                    dirs = dirs[d_idx:]
+                else:
+                    dirs = dirs[:d_idx]
+            if len(dirs) > 0:
+                s_name = "{}{}{}".format(sep.join(dirs), sep, s_name)
+
+        if config.fn_clean_sample_names:
+            # Split then take first section to remove everything after these matches
+            for ext_type, pattern in self.clean_exts:
+                if ext_type == "truncate":
+                    s_name = s_name.split(pattern, 1)[0]
+                elif ext_type == "remove":
+                    s_name = s_name.replace(pattern, "")
+                elif ext_type == "regex":
+                    s_name = pattern.sub("", s_name)
+                elif ext_type == "regex_keep":
+                    match = pattern.search(s_name)
+                    s_name = match.group() if match else s_name
+            # Trim off characters at the end of names
+            for chrs in config.fn_clean_trim:
+                if s_name.endswith(chrs):
+                    s_name = s_name[: -len(chrs)]
+                if s_name.startswith(chrs):
+                    s_name = s_name[len(chrs) :]
+
+        # Remove trailing whitespace
+        s_name = s_name.strip()
+
+        # If we cleaned back to an empty string, just use the original value
+        if s_name == "":
+            s_name = s_name_original
+
+        # Do any hard replacements that are set with --replace-names
+        for s_name_search, s_name_replace in self.replacements:
+            try:
+                # Skip if we're looking for exact matches only
+                if config.sample_names_replace_exact:
+                    # Simple strings
+                    if not config.sample_names_replace_regex and s_name != s_name_search:
+                        continue
+                    # regexes
+                    if config.sample_names_replace_regex and not s_name_search.fullmatch(s_name):
+                        continue
+                # Replace - regex
+                if config.sample_names_replace_regex:
+                    s_name = s_name_search.sub(s_name_replace, s_name)
+                # Replace - simple string
+                else:
+                    # Complete name swap
+                    if config.sample_names_replace_complete:
+                        if s_name_search in s_name:
+                            s_name = s_name_replace
+                    # Partial substring replace
+                    else:
+                        s_name = s_name.replace(s_name_search, s_name_replace)
+            except re.error as e:
+                logger.error("Error with sample name replacement regex: {}".format(e))
+
+        return s_name
@@ -0,0 +1,152 @@
+#!/usr/bin/env python
+
+""" MultiQC search cache. Remembers the file search result for each file,
+so that files that haven't changed since the last run don't have to be
+searched again. """
+
+
+import hashlib
+import json
+import os
+import time
+
+# sqlite3 is part of the standard library, but can be missing in minimal Python builds
+try:
+    import sqlite3
+except ImportError:
+    sqlite3 = None
+
+from . import config
+
+logger = config.logger
+
+CACHE_FN = "search_cache.sqlite"
+
+# Version of the database tables, the cache is emptied when it changes
+SCHEMA_VERSION = 2
+
+# Search results are kept for this many of the most recently used fingerprints,
+# so that runs with different modules or configs don't empty each other's entries
+MAX_FINGERPRINTS = 8
+
+
+def get_cache_dir():
+    """Directory for MultiQC cache files: config.cache_dir, defaulting to ~/.cache/multiqc"""
+    if config.cache_dir:
+        return os.path.expanduser(config.cache_dir)
+    return os.path.join(os.environ.get("XDG_CACHE_HOME") or os.path.expanduser(os.path.join("~", ".cache")), "multiqc")
+
+
+def fingerprint(spatterns, search_config):
+    """
+    Hash of everything that affects the search result for a given file:
+    the MultiQC version, the search patterns in use (search_patterns.yaml,
+    plus any user config) and the search config variables.
+    """
+    data = json.dumps([config.version, spatterns, search_config], sort_keys=True, default=str)
+    return hashlib.sha1(data.encode("utf-8")).hexdigest()
+
+
+class SearchCache(object):
+    """
+    SQLite database with the search result for each file, keyed by the fingerprint and
+    the absolute file path. An entry is only used if the file size, modification time
+    and inode are all unchanged. Entries for all but the MAX_FINGERPRINTS most recently
+    used fingerprints are dropped.
+
+    A search result is a dict with the search pattern keys that the file matched
+    (`keys`), the changes to the file search stats (`stats`) and the file details
+    needed to recreate the file dict given to the modules.
+    """
+
+    def __init__(self, path, fingerprint):
+        self.path = path
+        self.fingerprint = fingerprint
+        self.hits = 0
+        self.misses = 0
+        # File stats at lookup time for cache misses, so that changes during the search aren't missed
+        self.miss_stats = dict()
+        self.new_entries = []
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.db = sqlite3.connect(path, timeout=30)
+        with self.db:
+            if self.db.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                logger.debug("Search cache is from a different MultiQC version, clearing it")
+                self.db.execute("DROP TABLE IF EXISTS meta")
+                self.db.execute("DROP TABLE IF EXISTS fingerprints")
+                self.db.execute("DROP TABLE IF EXISTS files")
+                self.db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            self.db.execute("CREATE TABLE IF NOT EXISTS fingerprints (fingerprint TEXT PRIMARY KEY, last_used REAL)")
+            self.db.execute(
+                "CREATE TABLE IF NOT EXISTS files (fingerprint TEXT, path TEXT, size INTEGER, mtime_ns INTEGER, "
+                "inode INTEGER, result TEXT, PRIMARY KEY (fingerprint, path))"
+            )
+            self.db.execute("INSERT OR REPLACE INTO fingerprints VALUES (?, ?)", (fingerprint, time.time()))
+            # Drop the entries for fingerprints that haven't been used for a while
+            old = self.db.execute(
+                "SELECT fingerprint FROM fingerprints ORDER BY last_used DESC LIMIT -1 OFFSET ?", (MAX_FINGERPRINTS,)
+            ).fetchall()
+            if old:
+                logger.debug(f"Removing {len(old)} old search pattern sets from the search cache")
+                self.db.executemany("DELETE FROM files WHERE fingerprint = ?", old)
+                self.db.executemany("DELETE FROM fingerprints WHERE fingerprint = ?", old)
+
+    @classmethod
+    def open(cls, fingerprint):
+        """Open the search cache in the cache directory. Returns None if it can't be used."""
+        if sqlite3 is None:
+            logger.warning("Python sqlite3 module not available, not using the search cache")
+            return None
+        path = os.path.join(get_cache_dir(), CACHE_FN)
+        try:
+            return cls(path, fingerprint)
+        except (sqlite3.Error, OSError) as e:
+            logger.warning(f"Could not open the search cache '{path}', searching all files: {e}")
+            return None
+
+    def get(self, path, st):
+        """
+        Return the cached search result for a file, or None if it's not cached or has changed.
+        Takes the stat result for the file from walking the directories (None if that failed).
+        """
+        path = os.path.abspath(path)
+        stat = (st.st_size, st.st_mtime_ns, st.st_ino) if st is not None else None
+        row = None
+        if stat is not None:
+            row = self.db.execute(
+                "SELECT result FROM files "
+                "WHERE fingerprint = ? AND path = ? AND size = ? AND mtime_ns = ? AND inode = ?",
+                (self.fingerprint, path) + stat,
+            ).fetchone()
+        if row is None:
+            self.misses += 1
+            if stat is not None:
+                self.miss_stats[path] = stat
+            return None
+        self.hits += 1
+        return json.loads(row[0])
+
+    def discard(self, path, st):
+        """Count a cached result that couldn't be used as a miss, so that the file is searched and saved again"""
+        self.hits -= 1
+        self.misses += 1
+        if st is not None:
+            self.miss_stats[os.path.abspath(path)] = (st.st_size, st.st_mtime_ns, st.st_ino)
+
+    def add(self, path, result):
+        """Queue the search result for a file that missed the cache, to be written by save()"""
+        path = os.path.abspath(path)
+        stat = self.miss_stats.pop(path, None)
+        if stat is not None:
+            self.new_entries.append((self.fingerprint, path) + stat + (json.dumps(result),))
+
+    def save(self):
+        """Write the new search results to the cache and close the database"""
+        try:
+            with self.db:
+                self.db.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?, ?)", self.new_entries)
+        except sqlite3.Error as e:
+            logger.warning(f"Could not write to the search cache '{self.path}': {e}")
+        finally:
+            self.db.close()
+        logger.debug(f"Search cache: {self.hits} hits, {self.misses} misses, {len(self.new_entries)} files saved")
@@ -0,0 +1,227 @@
+#!/usr/bin/env python
+
+""" MultiQC search pattern matching. Precompiles the search patterns
+once per run so that each file only has to be tested against the
+patterns that could possibly match it. """
+
+
+import fnmatch
+import itertools
+import os
+import re
+
+# Optional dependency, used to find all `contents` strings in a single pass if installed
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
+
+
+class GlobMatcher(object):
+    """
+    Matches names against a list of glob patterns, like running fnmatch.fnmatch()
+    with each pattern in turn, but with a single precompiled regex.
+    """
+
+    def __init__(self, globs):
+        self.regex = None
+        if len(globs) > 0:
+            self.regex = re.compile("|".join("(?:{})".format(fnmatch.translate(os.path.normcase(g))) for g in globs))
+
+    def match(self, name):
+        """Return True if the name matches any of the glob patterns"""
+        return self.regex is not None and self.regex.match(os.path.normcase(name)) is not None
+
+
+class SearchPatternMatcher(object):
+    """
+    Index of the filename search patterns (`fn` and `fn_re`).
+
+    Search patterns are numbered in the order that they should be tested
+    (search pattern tiers, then keys, then patterns within a key). For a given
+    filename, candidates() returns the numbers of all patterns whose filename
+    conditions are met, plus all patterns that only look at file contents.
+    Any pattern not returned is guaranteed not to match the file.
+    """
+
+    def __init__(self, spatterns, ignore_files=()):
+        # Filenames to skip before testing any search patterns
+        self.ignore_files = GlobMatcher(ignore_files)
+        # List of (key, pattern) tuples in search order
+        self.patterns = []
+        # Patterns that need to be tested for every file
+        self.always = []
+        # Globs without wildcards: filename -> pattern ids
+        self.exact = dict()
+        # Globs like "*.ext": suffix length -> suffix -> pattern ids
+        self.suffixes = dict()
+        # Other globs, matched against the normalised filename: list of (pattern id, compiled regex)
+        self.globs = []
+        # Patterns with just a fn_re regex: list of (pattern id, compiled regex)
+        self.regexes = []
+        # Extra fn_re condition for patterns that are indexed by their fn glob
+        self.extra_fn_re = dict()
+
+        for tier in spatterns:
+            for key, sps in tier.items():
+                for sp in sps:
+                    pid = len(self.patterns)
+                    self.patterns.append((key, sp))
+                    self._add_pattern(pid, sp)
+
+        # Use one combined regex to quickly reject files that don't match any of the remaining patterns
+        self.globs_combined = self._combine(self.globs)
+        self.regexes_combined = self._combine(self.regexes)
+
+        # Precompile the file contents patterns
+        self.contents_strings = set()
+        self.contents_res = dict()
+        for _, sp in self.patterns:
+            if sp.get("contents") is not None:
+                self.contents_strings.add(sp["contents"])
+            elif sp.get("contents_re") is not None and sp["contents_re"] not in self.contents_res:
+                self.contents_res[sp["contents_re"]] = re.compile(sp["contents_re"])
+        self.contents_automaton = None
+        if ahocorasick is not None and len(self.contents_strings) > 0:
+            self.contents_automaton = ahocorasick.Automaton()
+            for string in self.contents_strings:
+                self.contents_automaton.add_word(string, string)
+            self.contents_automaton.make_automaton()
+
+    @staticmethod
+    def _combine(regexes):
+        if len(regexes) < 2:
+            return None
+        try:
+            return re.compile("|".join("(?:{})".format(regex.pattern) for _, regex in regexes))
+        except re.error:
+            # Eg. numbered back-references in user patterns. Just test them one by one.
+            return None
+
+    def _add_pattern(self, pid, sp):
+        # search_file() checks the filesize before the filename, so always test these to keep the skip stats
+        if sp.get("max_filesize") is not None:
+            self.always.append(pid)
+            return
+
+        glob = sp.get("fn")
+        fn_re = sp.get("fn_re")
+        if glob is None and fn_re is None:
+            # Patterns without any search conditions can never match
+            if sp.get("contents") is not None or sp.get("contents_re") is not None:
+                self.always.append(pid)
+            return
+
+        if glob is None:
+            self.regexes.append((pid, re.compile(fn_re)))
+            return
+
+        if fn_re is not None:
+            self.extra_fn_re[pid] = re.compile(fn_re)
+        glob = os.path.normcase(glob)
+        if not any(c in glob for c in "*?["):
+            self.exact.setdefault(glob, []).append(pid)
+        elif glob.startswith("*") and not any(c in glob[1:] for c in "*?["):
+            suffix = glob[1:]
+            self.suffixes.setdefault(len(suffix), dict()).setdefault(suffix, []).append(pid)
+        else:
+            self.globs.append((pid, re.compile(fnmatch.translate(glob))))
+
+    def candidates(self, fn):
+        """Return the sorted ids of the patterns that can match this filename"""
+        fn_norm = os.path.normcase(fn)
+        pids = list(self.always)
+        pids.extend(self.exact.get(fn_norm, []))
+        for length, suffixes in self.suffixes.items():
+            pids.extend(suffixes.get(fn_norm[-length:] if length else "", []))
+        if self.globs_combined is None or self.globs_combined.match(fn_norm):
+            pids.extend(pid for pid, regex in self.globs if regex.match(fn_norm))
+        if self.regexes_combined is None or self.regexes_combined.match(fn):
+            pids.extend(pid for pid, regex in self.regexes if regex.match(fn))
+        if self.extra_fn_re:
+            pids = [pid for pid in pids if pid not in self.extra_fn_re or self.extra_fn_re[pid].match(fn)]
+        return sorted(pids)
+
+
+class FileContentsScan(object):
+    """
+    Searches the first lines of a file for `contents` and `contents_re` search patterns.
+
+    The lines are joined and scanned once for all `contents` strings (with an Aho-Corasick
+    automaton if available). Each `contents_re` regex is only searched as far as a pattern
+    needs it, and never twice over the same line. Results are kept so that every pattern is
+    just a lookup afterwards.
+    """
+
+    def __init__(self, matcher=None):
+        self.matcher = matcher
+        self.lines = None
+        # Set by the caller if the lines are the complete file
+        self.complete_lines = None
+
+    def _scan(self, lines):
+        self.lines = lines
+        self.line_ends = list(itertools.accumulate(len(line) for line in lines))
+        self.text = None
+        # Contents string -> end position of first occurrence (None if not found)
+        self.first_end = dict()
+        # Contents regex -> (index of first matching line or None if not found, number of lines searched)
+        self.first_line = dict()
+
+    def _string_first_end(self, string):
+        if string not in self.first_end:
+            if self.text is None:
+                self.text = "".join(self.lines)
+                if self.matcher is not None and self.matcher.contents_automaton is not None:
+                    # Find the first occurrence of every string in a single pass
+                    for end_idx, found in self.matcher.contents_automaton.iter(self.text):
+                        if found not in self.first_end:
+                            self.first_end[found] = end_idx + 1
+                    for other in self.matcher.contents_strings:
+                        self.first_end.setdefault(other, None)
+                    if string in self.first_end:
+                        return self.first_end[string]
+            start = self.text.find(string)
+            self.first_end[string] = start + len(string) if start >= 0 else None
+        return self.first_end[string]
+
+    def _regex_first_line(self, regex, num_lines):
+        found, searched = self.first_line.get(regex, (None, 0))
+        if found is None and searched < num_lines:
+            # Don't combine the regexes into a single alternation: patterns such as `.*foo.*`
+            # lose the literal prefix optimisation in there and get very slow on long lines.
+            compiled = None
+            if self.matcher is not None:
+                compiled = self.matcher.contents_res.get(regex)
+            if compiled is None:
+                compiled = re.compile(regex)
+            found = next((i for i in range(searched, num_lines) if compiled.search(self.lines[i])), None)
+            self.first_line[regex] = (found, num_lines)
+        return found
+
+    def matches(self, pattern, lines):
+        """Check if the contents pattern matches within the given file lines"""
+        if lines is not self.lines:
+            self._scan(lines)
+
+        # Number of lines to search
+        num_lines = len(lines)
+        if pattern.get("num_lines"):
+            num_lines = min(num_lines, pattern["num_lines"])
+        if num_lines == 0:
+            return False
+
+        # Search by file contents (string)
+        if pattern.get("contents") is not None:
+            # Strings spanning multiple lines have to be checked line by line
+            if "\n" in pattern["contents"]:
+                return any(pattern["contents"] in line for line in lines[:num_lines])
+            first_end = self._string_first_end(pattern["contents"])
+            return first_end is not None and first_end <= self.line_ends[num_lines - 1]
+
+        # Search by file contents (regex)
+        elif pattern.get("contents_re") is not None:
+            first_line = self._regex_first_line(pattern["contents_re"], num_lines)
+            return first_line is not None and first_line < num_lines
+
+        return False
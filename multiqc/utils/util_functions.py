@@ -5,6 +5,7 @@
 
 import io
 import json
+import mmap
 import os
 import shutil
 import sys
@@ -12,7 +13,7 @@ import time
 
 import yaml
 
-from . import config
+from . import config, profiling
 
 
 def robust_rmtree(path, logger=None, max_retries=10):
@@ -39,6 +40,90 @@ def robust_rmtree(path, logger=None, max_retries=10):
     shutil.rmtree(path)
 
 
+class MappedFile(object):
+    """
+    Read-only memory map of a file, as given by find_log_files(mmap=True).
+    The OS pages the file in as it is read, instead of it being copied into
+    a string. Slicing and len() work on the raw bytes, and the `mmap`
+    attribute can be searched directly with bytes regexes.
+    """
+
+    # Bytes decoded at a time when iterating over lines
+    BLOCK_SIZE = 1024 * 1024
+
+    def __init__(self, path):
+        self.path = path
+        with io.open(path, "rb") as fh:
+            try:
+                self.mmap = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                # Empty files can't be mapped
+                self.mmap = b""
+        # (encoding, text) of the first block, once it has been checked
+        self._first_block = None
+
+    def __len__(self):
+        return len(self.mmap)
+
+    def __getitem__(self, key):
+        return self.mmap[key]
+
+    def __iter__(self):
+        """Decoded lines with their line endings, like iterating over a text file handle"""
+        return self.lines(keepends=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _blocks(self):
+        """Blocks of whole lines of the file as bytes, so that only one block is held in memory"""
+        data = self.mmap
+        start = 0
+        end = len(data)
+        while start < end:
+            stop = min(start + self.BLOCK_SIZE, end)
+            if stop < end:
+                # Finish the block at the end of a line
+                newline = data.rfind(b"\n", start, stop)
+                if newline == -1:
+                    newline = data.find(b"\n", stop)
+                stop = end if newline == -1 else newline + 1
+            yield data[start:stop]
+            start = stop
+
+    def check_encoding(self, encoding="utf-8"):
+        """
+        Raise UnicodeDecodeError if the start of the file can't be decoded, eg. for binary files.
+        Only the first block is decoded, and it is kept for lines() so that it isn't decoded twice.
+        """
+        self._first_block = (encoding, next(self._blocks(), b"").decode(encoding))
+
+    def lines(self, keepends=False, encoding="utf-8", errors="strict"):
+        """
+        Decoded lines of the file, split like str.splitlines(). The file is decoded a block
+        of whole lines at a time, so that only one block is held in memory.
+        """
+        for i, block in enumerate(self._blocks()):
+            if i == 0 and self._first_block is not None and self._first_block[0] == encoding:
+                text = self._first_block[1]
+            else:
+                text = block.decode(encoding, errors)
+            yield from text.splitlines(keepends)
+
+    def read(self, encoding="utf-8"):
+        """The whole file as a string"""
+        return self.mmap[:].decode(encoding)
+
+    def close(self):
+        self._first_block = None
+        if isinstance(self.mmap, mmap.mmap):
+            self.mmap.close()
+
+
+@profiling.timed("data_files")
 def write_data_file(data, fn, sort_cols=False, data_format=None):
     """Write a data file to the report directory. Will not do anything
     if config.data_dir is not set.
@@ -50,10 +135,17 @@ def write_data_file(data, fn, sort_cols=False, data_format=None):
     :return: None"""
 
     if config.data_dir is not None:
+        # Imported here, so that numpy isn't loaded at startup
+        from . import columnar
+
         # Get data format from config
         if data_format is None:
             data_format = config.data_format
 
+        # Parquet and Feather need an optional dependency, fall back to tsv without it
+        if data_format in columnar.FORMATS and not columnar.available(data_format):
+            data_format = "tsv"
+
         # JSON encoder class to handle lambda functions
         class MQCJSONEncoder(json.JSONEncoder):
             def default(self, obj):
@@ -79,25 +171,33 @@ def write_data_file(data, fn, sort_cols=False, data_format=None):
                 if sort_cols:
                     headers = sorted(headers)
 
-                headers_str = [str(item) for item in headers]
-                # Add Sample header in to first element
-                headers_str.insert(0, "Sample")
+                # Typed columns, built straight from the data
+                if data_format in columnar.FORMATS:
+                    columns = columnar.table_columns(data, headers)
 
-                # Get the rows
-                rows = ["\t".join(headers_str)]
-                for sn in sorted(data.keys()):
-                    # Make a list starting with the sample name, then each field in order of the header cols
-                    line = [str(sn)] + [str(data[sn].get(h, "")) for h in headers]
-                    rows.append("\t".join(line))
+                else:
+                    headers_str = [str(item) for item in headers]
+                    # Add Sample header in to first element
+                    headers_str.insert(0, "Sample")
 
-                body = "\n".join(rows)
+                    # Get the rows
+                    rows = ["\t".join(headers_str)]
+                    for sn in sorted(data.keys()):
+                        # Make a list starting with the sample name, then each field in order of the header cols
+                        line = [str(sn)] + [str(data[sn].get(h, "")) for h in headers]
+                        rows.append("\t".join(line))
+
+                    body = "\n".join(rows)
 
             except Exception:
+                config.logger.debug(f"{fn} could not be saved as {data_format}. Falling back to YAML.")
                 data_format = "yaml"
-                config.logger.debug(f"{fn} could not be saved as tsv/csv. Falling back to YAML.")
 
         # Add relevant file extension to filename, save file.
         fn = "{}.{}".format(fn, config.data_format_extensions[data_format])
+        if data_format in columnar.FORMATS:
+            columnar.write(columns, os.path.join(config.data_dir, fn), data_format)
+            return
         with io.open(os.path.join(config.data_dir, fn), "w", encoding="utf-8") as f:
             if data_format == "json":
                 jsonstr = json.dumps(data, indent=4, cls=MQCJSONEncoder, ensure_ascii=False)
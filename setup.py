@@ -66,6 +66,9 @@ setup(
         "importlib-metadata",
         "humanize",
     ],
+    extras_require={
+        "fast": ["pyahocorasick"],
+    },
     entry_points={
         "console_scripts": [
             "multiqc=multiqc.__main__:run_multiqc",
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+
+"""
+Benchmark the memory use of find_log_files(): file contents as a string vs a memory map.
+Writes synthetic mosdepth global distribution files for the given number of samples, then
+parses them in a fresh process for each mode, in the same way as the mosdepth module.
+
+Usage: python test/benchmarks/find_log_files_memory.py [--samples 2000] [--contigs 25] [--cutoffs 400]
+"""
+
+import argparse
+import os
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+
+def write_files(outdir, num_samples, num_contigs, num_cutoffs):
+    """Synthetic *.mosdepth.global.dist.txt files"""
+    rng = random.Random(0)
+    contigs = ["chr{}".format(i) for i in range(1, num_contigs)] + ["total"]
+    for i in range(num_samples):
+        with open(os.path.join(outdir, "sample_{:05d}.mosdepth.global.dist.txt".format(i)), "w") as fh:
+            for contig in contigs:
+                frac = 1.0
+                for cutoff in range(num_cutoffs, -1, -1):
+                    frac = max(0.0, frac - rng.uniform(0, 2.0 / num_cutoffs))
+                    fh.write("{}\t{}\t{:.2f}\n".format(contig, cutoff, 1 - frac))
+
+
+def parse(mode, indir):
+    """Parse the files with find_log_files() in the given mode, and return the runtime"""
+    from multiqc.modules.base_module import BaseMultiqcModule
+    from multiqc.utils import report
+
+    report.init()
+    report.files = {"bench": [{"fn": fn, "root": indir} for fn in sorted(os.listdir(indir))]}
+    mod = BaseMultiqcModule(name="Benchmark", anchor="benchmark")
+
+    start = time.time()
+    cumcov = defaultdict(dict)
+    for f in mod.find_log_files("bench", mmap=(mode == "mmap")):
+        lines = f["f"].lines() if mode == "mmap" else f["f"].split("\n")
+        for line in lines:
+            if "\t" not in line:
+                continue
+            contig, cutoff, bases_fraction = line.split("\t")
+            if contig == "total" and float(bases_fraction) > 0:
+                cumcov[f["s_name"]][int(cutoff)] = 100.0 * float(bases_fraction)
+    return time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark find_log_files() file contents vs memory maps")
+    parser.add_argument("--samples", type=int, default=2000, help="Number of samples")
+    parser.add_argument("--contigs", type=int, default=25, help="Contigs per file")
+    parser.add_argument("--cutoffs", type=int, default=400, help="Coverage cutoffs per contig")
+    parser.add_argument("--parse", nargs=2, metavar=("MODE", "DIR"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    # Run in a child process, so that the peak RSS is only from this mode
+    if args.parse:
+        runtime = parse(*args.parse)
+        print(runtime, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+        return
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        write_files(tmpdir, args.samples, args.contigs, args.cutoffs)
+        size = sum(os.path.getsize(os.path.join(tmpdir, fn)) for fn in os.listdir(tmpdir))
+        print("{} samples, {:.1f} MB of files".format(args.samples, size / 1e6))
+        print("{:>10} {:>10} {:>16}".format("mode", "time (s)", "peak RSS (MB)"))
+        for mode in ["contents", "mmap"]:
+            out = subprocess.check_output([sys.executable, __file__, "--parse", mode, tmpdir], text=True)
+            runtime, maxrss = out.split()
+            print("{:>10} {:>10.2f} {:>16.1f}".format(mode, float(runtime), int(maxrss) / 1024))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+#!/usr/bin/env python
+
+"""
+Benchmark registering HTML IDs with report.save_htmlid(). Registers unique IDs,
+then IDs that are all duplicates of a few bases, like the table columns and
+plots of a big run.
+
+Usage: python test/benchmarks/html_ids.py [--ids 100000] [--bases 10]
+"""
+
+import argparse
+import time
+
+from multiqc.utils import report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark registering HTML IDs")
+    parser.add_argument("--ids", type=int, default=100000, help="Number of IDs to register")
+    parser.add_argument("--bases", type=int, default=10, help="Number of different IDs for the duplicates")
+    args = parser.parse_args()
+
+    print("{:>12} {:>10} {:>10}".format("ids", "type", "time (s)"))
+    for id_type, html_ids in [
+        ("unique", ["mod {} table column {}".format(i % 50, i) for i in range(args.ids)]),
+        ("duplicate", ["mod {} plot".format(i % args.bases) for i in range(args.ids)]),
+    ]:
+        report.init()
+        start = time.time()
+        for html_id in html_ids:
+            report.save_htmlid(html_id)
+        runtime = time.time() - start
+        assert len(set(report.html_ids)) == args.ids
+        print("{:>12} {:>10} {:>10.2f}".format(args.ids, id_type, runtime))
+
+
+if __name__ == "__main__":
+    main()
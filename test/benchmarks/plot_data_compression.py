@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+
+"""
+Benchmark the compression of the report plot data: lzstring vs gzip.
+Builds synthetic plot data similar to a report with a line graph, bar graph
+and heatmap for each module, for the given numbers of samples.
+
+Usage: python test/benchmarks/plot_data_compression.py [--samples 1000 10000] [--modules 5]
+"""
+
+import argparse
+import random
+import time
+
+from multiqc.utils import report
+
+
+def make_plot_data(num_samples, num_modules):
+    """Synthetic report.plot_data with a line graph, bar graph and heatmap per module"""
+    rng = random.Random(0)
+    s_names = ["sample_{:06d}".format(i) for i in range(num_samples)]
+    plot_data = dict()
+    for m in range(num_modules):
+        plot_data["mod{}_linegraph".format(m)] = {
+            "plot_type": "xy_line",
+            "datasets": [
+                [{"name": s, "data": [[x, round(rng.uniform(0, 40), 3)] for x in range(1, 151, 3)]} for s in s_names]
+            ],
+            "config": {"id": "mod{}_linegraph".format(m), "title": "Line graph", "ylab": "Quality"},
+        }
+        plot_data["mod{}_bargraph".format(m)] = {
+            "plot_type": "bar_graph",
+            "samples": [s_names],
+            "datasets": [
+                [{"name": cat, "data": [rng.randint(0, 10000000) for _ in s_names]} for cat in ["Pass", "Warn", "Fail"]]
+            ],
+            "config": {"id": "mod{}_bargraph".format(m), "title": "Bar graph"},
+        }
+        status = ["pass", "warn", "fail"]
+        plot_data["mod{}_heatmap".format(m)] = {
+            "plot_type": "heatmap",
+            "data": [[x, y, rng.choice(status)] for y in range(num_samples) for x in range(10)],
+            "xcats": ["check_{}".format(x) for x in range(10)],
+            "ycats": s_names,
+            "config": {"id": "mod{}_heatmap".format(m), "title": "Heatmap"},
+        }
+    return plot_data
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark lzstring vs gzip compression of report plot data")
+    parser.add_argument("--samples", type=int, nargs="+", default=[1000, 10000], help="Numbers of samples")
+    parser.add_argument("--modules", type=int, default=5, help="Number of modules (3 plots each)")
+    args = parser.parse_args()
+
+    print("{:>8} {:>10} {:>12} {:>10} {:>12}".format("samples", "method", "size (MB)", "time (s)", "vs json"))
+    for num_samples in args.samples:
+        plot_data = make_plot_data(num_samples, args.modules)
+        json_size = len(report.sanitise_json(report.json.dumps(plot_data)))
+        for method in ["gzip", "lzstring"]:
+            start = time.time()
+            compressed = report.compress_json(plot_data, method)
+            runtime = time.time() - start
+            print(
+                "{:>8} {:>10} {:>12.2f} {:>10.2f} {:>11.1f}%".format(
+                    num_samples, method, len(compressed) / 1e6, runtime, 100 * len(compressed) / json_size
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+
+"""
+Benchmark the MultiQC startup time: `python -X importtime` for importing the command line
+module, and the wall time of `multiqc --version`. Each is run with a cold startup cache
+(MULTIQC_NO_STARTUP_CACHE set) and a warm one. Exits with an error if the warm import
+takes longer than --max-import-ms, so that it can be used as a regression check.
+
+Usage: python test/benchmarks/startup_importtime.py [--repeats 5] [--top 15] [--max-import-ms 400]
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+
+def importtime(env):
+    """Import times from `python -X importtime`, as a dict of module name to (self us, cumulative us)"""
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import multiqc.multiqc"],
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+        check=True,
+    ).stderr
+    times = dict()
+    for line in out.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:") :].split("|")
+        times[name.strip()] = (int(self_us), int(cumulative_us))
+    return times
+
+
+def version_time(env):
+    """Wall time of `multiqc --version` in seconds"""
+    start = time.time()
+    subprocess.run([sys.executable, "-m", "multiqc", "--version"], env=env, stdout=subprocess.DEVNULL, check=True)
+    return time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the MultiQC startup time")
+    parser.add_argument("--repeats", type=int, default=5, help="Runs of each measurement, the best is reported")
+    parser.add_argument("--top", type=int, default=15, help="Number of slowest imports to list")
+    parser.add_argument("--max-import-ms", type=float, help="Fail if the warm import takes longer than this")
+    args = parser.parse_args()
+
+    cold_env = dict(os.environ, MULTIQC_NO_STARTUP_CACHE="1")
+    warm_env = {k: v for k, v in os.environ.items() if k != "MULTIQC_NO_STARTUP_CACHE"}
+    # Make sure that the startup cache has been written
+    version_time(warm_env)
+
+    results = dict()
+    for label, env in [("cold cache", cold_env), ("warm cache", warm_env)]:
+        imports = min((importtime(env) for _ in range(args.repeats)), key=lambda t: t["multiqc.multiqc"][1])
+        version = min(version_time(env) for _ in range(args.repeats))
+        results[label] = imports
+        print(
+            "{:>10}: import multiqc.multiqc {:>7.1f} ms, multiqc --version {:>7.1f} ms".format(
+                label, imports["multiqc.multiqc"][1] / 1000, version * 1000
+            )
+        )
+
+    print("\nSlowest imports with a warm cache (self ms, cumulative ms):")
+    imports = results["warm cache"]
+    for name, (self_us, cumulative_us) in sorted(imports.items(), key=lambda i: -i[1][0])[: args.top]:
+        print("{:>8.1f} {:>8.1f}  {}".format(self_us / 1000, cumulative_us / 1000, name))
+
+    if args.max_import_ms is not None and imports["multiqc.multiqc"][1] / 1000 > args.max_import_ms:
+        print("\nImport took longer than {} ms".format(args.max_import_ms), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
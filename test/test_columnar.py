@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+
+""" Tests for writing data files as typed columns """
+
+import warnings
+
+import numpy as np
+import pytest
+
+from multiqc.utils import columnar
+
+DATA = {
+    "s1": {"Sample": 5, 1: 1.5, "1": "a", "1_1": True},
+    "s2": {"Sample": 6, 1: 2.5, "1": "b", "1_1": False},
+}
+HEADERS = ["Sample", 1, "1", "1_1"]
+
+
+def test_unique_column_names():
+    columns = columnar.table_columns(DATA, HEADERS)
+    assert [name for name, _, _ in columns] == ["Sample", "Sample_1", "1", "1_1", "1_1_1"]
+    assert columns[0][2] == ["s1", "s2"]
+    assert columns[1][2] == [5, 6]
+
+
+def test_npz_duplicate_names(tmp_path):
+    path = tmp_path / "data.npz"
+    with warnings.catch_warnings():
+        # Duplicate zip members only give a warning
+        warnings.simplefilter("error")
+        columnar.write(columnar.table_columns(DATA, HEADERS), path, "npz")
+    with np.load(path) as d:
+        assert list(d["Sample"]) == ["s1", "s2"]
+        assert list(d["Sample_1"]) == [5, 6]
+        assert list(d["1"]) == [1.5, 2.5]
+        assert list(d["1_1"]) == ["a", "b"]
+        assert list(d["1_1_1"]) == [True, False]
+
+
+@pytest.mark.parametrize("data_format", columnar.ARROW_FORMATS)
+def test_arrow_duplicate_names(tmp_path, data_format):
+    pytest.importorskip("pyarrow")
+    import pyarrow.feather
+    import pyarrow.parquet
+
+    path = tmp_path / "data.{}".format(data_format)
+    columnar.write(columnar.table_columns(DATA, HEADERS), path, data_format)
+    if data_format == "parquet":
+        table = pyarrow.parquet.read_table(path)
+    else:
+        table = pyarrow.feather.read_table(path)
+    assert table.column_names == ["Sample", "Sample_1", "1", "1_1", "1_1_1"]
+    assert table.column("Sample").to_pylist() == ["s1", "s2"]
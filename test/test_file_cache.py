@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+
+""" Tests for the file caches kept between runs """
+
+import logging
+import os
+import time
+
+import pytest
+
+from multiqc.utils import config
+from multiqc.utils.file_cache import FileCache
+
+
+@pytest.fixture
+def cache_config(tmp_path, monkeypatch):
+    monkeypatch.setattr(config, "cache_dir", str(tmp_path / "cache"), raising=False)
+    monkeypatch.setattr(config, "cache_max_age", 30, raising=False)
+    monkeypatch.setattr(config, "cache_max_size", 500, raising=False)
+    return tmp_path / "cache"
+
+
+def _set_age(cache, key, days):
+    t = time.time() - days * 24 * 60 * 60
+    os.utime(cache._path(key), (t, t))
+
+
+def test_read_write(cache_config):
+    cache = FileCache("test", ".txt")
+    assert cache.read("a") is None
+    cache.write("a", "some text")
+    assert cache.read("a") == "some text"
+    assert FileCache("test", ".txt").read("a") == "some text"
+    assert FileCache("other", ".txt").read("a") is None
+
+
+def test_prune_by_age(cache_config):
+    cache = FileCache("test", ".txt")
+    for key in ["old", "new"]:
+        cache.write(key, key)
+    _set_age(cache, "old", 31)
+    _set_age(cache, "new", 29)
+    cache.prune()
+    assert cache.read("old") is None
+    assert cache.read("new") == "new"
+
+
+def test_read_marks_entry_as_used(cache_config):
+    cache = FileCache("test", ".txt")
+    cache.write("a", "a")
+    _set_age(cache, "a", 31)
+    assert cache.read("a") == "a"
+    cache.prune()
+    assert cache.read("a") == "a"
+
+
+def test_prune_by_size(cache_config, monkeypatch):
+    monkeypatch.setattr(config, "cache_max_size", 2.5 / 1024, raising=False)
+    cache = FileCache("test", ".txt")
+    for i, key in enumerate(["a", "b", "c", "d"]):
+        cache.write(key, "x" * 1024)
+        _set_age(cache, key, 4 - i)
+    cache.prune()
+    assert cache.read("a") is None
+    assert cache.read("b") is None
+    assert cache.read("c") is not None
+    assert cache.read("d") is not None
+
+
+def test_prune_on_first_write(cache_config):
+    FileCache("test", ".txt").write("a", "a")
+    cache = FileCache("test", ".txt")
+    _set_age(cache, "a", 31)
+    cache.write("b", "b")
+    assert cache.read("a") is None
+    # Only pruned once per run
+    cache.write("c", "c")
+    _set_age(cache, "c", 31)
+    cache.write("d", "d")
+    assert cache.read("c") == "c"
+
+
+@pytest.mark.skipif(hasattr(os, "geteuid") and os.geteuid() == 0, reason="root can write to read-only directories")
+def test_read_only_cache_dir(cache_config, caplog):
+    cache_config.mkdir()
+    os.chmod(cache_config, 0o555)
+    try:
+        cache = FileCache("test", ".txt")
+        with caplog.at_level(logging.DEBUG, logger=config.logger.name):
+            cache.write("a", "a")
+            assert cache.read("a") is None
+            cache.prune()
+        assert not [r for r in caplog.records if r.levelno > logging.DEBUG]
+    finally:
+        os.chmod(cache_config, 0o755)
+
+
+def test_unwritable_cache_dir(cache_config, caplog):
+    # A file where the cache directory should be fails the same way as a read-only directory, even for root
+    cache_config.write_text("")
+    cache = FileCache("test", ".txt")
+    with caplog.at_level(logging.DEBUG, logger=config.logger.name):
+        cache.write("a", "a")
+        assert cache.read("a") is None
+        cache.prune()
+    assert not [r for r in caplog.records if r.levelno > logging.DEBUG]
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+
+""" Tests for the registry of HTML IDs used in the report """
+
+import pickle
+
+import pytest
+
+from multiqc.utils.report import HtmlIdRegistry
+
+
+def check_in_sync(ids):
+    """The fast membership check must agree with the list contents"""
+    for html_id in ["a", "b", "c", "d", "e", "f", "a-1", "a-2"]:
+        assert (html_id in ids) == (html_id in list(ids)), html_id
+
+
+def test_append_extend():
+    ids = HtmlIdRegistry(["a"])
+    ids.append("b")
+    ids.extend(i for i in ["c", "d"])
+    assert ids == ["a", "b", "c", "d"]
+    check_in_sync(ids)
+
+
+def test_iadd():
+    ids = HtmlIdRegistry(["a"])
+    same = ids
+    ids += ["b", "c"]
+    assert ids is same
+    assert isinstance(ids, HtmlIdRegistry)
+    assert ids == ["a", "b", "c"]
+    check_in_sync(ids)
+
+
+def test_insert():
+    ids = HtmlIdRegistry(["a", "b"])
+    ids.insert(1, "c")
+    assert ids == ["a", "c", "b"]
+    check_in_sync(ids)
+
+
+def test_remove():
+    ids = HtmlIdRegistry(["a", "b", "a"])
+    ids.remove("a")
+    assert "a" in ids
+    ids.remove("a")
+    assert "a" not in ids
+    check_in_sync(ids)
+    with pytest.raises(ValueError):
+        ids.remove("a")
+
+
+def test_pop():
+    ids = HtmlIdRegistry(["a", "b", "c"])
+    assert ids.pop() == "c"
+    assert ids.pop(0) == "a"
+    assert ids == ["b"]
+    check_in_sync(ids)
+
+
+def test_clear():
+    ids = HtmlIdRegistry(["a", "b"])
+    ids.clear()
+    assert ids == []
+    check_in_sync(ids)
+
+
+def test_setitem():
+    ids = HtmlIdRegistry(["a", "b", "c"])
+    ids[0] = "d"
+    check_in_sync(ids)
+    ids[1:] = ["e", "f"]
+    assert ids == ["d", "e", "f"]
+    check_in_sync(ids)
+
+
+def test_delitem():
+    ids = HtmlIdRegistry(["a", "b", "c", "d"])
+    del ids[0]
+    check_in_sync(ids)
+    del ids[1:]
+    assert ids == ["b"]
+    check_in_sync(ids)
+
+
+def test_imul():
+    ids = HtmlIdRegistry(["a", "b"])
+    ids *= 0
+    assert ids == []
+    check_in_sync(ids)
+
+
+def test_next_suffix_after_remove():
+    ids = HtmlIdRegistry(["a", "a-1", "a-2"])
+    assert ids.next_suffix("a") == 3
+    ids.remove("a-1")
+    assert ids.next_suffix("a") == 1
+
+
+def test_pickle():
+    ids = HtmlIdRegistry(["a", "b"])
+    ids = pickle.loads(pickle.dumps(ids))
+    assert isinstance(ids, HtmlIdRegistry)
+    assert ids == ["a", "b"]
+    check_in_sync(ids)
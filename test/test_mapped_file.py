@@ -0,0 +1,79 @@
+#!/usr/bin/env python
+
+""" Tests for memory mapped log files, as given by find_log_files(mmap=True) """
+
+import pytest
+
+from multiqc.modules.base_module import BaseMultiqcModule
+from multiqc.utils.util_functions import MappedFile
+
+
+def _log_file(path, contents):
+    path.write_bytes(contents)
+    return {"root": str(path.parent), "fn": path.name, "s_name": path.stem}
+
+
+def test_lines(tmp_path, monkeypatch):
+    monkeypatch.setattr(MappedFile, "BLOCK_SIZE", 8)
+    contents = "a\tb\nsome longer line\r\n\nlast ünicode line"
+    path = tmp_path / "test.txt"
+    path.write_text(contents, encoding="utf-8")
+    with MappedFile(path) as mf:
+        assert list(mf.lines()) == contents.splitlines()
+        assert list(mf) == contents.splitlines(keepends=True)
+        assert mf.read() == contents
+
+
+def test_empty_file(tmp_path):
+    path = tmp_path / "empty.txt"
+    path.write_bytes(b"")
+    with MappedFile(path) as mf:
+        assert len(mf) == 0
+        assert list(mf.lines()) == []
+
+
+def test_invalid_utf8(tmp_path):
+    path = tmp_path / "binary.txt"
+    path.write_bytes(b"valid\n\xff\xfe invalid\n")
+    with MappedFile(path) as mf:
+        with pytest.raises(UnicodeDecodeError):
+            list(mf.lines())
+        with pytest.raises(UnicodeDecodeError):
+            mf.check_encoding()
+        assert list(mf.lines(errors="replace")) == ["valid", "�� invalid"]
+
+
+def test_read_log_file_skips_invalid_utf8(tmp_path):
+    """Undecodable files are skipped when they are opened, the same as for filecontents=True"""
+    for mode in [dict(mmap=True), dict(filecontents=True)]:
+        f = _log_file(tmp_path / "binary.txt", b"valid\n\xff\xfe invalid\n")
+        assert list(BaseMultiqcModule._read_log_file(f, **mode)) == []
+        f = _log_file(tmp_path / "text.txt", b"valid\nline\n")
+        found = list(BaseMultiqcModule._read_log_file(f, **mode))
+        assert len(found) == 1
+
+
+def test_check_encoding_first_block(tmp_path, monkeypatch):
+    """Only the first block is checked up front, invalid bytes later on are found by lines()"""
+    monkeypatch.setattr(MappedFile, "BLOCK_SIZE", 8)
+    path = tmp_path / "late.txt"
+    path.write_bytes(b"first\nsecond line\n\xff\xfe invalid\n")
+    with MappedFile(path) as mf:
+        mf.check_encoding()
+        lines = mf.lines()
+        assert next(lines) == "first"
+        assert next(lines) == "second line"
+        with pytest.raises(UnicodeDecodeError):
+            next(lines)
+
+
+def test_lines_after_check_encoding(tmp_path, monkeypatch):
+    monkeypatch.setattr(MappedFile, "BLOCK_SIZE", 8)
+    contents = "first\nsecond line\nünicode\n"
+    path = tmp_path / "test.txt"
+    path.write_text(contents, encoding="utf-8")
+    with MappedFile(path) as mf:
+        mf.check_encoding()
+        assert list(mf.lines()) == contents.splitlines()
+        assert list(mf.lines(keepends=True)) == contents.splitlines(keepends=True)
+        assert list(mf.lines(encoding="latin-1")) == contents.encode("utf-8").decode("latin-1").splitlines()
@@ -0,0 +1,62 @@
+#!/usr/bin/env python
+
+""" Tests for checking the data exported to JSON """
+
+import json
+import logging
+
+import pytest
+
+from multiqc.utils import config, megaqc
+
+
+def test_check_json_types():
+    megaqc.check_json_types({"a": [1, 2.5, "b", None, True, (3, 4)], 5: {"c": lambda x: x}})
+    with pytest.raises(TypeError):
+        megaqc.check_json_types({"a": [1, {2, 3}]})
+    with pytest.raises(TypeError):
+        megaqc.check_json_types({("a", "b"): 1})
+
+
+def test_shared_references():
+    """The same container can be used more than once, as long as it isn't inside itself"""
+    shared = {"x": [1, 2]}
+    data = {"a": shared, "b": [shared, shared["x"]], "c": (shared, shared)}
+    megaqc.check_json_types(data)
+    json.dumps(data)
+
+
+@pytest.mark.parametrize("kind", ["dict", "list", "nested"])
+def test_circular_references(kind):
+    if kind == "dict":
+        data = {"a": 1}
+        data["self"] = data
+    elif kind == "list":
+        data = [1, 2]
+        data.append(data)
+    else:
+        inner = {"x": []}
+        data = {"a": [{"b": inner}]}
+        inner["x"].append(data["a"])
+    with pytest.raises(ValueError):
+        json.dumps(data)
+    with pytest.raises(ValueError):
+        megaqc.check_json_types(data)
+
+
+def test_dump_json_skips_circular_references(caplog):
+    class Report(object):
+        data_sources = {"mod": {"sec": {"s1": "/path/s1"}}}
+        general_stats_data = []
+        general_stats_headers = []
+        multiqc_command = "multiqc ."
+        plot_data = {}
+        saved_raw_data = {"mod": {"s1": {}}}
+
+    Report.saved_raw_data["mod"]["s1"]["self"] = Report.saved_raw_data
+    with caplog.at_level(logging.WARNING, logger=config.logger.name):
+        exported = megaqc.multiqc_dump_json(Report)
+    assert "report_saved_raw_data" not in exported
+    assert exported["report_data_sources"] == Report.data_sources
+    assert "Couldn't export data key 'report.saved_raw_data'" in caplog.text
+    json.dumps(exported)
@@ -0,0 +1,86 @@
+#!/usr/bin/env python
+
+""" Tests for drawing flat plots in worker processes """
+
+import json
+import subprocess
+import sys
+import tracemalloc
+
+from multiqc.modules.base_module import BaseMultiqcModule
+from multiqc.utils import config, plot_export, profiling, report
+
+
+def _write_custom_content(data_dir):
+    """A line graph and a bar graph as custom content, so that the report has flat plots from a module"""
+    for plot_type in ["linegraph", "bargraph"]:
+        data = {
+            "id": "test_{}".format(plot_type),
+            "section_name": "Test {}".format(plot_type),
+            "plot_type": plot_type,
+            "pconfig": {"id": "test_{}_plot".format(plot_type)},
+            "data": {"sample_{}".format(i): {str(x): x * i for x in range(1, 6)} for i in range(1, 4)},
+        }
+        with open(data_dir / "test_{}_mqc.json".format(plot_type), "w") as fh:
+            json.dump(data, fh)
+
+
+def test_no_placeholders_left_with_plot_workers(tmp_path):
+    """
+    The Run Time section is added after the plots drawn in workers have been collected,
+    its plots must be drawn straight away rather than leaving placeholders in the report
+    """
+    data_dir = tmp_path / "data"
+    data_dir.mkdir()
+    _write_custom_content(data_dir)
+    out_dir = tmp_path / "out"
+
+    subprocess.run(
+        [
+            sys.executable,
+            "-m",
+            "multiqc",
+            str(data_dir),
+            "-o",
+            str(out_dir),
+            "--flat",
+            "--plot-workers",
+            "2",
+            "--profile-runtime",
+            "--quiet",
+            "--no-ansi",
+        ],
+        check=True,
+    )
+
+    with open(out_dir / "multiqc_report.html") as fh:
+        html = fh.read()
+    assert "mqc_plot_export_" not in html
+    assert "data:image/png;base64" in html
+
+
+def _worker_state(*args):
+    """Is memory being traced or a module profile active in this worker process?"""
+    return tracemalloc.is_tracing(), profiling._active is not None
+
+
+def test_workers_not_profiled(monkeypatch):
+    """Worker pools forked while a module is profiled must not keep tracing memory"""
+    monkeypatch.setattr(config, "profile_runtime", True)
+    monkeypatch.setattr(config, "plot_workers", 2)
+    report.init()
+    plot_export.reset()
+    try:
+        with profiling.module("test"):
+            assert tracemalloc.is_tracing()
+            executor = plot_export._get_executor()
+            assert executor is not None
+            assert executor.submit(_worker_state).result() == (False, False)
+
+            module = BaseMultiqcModule(name="Test", anchor="test")
+            files = [{"root": "", "fn": "file_{}".format(i)} for i in range(4)]
+            parsed = module._parse_files_in_workers(files, _worker_state, 2, (False, False, False))
+            assert [result for _, result, _ in parsed] == [(False, False)] * 4
+        assert executor.submit(_worker_state).result() == (False, False)
+    finally:
+        plot_export.finish([])
@@ -0,0 +1,66 @@
+#!/usr/bin/env python
+
+""" Tests for the sample name cleaning and ignore config being picked up when it changes """
+
+import pytest
+
+from multiqc.utils import config, sample_names
+
+
+@pytest.fixture
+def clean_config(monkeypatch):
+    """Copies of the config lists, so that changing them in place doesn't affect other tests"""
+    monkeypatch.setattr(config, "fn_clean_sample_names", True)
+    monkeypatch.setattr(config, "fn_clean_exts", [".gz", ".fastq"])
+    monkeypatch.setattr(config, "fn_clean_trim", ["_"])
+    monkeypatch.setattr(config, "sample_names_replace", {})
+    monkeypatch.setattr(config, "sample_names_ignore", [])
+    monkeypatch.setattr(config, "sample_names_ignore_re", [])
+
+
+def clean(s_name):
+    return sample_names.get_cleaner("test").clean(s_name, "", s_name, "test")
+
+
+def test_clean_exts_changed_in_place(clean_config):
+    assert clean("sample.fastq.trimmed.gz") == "sample"
+    # Remove an extension and add another one, so that the length of the list stays the same
+    config.fn_clean_exts.remove(".fastq")
+    config.fn_clean_exts.append(".trimmed")
+    assert clean("sample.fastq.trimmed.gz") == "sample.fastq"
+
+
+def test_clean_exts_dict_changed_in_place(clean_config):
+    config.fn_clean_exts.append({"type": "remove", "pattern": "_R1"})
+    assert clean("sample_R1_001.gz") == "sample_001"
+    config.fn_clean_exts[-1] = {"type": "remove", "pattern": "_001"}
+    assert clean("sample_R1_001.gz") == "sample_R1"
+
+
+def test_clean_exts_for_module(clean_config):
+    config.fn_clean_exts.append({"type": "remove", "pattern": "_R1", "module": "test"})
+    config.fn_clean_exts.append({"type": "remove", "pattern": "_001", "module": ["other"]})
+    assert clean("sample_R1_001.gz") == "sample_001"
+    # Module lists in the config aren't changed, so the cleaner isn't rebuilt for every file
+    assert config.fn_clean_exts[-2]["module"] == "test"
+    cleaner = sample_names.get_cleaner("test")
+    assert sample_names.get_cleaner("test") is cleaner
+
+
+def test_replace_changed_in_place(clean_config):
+    config.sample_names_replace["sample"] = "renamed"
+    assert clean("sample.gz") == "renamed"
+    del config.sample_names_replace["sample"]
+    config.sample_names_replace["other"] = "renamed"
+    assert clean("sample.gz") == "sample"
+
+
+def test_ignore_changed_in_place(clean_config):
+    config.sample_names_ignore.append("sample_1")
+    assert sample_names.is_ignored("sample_1")
+    assert not sample_names.is_ignored("sample_2")
+    config.sample_names_ignore[0] = "sample_2"
+    assert not sample_names.is_ignored("sample_1")
+    assert sample_names.is_ignored("sample_2")
+    config.sample_names_ignore_re.append("^sam.*_1$")
+    assert sample_names.is_ignored("sample_1")
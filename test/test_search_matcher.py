@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+
+""" Tests for matching file contents search patterns, with and without pyahocorasick """
+
+import re
+
+import pytest
+
+from multiqc.utils import search_matcher
+
+PATTERNS = [
+    {"contents": "FastQC"},
+    {"contents": "Basic Statistics", "num_lines": 2},
+    {"contents": "ICS\n>>"},
+    {"contents": "not in the file"},
+    {"contents": "Total Sequences", "num_lines": 3},
+    {"contents": "Statistics\tpass"},
+    {"contents_re": r"^Filename\t"},
+    {"contents_re": r"^Encoding\t", "num_lines": 3},
+    {"contents_re": r"^Encoding\t", "num_lines": 5},
+    {"contents_re": r"^Nothing"},
+]
+
+LINES = [
+    "##FastQC\t0.11.9\n",
+    ">>Basic Statistics\tpass\n",
+    "#Measure\tValue\n",
+    "Filename\tsample.fastq.gz\n",
+    "Encoding\tSanger / Illumina 1.9\n",
+    "Total Sequences\t100\n",
+]
+
+
+def expected(pattern, lines):
+    """Match the pattern by testing each line in turn, the way MultiQC did before the contents scan"""
+    lines = lines[: pattern.get("num_lines") or len(lines)]
+    if pattern.get("contents") is not None:
+        if "\n" in pattern["contents"]:
+            return any(pattern["contents"] in line for line in lines)
+        return pattern["contents"] in "".join(lines)
+    return any(re.search(pattern["contents_re"], line) for line in lines)
+
+
+@pytest.fixture(params=["ahocorasick", "fallback"])
+def matcher(request, monkeypatch):
+    if request.param == "ahocorasick":
+        pytest.importorskip("ahocorasick")
+    else:
+        monkeypatch.setattr(search_matcher, "ahocorasick", None)
+    matcher = search_matcher.SearchPatternMatcher([{"test_{}".format(i): [p] for i, p in enumerate(PATTERNS)}])
+    assert (matcher.contents_automaton is not None) == (request.param == "ahocorasick")
+    return matcher
+
+
+def test_contents_patterns(matcher):
+    scan = search_matcher.FileContentsScan(matcher)
+    for pattern in PATTERNS:
+        assert scan.matches(pattern, LINES) == expected(pattern, LINES), pattern
+
+
+def test_contents_patterns_new_lines(matcher):
+    """The results for one file must not be reused for the next one"""
+    scan = search_matcher.FileContentsScan(matcher)
+    for lines in [LINES, LINES[3:], LINES[::-1], []]:
+        for pattern in PATTERNS:
+            assert scan.matches(pattern, lines) == expected(pattern, lines), (pattern, lines)
+
+
+def test_contents_without_matcher():
+    scan = search_matcher.FileContentsScan()
+    for pattern in PATTERNS:
+        assert scan.matches(pattern, LINES) == expected(pattern, LINES), pattern